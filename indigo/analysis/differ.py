@@ -1,4 +1,6 @@
+import hashlib
 import html
+from copy import deepcopy
 from difflib import SequenceMatcher
 import logging
 import os
@@ -20,11 +22,11 @@ class HTMLFormatter(formatting.XMLFormatter):
     """
     xslt_filename = os.path.join(os.path.dirname(__file__), 'xmldiff.xslt')
 
+    # xslt filename -> compiled XSLT, shared by all formatters, since a diff can use many
+    compiled = {}
+
     def render(self, result):
-        with open(self.xslt_filename) as f:
-            xslt = lxml.etree.fromstring(f.read())
-            transform = lxml.etree.XSLT(xslt)
-        result = transform(result)
+        result = self.get_transform()(result)
 
         # XSLT doesn't let us add an element to an attribute, so here
         # we move "classx" over onto "class"
@@ -34,6 +36,12 @@ class HTMLFormatter(formatting.XMLFormatter):
         # return the result as a tree, not as a string
         return result
 
+    def get_transform(self):
+        transform = self.compiled.get(self.xslt_filename)
+        if transform is None:
+            transform = self.compiled[self.xslt_filename] = lxml.etree.XSLT(lxml.etree.parse(self.xslt_filename))
+        return transform
+
 
 class AKNHTMLDiffer:
     """ Helper class to diff AKN documents using xmldiff.
@@ -50,6 +58,10 @@ class AKNHTMLDiffer:
         'fast_match': True,
     }
 
+    hierarchical = True
+    """ Should only the provisions that have changed be diffed with xmldiff? See :meth:`diff_hierarchical`.
+    """
+
     def diff_html(self, old_tree, new_tree):
         """ Compares two trees, and returns a tree with annotated differences.
         """
@@ -61,12 +73,158 @@ class AKNHTMLDiffer:
         self.preprocess(old_tree)
         self.preprocess(new_tree)
 
-        formatter = self.get_formatter()
-        diff = xmldiff_main.diff_trees(old_tree, new_tree, formatter=formatter, diff_options=self.xmldiff_options)
+        if self.hierarchical:
+            diff = self.diff_hierarchical(old_tree, new_tree)
+        else:
+            diff = self.diff_trees(old_tree, new_tree)
         self.postprocess(diff)
 
         return diff
 
+    def diff_trees(self, old_tree, new_tree):
+        """ Diff two trees with xmldiff.
+        """
+        return xmldiff_main.diff_trees(old_tree, new_tree, formatter=self.get_formatter(), diff_options=self.xmldiff_options)
+
+    def diff_hierarchical(self, old_tree, new_tree):
+        """ Diff two trees by first comparing the provisions (elements with ids) in them, and only using xmldiff
+        on provisions that have changed. Unchanged provisions are copied into the diff, and provisions that
+        were added or removed are marked as a whole. The cost of a diff therefore depends on the size of the
+        change, rather than the size of the document.
+
+        Elements that aren't provisions but that contain them (such as ``article.akn-act`` and ``span.akn-body``)
+        are treated as transparent containers, and are matched on their tag and attributes rather than their content.
+
+        Returns the root element of the diff.
+        """
+        self.hashes = {}
+        self.containers = set()
+        for tree in [old_tree, new_tree]:
+            # children before their parents
+            for node in reversed(list(tree.iter())):
+                self.hashes[node] = self.subtree_hash(node)
+                parent = node.getparent()
+                if parent is not None and not self.is_provision(parent) and \
+                        (self.is_provision(node) or node in self.containers):
+                    self.containers.add(parent)
+
+        try:
+            if self.hashes[old_tree] != self.hashes[new_tree] and not self.same_skeleton(old_tree, new_tree):
+                # nothing to be gained, diff the whole thing
+                return self.diff_trees(old_tree, new_tree).getroot()
+            return self.diff_provision(old_tree, new_tree)
+        finally:
+            self.hashes = {}
+            self.containers = set()
+
+    def diff_provision(self, old, new):
+        """ Diff two matching elements, returning a new element.
+        """
+        if self.hashes[old] == self.hashes[new]:
+            return self.copy_node(new)
+
+        if not self.same_skeleton(old, new):
+            # the content around the child provisions has changed, so diff the whole thing
+            old_copy = self.copy_node(old)
+            new_copy = self.copy_node(new)
+            old_copy.tail = new_copy.tail = None
+            diff = self.diff_trees(old_copy, new_copy).getroot()
+            diff.tail = new.tail
+            return diff
+
+        old_ids = {c.get('id') for c in old if self.is_provision(c)}
+        new_ids = {c.get('id') for c in new if self.is_provision(c)}
+        old_kids = list(old)
+        new_kids = list(new)
+
+        result = self.copy_node(new, children=False)
+        i = j = 0
+        while i < len(old_kids) or j < len(new_kids):
+            if i < len(old_kids) and self.is_provision(old_kids[i]) and old_kids[i].get('id') not in new_ids:
+                result.append(self.mark_node(old_kids[i], 'del'))
+                i += 1
+            elif j < len(new_kids) and self.is_provision(new_kids[j]) and new_kids[j].get('id') not in old_ids:
+                result.append(self.mark_node(new_kids[j], 'ins'))
+                j += 1
+            else:
+                # the skeletons match, so these correspond
+                if self.is_provision(new_kids[j]) or self.is_container(new_kids[j]):
+                    result.append(self.diff_provision(old_kids[i], new_kids[j]))
+                else:
+                    result.append(self.copy_node(new_kids[j]))
+                i += 1
+                j += 1
+
+        return result
+
+    def same_skeleton(self, old, new):
+        return self.skeleton(old, new) == self.skeleton(new, old)
+
+    def skeleton(self, node, other):
+        """ A description of node, excluding the content of its child provisions and containers, and those
+        child provisions that aren't in the other node. Two matching nodes with the same skeleton differ only
+        inside their child provisions and containers.
+        """
+        other_ids = {c.get('id') for c in other if self.is_provision(c)}
+        kids = []
+        for child in node:
+            if self.is_provision(child):
+                if child.get('id') in other_ids:
+                    kids.append(('id', child.get('id'), child.tail))
+                elif (child.tail or '').strip():
+                    kids.append(('tail', child.tail))
+            elif self.is_container(child):
+                kids.append(('container', child.tag, sorted(child.attrib.items()), child.tail))
+            else:
+                kids.append((self.hashes[child], child.tail))
+
+        return node.tag, sorted(node.attrib.items()), node.text, kids
+
+    def subtree_hash(self, node):
+        """ Hash of a node and its descendants, excluding its tail. Relies on the hashes of its children
+        having already been calculated.
+        """
+        digest = hashlib.sha1()
+        if isinstance(node.tag, str):
+            digest.update(node.tag.encode('utf-8'))
+            for k, v in sorted(node.attrib.items()):
+                digest.update(f'\0{k}={v}'.encode('utf-8'))
+        else:
+            # comments and processing instructions
+            digest.update(b'\0!')
+        digest.update(b'\0')
+        digest.update((node.text or '').encode('utf-8'))
+        for child in node:
+            digest.update(b'\0')
+            digest.update(self.hashes[child])
+            digest.update((child.tail or '').encode('utf-8'))
+        return digest.digest()
+
+    def is_provision(self, node):
+        # only provisions keep their ids after preprocessing, see stash_ids
+        return isinstance(node.tag, str) and node.get('id') is not None
+
+    def is_container(self, node):
+        """ Is this a non-provision element that contains provisions? See :meth:`diff_hierarchical`.
+        """
+        return node in self.containers
+
+    def copy_node(self, node, children=True):
+        if children:
+            copy = deepcopy(node)
+        else:
+            copy = node.makeelement(node.tag, attrib=node.attrib)
+            copy.text = node.text
+        copy.tail = node.tail
+        return copy
+
+    def mark_node(self, node, cls):
+        """ Copy a provision that was inserted or deleted as a whole, marking it as xmldiff does.
+        """
+        copy = self.copy_node(node)
+        copy.set('class', f'{cls} ' + (node.get('class') or ''))
+        return copy
+
     def get_formatter(self):
         # in html, AKN elements are recognised using classes
         text_tags = [f'*[@class="akn-{t}"]' for t in self.akn_text_tags] + self.html_text_tags
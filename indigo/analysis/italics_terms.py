@@ -17,11 +17,16 @@ class BaseItalicsFinder(LocaleBasedMatcher, TextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
+        self.mark_up_italics_in_tree(root, italics_terms)
+        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+
+    def mark_up_italics_in_tree(self, root, italics_terms):
+        """ Find and italicise terms in the already-parsed lxml tree +root+, changing the tree in place.
+        """
         self.setup_candidate_xpath(italics_terms)
         self.setup_pattern_re(italics_terms)
         self.setup(root)
         self.markup_patterns(root)
-        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
     def setup_candidate_xpath(self, terms):
         xpath_contains = ' or '.join([f'contains(., "{term}")' for term in [partial for t in terms for partial in t.split('"')]])
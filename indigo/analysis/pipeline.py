@@ -0,0 +1,108 @@
+import logging
+import time
+
+from lxml import etree
+
+from indigo.plugins import plugins
+
+log = logging.getLogger(__name__)
+
+
+class AnalysisPipeline:
+    """ Runs a series of analysis stages over a document, parsing the document's XML only once
+    and writing it back into the document only once, after all stages have run.
+
+    Each stage is a callable that is given the root lxml element and the Indigo document,
+    and changes the tree in place. A stage that can't change the tree in place may instead
+    return a new root element, which is given to the stages that follow.
+
+    After the pipeline has run, `timings` is a list of (stage name, seconds) tuples, including
+    the time taken to parse and serialise the XML.
+    """
+
+    def __init__(self, stages=None):
+        self.stages = list(stages or [])
+        self.timings = []
+
+    def add_stage(self, name, stage):
+        self.stages.append((name, stage))
+        return self
+
+    def add_refs_finder(self, topic):
+        """ Add a stage that runs the references finder plugin registered for `topic`, if any.
+        """
+        def stage(root, document):
+            finder = plugins.for_document(topic, document)
+            if finder:
+                if hasattr(finder, 'find_references_in_tree'):
+                    finder.find_references_in_tree(root, document)
+                else:
+                    # finders that only support find_references_in_document work on the document's content
+                    document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+                    finder.find_references_in_document(document)
+                    return etree.fromstring(document.content)
+
+        return self.add_stage(topic, stage)
+
+    def add_italics_finder(self):
+        """ Add a stage that marks up the document country's italics terms, if any.
+        """
+        def stage(root, document):
+            finder = plugins.for_document('italics-terms', document)
+            italics_terms = document.work.country.italics_terms
+            if finder and italics_terms:
+                finder.mark_up_italics_in_tree(root, italics_terms)
+
+        return self.add_stage('italics-terms', stage)
+
+    def run(self, document):
+        """ Run all stages against `document`, updating its content.
+        """
+        self.timings = []
+        if not self.stages:
+            return
+
+        # we need to use etree, not objectify, so we can't use document.doc.root,
+        # we have to re-parse it
+        root = self.time('parse', lambda: etree.fromstring(document.content))
+
+        for name, stage in self.stages:
+            new_root = self.time(name, lambda: stage(root, document))
+            if new_root is not None:
+                root = new_root
+
+        xml = self.time('serialise', lambda: etree.tostring(root, encoding='utf-8').decode('utf-8'))
+        self.time('update', lambda: setattr(document, 'content', xml))
+
+        log.info("Analysis of %s took %.3fs: %s" % (
+            document, self.total_time(),
+            ", ".join(f"{name}={secs:.3f}s" for name, secs in self.timings)))
+
+    def time(self, name, func):
+        start = time.perf_counter()
+        result = func()
+        self.timings.append((name, time.perf_counter() - start))
+        return result
+
+    def total_time(self):
+        return sum(secs for name, secs in self.timings)
+
+
+REFS_FINDERS = ['refs', 'refs-subtypes', 'refs-cap', 'refs-act-names', 'internal-refs']
+""" Topics of the references finder plugins, in the order in which they should be run.
+"""
+
+
+def refs_pipeline():
+    """ Pipeline that finds and links references to other works and internal references.
+    """
+    pipeline = AnalysisPipeline()
+    for topic in REFS_FINDERS:
+        pipeline.add_refs_finder(topic)
+    return pipeline
+
+
+def import_pipeline():
+    """ Pipeline that is run on newly imported documents.
+    """
+    return refs_pipeline().add_italics_finder()
@@ -7,6 +7,49 @@ from indigo.xmlutils import closest
 from indigo_api.models import Subtype, Work
 
 
+class WorkIndex:
+    """ In-memory index of the works in a place, so that references can be resolved without
+    a database query per reference. The works are loaded with a single query.
+
+    Use `for_document` to share indexes between all the refs finders that run over a document.
+    """
+
+    def __init__(self, place):
+        """ :param place: place code, such as za or za-cpt
+        """
+        self.place = place
+        self.works = list(
+            Work.objects
+            .filter(frbr_uri__startswith=f'/akn/{place}/')
+            .order_by('pk')
+            .prefetch_related(None)
+            .values_list('frbr_uri', 'properties'))
+        self.frbr_uris = {frbr_uri for frbr_uri, properties in self.works}
+
+    def exists(self, frbr_uri):
+        return frbr_uri in self.frbr_uris
+
+    def property_values(self, properties):
+        """ Map from work property values to work FRBR URIs, for the given property names.
+        """
+        return {
+            props[p]: frbr_uri
+            for p in properties
+            for frbr_uri, props in self.works
+            if props.get(p)
+        }
+
+    @classmethod
+    def for_document(cls, document, place):
+        """ The index for `place`, cached on `document`.
+        """
+        if not hasattr(document, '_work_indexes'):
+            document._work_indexes = {}
+        if place not in document._work_indexes:
+            document._work_indexes[place] = cls(place)
+        return document._work_indexes[place]
+
+
 class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
     """ Finds references to Acts in documents.
     """
@@ -18,11 +61,16 @@ class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
+        self.find_references_in_tree(root, document)
+        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+
+    def find_references_in_tree(self, root, document):
+        """ Find references in the already-parsed lxml tree +root+ of +document+, changing the tree in place.
+        """
         self.document = document
         self.frbr_uri = document.doc.frbr_uri
         self.setup(root)
         self.markup_patterns(root)
-        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
     def is_valid(self, node, match):
         if self.make_href(match) != self.frbr_uri.work_uri():
@@ -42,12 +90,16 @@ class BaseRefsFinder(LocaleBasedMatcher, TextPatternMarker):
         """
         link_uri = f"/akn/{self.frbr_uri.country}/act/{match.group('year')}/{match.group('num')}"
         if self.frbr_uri.locality:
-            local = f"/akn/{self.frbr_uri.country}-{self.frbr_uri.locality}/act/{match.group('year')}/{match.group('num')}"
-            if Work.objects.filter(frbr_uri=local).exists():
+            place = f"{self.frbr_uri.country}-{self.frbr_uri.locality}"
+            local = f"/akn/{place}/act/{match.group('year')}/{match.group('num')}"
+            if self.work_index(place).exists(local):
                 link_uri = local
 
         return link_uri
 
+    def work_index(self, place):
+        return WorkIndex.for_document(self.document, place)
+
 
 @plugins.register('refs')
 class RefsFinderENG(BaseRefsFinder):
@@ -174,7 +226,7 @@ class RefsFinderCapENG(BaseRefsFinder):
         place = locality or country
         cap_strings = [p for p in place.settings.work_properties if p.startswith('cap')]
 
-        self.cap_numbers = {w.properties[c]: w.frbr_uri for c in cap_strings for w in Work.objects.filter(country=country, locality=locality) if w.properties.get(c)}
+        self.cap_numbers = WorkIndex.for_document(document, place.place_code).property_values(cap_strings)
 
     def is_valid(self, node, match):
         return self.cap_numbers.get(match.group('num'))
@@ -200,9 +252,14 @@ class BaseInternalRefsFinder(LocaleBasedMatcher, MultipleTextPatternMarker):
         # we need to use etree, not objectify, so we can't use document.doc.root,
         # we have to re-parse it
         root = etree.fromstring(document.content)
+        self.find_references_in_tree(root, document)
+        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
+
+    def find_references_in_tree(self, root, document):
+        """ Find references in the already-parsed lxml tree +root+ of +document+, changing the tree in place.
+        """
         self.setup(root)
         self.markup_patterns(root)
-        document.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
 
     def is_valid(self, node, match):
         return self.find_target(node, match) is not None
@@ -289,11 +346,12 @@ class SectionRefsFinderENG(BaseInternalRefsFinder):
     item_re = re.compile(r'(?P<ref>(?P<num>(?<!\()\d+[A-Z0-9]*(?!\))))(\s*\([A-Z0-9]+\))*', re.IGNORECASE)
 
     candidate_xpath = ".//text()[contains(translate(., 'S', 's'), 'section') and not(ancestor::a:ref)]"
-    match_cache = {}
 
     def setup(self, root):
         super().setup(root)
         self.ancestor_tags = set(f'{{{self.ns}}}{t}' for t in self.ancestors)
+        # ancestor element to an index of its sections, from number to section element
+        self.section_index = {}
 
     def is_valid(self, node, match):
         # check that it's not an external reference
@@ -306,14 +364,20 @@ class SectionRefsFinderENG(BaseInternalRefsFinder):
         return self.find_target(node, match) is not None
 
     def find_target(self, node, match):
-        num = match.group('num')
         # find the closest ancestor to scope the lookups to
         ancestor = closest(node, lambda e: e.tag in self.ancestor_tags)
-        candidate_elements = ancestor.xpath(f".//a:section[a:num[text()='{num}.']]", namespaces=self.nsmap)
-        if candidate_elements:
-            self.match_cache[num] = candidate_elements[0]
-            return candidate_elements[0]
-
-    def make_href(self, node, match):
-        target = self.match_cache[match.group('num')]
-        return '#' + target.get('eId')
+        if ancestor is not None:
+            if ancestor not in self.section_index:
+                self.section_index[ancestor] = self.build_section_index(ancestor)
+            return self.section_index[ancestor].get(match.group('num') + '.')
+
+    def build_section_index(self, ancestor):
+        """ Index the sections in ancestor by number, in a single pass. Where numbers are duplicated,
+        the first section in document order wins.
+        """
+        index = {}
+        for section in ancestor.iterdescendants(f'{{{self.ns}}}section'):
+            for num in section.iterchildren(f'{{{self.ns}}}num'):
+                for text in num.xpath('text()'):
+                    index.setdefault(str(text), section)
+        return index
@@ -4,6 +4,7 @@ from collections import Counter
 from itertools import chain
 from lxml import etree
 
+from indigo.analysis.terms.matcher import TermMatcher
 from indigo.plugins import LocaleBasedMatcher
 
 log = logging.getLogger(__name__)
@@ -177,9 +178,32 @@ class BaseTermsFinder(LocaleBasedMatcher):
         # term to term id
         term_lookup = self.make_term_index(terms)
 
-        # big regex of all the terms, longest first
-        terms = sorted(term_lookup.keys(), key=lambda t: -len(t))
-        terms_re = re.compile(r'\b(%s)\b' % '|'.join(re.escape(t) for t in terms))
+        # automaton of all the terms, which prefers the longest term
+        matcher = TermMatcher(term_lookup.keys())
+
+        ancestor_tags = set(self.ancestors)
+        no_term_markup = set(self.no_term_markup)
+
+        # ancestor context, calculated once for each element and shared with its descendants
+        no_markup_cache = {}
+        refers_to_cache = {}
+
+        def in_no_term_markup(node):
+            # is node, or any of its ancestors, an element that must not contain terms?
+            if node is None:
+                return False
+            if node not in no_markup_cache:
+                no_markup_cache[node] = node.tag in no_term_markup or in_no_term_markup(node.getparent())
+            return no_markup_cache[node]
+
+        def closest_refers_to(node):
+            # the refersTo attribute of node, or its closest ancestor, that is one of self.ancestors
+            if node is None:
+                return None
+            if node not in refers_to_cache:
+                refers_to = node.get('refersTo') if node.tag in ancestor_tags else None
+                refers_to_cache[node] = refers_to or closest_refers_to(node.getparent())
+            return refers_to_cache[node]
 
         def make_term(match):
             term_id = term_lookup[match.group(1)]
@@ -190,21 +214,20 @@ class BaseTermsFinder(LocaleBasedMatcher):
 
         def in_own_defn(node, match):
             # don't link to a term inside its own definition
-            term_id = '#' + term_lookup[match.group(1)]
-            for ancestor in node.iterancestors(self.ancestors):
-                if ancestor.get('refersTo'):
-                    return ancestor.get('refersTo') == term_id
+            refers_to = closest_refers_to(node.getparent())
+            if refers_to:
+                return refers_to == '#' + term_lookup[match.group(1)]
 
         for candidate in self.text_xpath(doc):
             node = candidate.getparent()
 
             # skip if we're already inside a def or term element
-            if node.tag in self.no_term_markup or len(list(node.iterancestors(self.no_term_markup))) > 0:
+            if in_no_term_markup(node):
                 continue
 
             if not candidate.is_tail:
                 # text directly inside a node
-                for match in terms_re.finditer(node.text):
+                for match in matcher.finditer(node.text):
                     log.debug("Matched " + match.group(1))
                     if in_own_defn(node, match):
                         log.debug("In own definition")
@@ -220,7 +243,7 @@ class BaseTermsFinder(LocaleBasedMatcher):
                     break
 
             while node is not None and node.tail:
-                for match in terms_re.finditer(node.tail):
+                for match in matcher.finditer(node.tail):
                     log.debug("Matched " + match.group(1))
                     if in_own_defn(node, match):
                         log.debug("In own definition")
@@ -0,0 +1,130 @@
+from collections import deque
+
+
+def is_word_char(c):
+    """ Is this a word character, as matched by \\w in a regular expression?
+    """
+    return c.isalnum() or c == '_'
+
+
+class TermMatch:
+    """ A match of a term in a string. This provides the parts of the :class:`re.Match` interface
+    that the terms finder uses.
+    """
+    __slots__ = ('string', 'term', '_start', '_end')
+
+    def __init__(self, string, term, start, end):
+        self.string = string
+        self.term = term
+        self._start = start
+        self._end = end
+
+    def group(self, group=0):
+        return self.term
+
+    def start(self, group=0):
+        return self._start
+
+    def end(self, group=0):
+        return self._end
+
+
+class TermMatcher:
+    """ Finds non-overlapping occurrences of a (potentially large) set of terms in text, using an
+    Aho-Corasick automaton. The text is scanned once, no matter how many terms there are.
+
+    Matches are identical to those of the regular expression ``\\b(term1|term2|...)\\b`` with the terms
+    sorted longest first: a match must start and end on a word boundary and, if more than one term matches
+    at a position, the longest one wins.
+    """
+
+    def __init__(self, terms):
+        # goto[state] is a dict from character to next state
+        self.goto = [{}]
+        # fail[state] is the state to fall back to when there is no transition
+        self.fail = [0]
+        # out[state] is a tuple of terms that end at this state
+        self.out = [()]
+        # depth[state] is the length of the text that leads to this state
+        self.depth = [0]
+
+        for term in set(terms):
+            if term:
+                self.add_term(term)
+        self.build_failure_links()
+
+    def add_term(self, term):
+        state = 0
+        for c in term:
+            nxt = self.goto[state].get(c)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append(())
+                self.depth.append(self.depth[state] + 1)
+                self.goto[state][c] = nxt
+            state = nxt
+        self.out[state] = (term,)
+
+    def build_failure_links(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for c, nxt in self.goto[state].items():
+                queue.append(nxt)
+
+                fail = self.fail[state]
+                while fail and c not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[nxt] = self.goto[fail].get(c, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def finditer(self, text):
+        """ Yield a :class:`TermMatch` for each match in text, from left to right.
+
+        Matches are yielded as soon as they are certain, so a caller that only needs the first match
+        doesn't scan the rest of the text.
+        """
+        goto = self.goto
+        fail = self.fail
+        out = self.out
+        depth = self.depth
+
+        # the longest term starting on a word boundary at each position, and ending on one,
+        # that hasn't been yielded yet
+        longest = {}
+        # the end of the last match yielded; matches don't overlap
+        pos = 0
+        state = 0
+        for i, c in enumerate(text):
+            while state and c not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(c, 0)
+
+            for term in out[state]:
+                start = i + 1 - len(term)
+                if len(term) > len(longest.get(start, '')) \
+                        and self.is_boundary(text, start) and self.is_boundary(text, i + 1):
+                    longest[start] = term
+
+            if longest:
+                # matches still to be found start no earlier than the text that leads to the current state,
+                # so matches starting before that are final; leftmost matches win
+                earliest = i + 1 - depth[state]
+                for start in sorted(s for s in longest if s < earliest):
+                    term = longest.pop(start)
+                    if start >= pos:
+                        pos = start + len(term)
+                        yield TermMatch(text, term, start, pos)
+
+        for start in sorted(longest):
+            term = longest[start]
+            if start >= pos:
+                pos = start + len(term)
+                yield TermMatch(text, term, start, pos)
+
+    def is_boundary(self, text, pos):
+        before = pos > 0 and is_word_char(text[pos - 1])
+        after = pos < len(text) and is_word_char(text[pos])
+        return before != after
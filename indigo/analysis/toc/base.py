@@ -123,6 +123,12 @@ class TOCBuilderBase(LocaleBasedMatcher):
 
     non_commenceable_toplevel_elements = set(['coverpage', 'preface', 'preamble', 'conclusions', 'attachment', 'component'])
 
+    subcomponent_index = None
+    """ Dict from (component, subcomponent) tuples to the XML element for that subcomponent, built
+    along with the table of contents by ``build_table_of_contents``. If more than one element has the
+    same subcomponent, the first one in document order is used.
+    """
+
     def table_of_contents_for_document(self, document):
         """ Build the table of contents for a document.
         """
@@ -174,6 +180,7 @@ class TOCBuilderBase(LocaleBasedMatcher):
             return self.build_table_of_contents()
 
     def build_table_of_contents(self):
+        self.subcomponent_index = {}
         toc = []
         for component, element in self.act.components().items():
             toc += self.process_elements(component, self.get_component_id(component, element), [element])
@@ -197,6 +204,8 @@ class TOCBuilderBase(LocaleBasedMatcher):
 
             if self.is_toc_element(e):
                 item = self.make_toc_entry(e, component, component_id, parent=parent)
+                if self.subcomponent_index is not None:
+                    self.subcomponent_index.setdefault((component, item.subcomponent), e)
                 item.children = self.process_elements(component, component_id, e.iterchildren(), parent=item)
                 items.append(item)
             else:
@@ -346,6 +355,7 @@ class TOCElement(object):
 
     :ivar children: further TOC elements contained in this one, defaults to empty list
     :ivar component: component name (after the ! in the FRBR URI) of the component that this item is a part of
+    :ivar component_id: XML id of the component that this item is a part of, or None for the main component
     :ivar element: :class:`lxml.objectify.ObjectifiedElement` the XML element of this TOC element
     :ivar heading: heading for this element, excluding the number, may be None
     :ivar id: XML id string of the node in the document, may be None
@@ -367,6 +377,7 @@ class TOCElement(object):
         self.children = children or []
         self.subcomponent = subcomponent
         self.title = None
+        self.component_id = component_id
         self.qualified_id = id_ if component == 'main' else f"{component_id}/{id_}"
         self.basic_unit = basic_unit
 
@@ -383,6 +394,27 @@ class TOCElement(object):
             'heading': self.heading,
         }
 
+    def as_stored_dict(self):
+        """ Serialise this element and its children so that they can be stored and later
+        rehydrated with :meth:`from_stored_dict`. The XML element is not included.
+        """
+        info = self.as_dict()
+        info['component_id'] = self.component_id
+        info['children'] = [c.as_stored_dict() for c in self.children]
+        return info
+
+    @classmethod
+    def from_stored_dict(cls, info):
+        """ Rehydrate an element (and its children) serialised with :meth:`as_stored_dict`.
+        The rehydrated element's ``element`` is None.
+        """
+        item = cls(None, info['component'], info['type'], heading=info['heading'], id_=info['id'], num=info['num'],
+                   subcomponent=info['subcomponent'], component_id=info['component_id'],
+                   basic_unit=info['basic_unit'],
+                   children=[cls.from_stored_dict(c) for c in info['children']])
+        item.title = info['title']
+        return item
+
 
 @plugins.register('commencements-beautifier')
 class CommencementsBeautifier(LocaleBasedMatcher):
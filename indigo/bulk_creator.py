@@ -3,13 +3,20 @@ import re
 import csv
 import io
 import logging
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 from cobalt import FrbrUri
 from django import forms
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import signals
 import requests
+from reversion import revisions as reversion
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.oauth2 import service_account
@@ -31,6 +38,54 @@ class SpreadsheetRow:
             setattr(self, k, v)
 
 
+class WorkIndex:
+    """ Existing works that a spreadsheet refers to, by FRBR URI and by title within a place, so that each
+    reference doesn't need its own query. Works that aren't loaded up front are looked up when first needed.
+    """
+    chunk_size = 1000
+
+    def __init__(self, country, locality):
+        self.country = country
+        self.locality = locality
+        self.by_frbr_uri = {}
+        self.by_title = {}
+
+    def load(self, frbr_uris, titles):
+        frbr_uris = [u for u in frbr_uris if u not in self.by_frbr_uri]
+        for i in range(0, len(frbr_uris), self.chunk_size):
+            chunk = frbr_uris[i:i + self.chunk_size]
+            self.by_frbr_uri.update({u: None for u in chunk})
+            for work in Work.objects.filter(frbr_uri__in=chunk):
+                self.by_frbr_uri[work.frbr_uri] = work
+
+        titles = [t for t in titles if t not in self.by_title]
+        for i in range(0, len(titles), self.chunk_size):
+            chunk = titles[i:i + self.chunk_size]
+            matches = defaultdict(list)
+            for work in Work.objects.filter(title__in=chunk, country=self.country, locality=self.locality):
+                matches[work.title].append(work)
+            self.by_title.update({t: matches[t] for t in chunk})
+
+    def get_by_frbr_uri(self, frbr_uri):
+        if frbr_uri not in self.by_frbr_uri:
+            self.load([frbr_uri], [])
+        return self.by_frbr_uri[frbr_uri]
+
+    def get_by_title(self, title):
+        """ All the works in this place with this title.
+        """
+        if title not in self.by_title:
+            self.load([], [title])
+        return self.by_title[title]
+
+    def add(self, work):
+        """ Add a work that is being created.
+        """
+        self.by_frbr_uri[work.frbr_uri] = work
+        if work.title in self.by_title:
+            self.by_title[work.title].append(work)
+
+
 class RowValidationFormBase(forms.Form):
     # See descriptions, examples of the fields at https://docs.laws.africa/managing-works/bulk-imports-spreadsheet
     # core details
@@ -140,6 +195,14 @@ class BaseBulkCreator(LocaleBasedMatcher):
 
     GSHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
 
+    batch_size = 500
+    """ Number of works to create at a time.
+    """
+
+    max_workers = 8
+    """ Number of publication documents to look up in parallel.
+    """
+
     def gsheets_id_from_url(self, url):
         match = re.match(r'^https://docs.google.com/spreadsheets/d/(\S+)/', url)
         if match:
@@ -225,6 +288,7 @@ class BaseBulkCreator(LocaleBasedMatcher):
         self.workflow = workflow
         self.subtypes = Subtype.objects.all()
         self.dry_run = dry_run
+        self.timings = []
 
         self.works = []
 
@@ -239,115 +303,224 @@ class BaseBulkCreator(LocaleBasedMatcher):
             for row in table[1:]
         ]
 
-        for idx, row in enumerate(rows):
-            # ignore if it's blank or explicitly marked 'ignore' in the 'ignore' column
-            if row.get('ignore') or not any(row.values()):
-                continue
+        with self.timed('validate'):
+            for idx, row in enumerate(rows):
+                # ignore if it's blank or explicitly marked 'ignore' in the 'ignore' column
+                if row.get('ignore') or not any(row.values()):
+                    continue
+
+                self.works.append(self.validate_spreadsheet_row(row, idx))
 
-            self.works.append(self.create_work(row, idx))
+        with self.timed('index'):
+            self.work_index = self.build_work_index()
+
+        with self.timed('create'):
+            for row in self.works:
+                self.prepare_work(row)
+            self.save_works([row.work for row in self.works if row.status == 'success'])
+
+        with self.timed('publications'):
+            self.find_publications([row for row in self.works if row.status == 'success'])
+
+        with self.timed('tasks'):
+            for row in self.works:
+                if row.status == 'success':
+                    self.work_created(row.work, row)
 
         self.check_preview_duplicates()
 
-        # link all commencements first so that amendments and repeals will have dates to work with (include duplicates)
-        for row in self.works:
-            if row.status and row.commenced:
-                self.link_commencement_passive(row)
-            if row.status and row.commences:
-                self.link_commencement_active(row)
+        with self.timed('commencements'):
+            # link all commencements first so that amendments and repeals will have dates to work with (include duplicates)
+            for row in self.works:
+                if row.status and row.commenced:
+                    self.link_commencement_passive(row)
+                if row.status and row.commences:
+                    self.link_commencement_active(row)
 
-        for row in self.works:
-            if row.status:
-                # this will check duplicate works as well
-                # (they won't overwrite the existing works but the relationships will be linked)
-                if row.primary_work:
-                    self.link_parent_work(row)
+        with self.timed('relationships'):
+            for row in self.works:
+                if row.status:
+                    # this will check duplicate works as well
+                    # (they won't overwrite the existing works but the relationships will be linked)
+                    if row.primary_work:
+                        self.link_parent_work(row)
 
-                if row.subleg:
-                    self.link_children_works(row)
+                    if row.subleg:
+                        self.link_children_works(row)
 
-                if row.taxonomy:
-                    self.link_taxonomy(row)
+                    if row.taxonomy:
+                        self.link_taxonomy(row)
 
-                if row.amended_by:
-                    self.link_amendment_passive(row)
+                    if row.amended_by:
+                        self.link_amendment_passive(row)
 
-                if row.amends:
-                    self.link_amendment_active(row)
+                    if row.amends:
+                        self.link_amendment_active(row)
 
-                if row.repealed_by:
-                    self.link_repeal_passive(row)
+                    if row.repealed_by:
+                        self.link_repeal_passive(row)
 
-                if row.repeals:
-                    self.link_repeal_active(row)
+                    if row.repeals:
+                        self.link_repeal_active(row)
+
+        self.log.info("Bulk creation of %d rows took %s" % (
+            len(self.works), ", ".join(f"{name}={secs:.3f}s" for name, secs in self.timings)))
 
         return self.works
 
+    @contextmanager
+    def timed(self, name):
+        """ Record the time taken by a phase of the bulk creation in self.timings.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+
     def create_work(self, row, idx):
+        """ Validate and create the work for a single row.
+        """
+        self.work_index = getattr(self, 'work_index', None) or WorkIndex(self.country, self.locality)
+        row = self.validate_spreadsheet_row(row, idx)
+        self.prepare_work(row)
+        if row.status == 'success':
+            self.save_works([row.work])
+            self.find_publications([row])
+            self.work_created(row.work, row)
+        return row
+
+    def validate_spreadsheet_row(self, row, idx):
         # handle spreadsheet that still uses 'principal'
         row['stub'] = row.get('stub') if 'stub' in row else not row.get('principal')
         row = self.validate_row(row)
         row.status = None
         row.row_number = idx + 2
+        return row
+
+    def build_work_index(self):
+        """ Load all the existing works referred to by the spreadsheet, by FRBR URI or title, in a few queries.
+        """
+        index = WorkIndex(self.country, self.locality)
+        frbr_uris = set()
+        titles = set()
+
+        for row in self.works:
+            if row.errors:
+                continue
+            frbr_uris.add(self.get_frbr_uri(row))
+
+            for attr in ['commenced_by', 'commences', 'repealed_by', 'repeals', 'primary_work', 'amended_by', 'amends']:
+                value = getattr(row, attr, None)
+                if value:
+                    self.add_work_reference(value, frbr_uris, titles)
+
+            for child in (getattr(row, 'subleg', None) or '').split(';'):
+                if child.strip():
+                    self.add_work_reference(child.strip(), frbr_uris, titles)
 
+        index.load(frbr_uris, titles)
+        return index
+
+    def add_work_reference(self, given_string, frbr_uris, titles):
+        """ Add a reference to a work from the spreadsheet to either frbr_uris or titles, as find_work would use it.
+        """
+        substring = given_string.split()[0]
+        try:
+            FrbrUri.parse(substring)
+            frbr_uris.add(substring)
+        except ValueError:
+            titles.add(given_string)
+
+    def prepare_work(self, row):
+        """ Build and validate the new work for a validated row, or find the existing work if it's a duplicate.
+        """
         if row.errors:
-            return row
+            return
 
         frbr_uri = self.get_frbr_uri(row)
 
-        try:
-            row.work = Work.objects.get(frbr_uri=frbr_uri)
+        existing = self.work_index.get_by_frbr_uri(frbr_uri)
+        if existing:
+            row.work = existing
             row.status = 'duplicate'
+            return
 
-        except Work.DoesNotExist:
-            work = Work()
-
-            work.frbr_uri = frbr_uri
-            work.country = self.country
-            work.locality = self.locality
-            for attribute in ['title',
-                              'publication_name', 'publication_number',
-                              'assent_date', 'publication_date',
-                              'commenced', 'stub']:
-                setattr(work, attribute, getattr(row, attribute, None))
-            work.created_by_user = self.user
-            work.updated_by_user = self.user
-            self.add_extra_properties(work, row)
-
-            try:
-                work.full_clean()
-                if not self.dry_run:
-                    work.save_with_revision(self.user)
+        work = Work()
 
-                    # signals
-                    if not self.testing:
-                        work_changed.send(sender=work.__class__, work=work, request=self.request)
+        work.frbr_uri = frbr_uri
+        work.country = self.country
+        work.locality = self.locality
+        for attribute in ['title',
+                          'publication_name', 'publication_number',
+                          'assent_date', 'publication_date',
+                          'commenced', 'stub']:
+            setattr(work, attribute, getattr(row, attribute, None))
+        work.created_by_user = self.user
+        work.updated_by_user = self.user
+        self.add_extra_properties(work, row)
 
-                # info for linking publication document
-                row.params = {
-                    'date': work.publication_date,
-                    'number': work.publication_number,
-                    'publication': work.publication_name,
-                    'country': self.country.place_code,
-                    'locality': self.locality.code if self.locality else None,
-                }
+        try:
+            # the work index has already checked that the FRBR URI is unique, and the related objects are known to exist
+            work.full_clean(exclude=['country', 'locality', 'created_by_user', 'updated_by_user'], validate_unique=False)
 
-                self.link_publication_document(work, row)
+            if not self.dry_run:
+                # later rows for the same work are duplicates of this one
+                self.work_index.add(work)
 
-                if not work.stub:
-                    self.create_task(work, row, task_type='import-content')
+            row.work = work
+            row.status = 'success'
 
-                row.work = work
-                row.status = 'success'
+        except ValidationError as e:
+            if hasattr(e, 'message_dict'):
+                row.errors = ' '.join(
+                    ['%s: %s' % (f, '; '.join(errs)) for f, errs in e.message_dict.items()]
+                )
+            else:
+                row.errors = str(e)
 
-            except ValidationError as e:
-                if hasattr(e, 'message_dict'):
-                    row.errors = ' '.join(
-                        ['%s: %s' % (f, '; '.join(errs)) for f, errs in e.message_dict.items()]
-                    )
-                else:
-                    row.errors = str(e)
+    def save_works(self, works):
+        """ Save new works in bulk, with one revision for each batch of works.
+        """
+        if self.dry_run:
+            return
 
-        return row
+        for i in range(0, len(works), self.batch_size):
+            batch = works[i:i + self.batch_size]
+            for work in batch:
+                # bulk_create doesn't send pre_save
+                work.copy_frbr_uri_attributes()
+
+            with transaction.atomic(), reversion.create_revision():
+                reversion.set_user(self.user)
+                Work.objects.bulk_create(batch)
+                for work in batch:
+                    reversion.add_to_revision(work)
+
+            for work in batch:
+                # bulk_create doesn't send post_save, which records activity
+                signals.post_save.send(sender=Work, instance=work, created=True, update_fields=None, raw=False, using=work._state.db)
+                if not self.testing:
+                    work_changed.send(sender=work.__class__, work=work, request=self.request)
+
+    def work_created(self, work, row):
+        """ Link the publication document of a newly created work, and create its tasks.
+        """
+        # info for linking publication document
+        row.params = self.publication_params(work)
+        self.link_publication_document(work, row)
+
+        if not work.stub:
+            self.create_task(work, row, task_type='import-content')
+
+    def publication_params(self, work):
+        return {
+            'date': work.publication_date,
+            'number': work.publication_number,
+            'publication': work.publication_name,
+            'country': self.country.place_code,
+            'locality': self.locality.code if self.locality else None,
+        }
 
     def transform_aliases(self, row):
         """ Adds the term the platform expects to `row` for validation (and later saving).
@@ -416,19 +589,42 @@ class BaseBulkCreator(LocaleBasedMatcher):
             if hasattr(row, extra_property):
                 work.properties[extra_property] = str(getattr(row, extra_property) or '')
 
-    def link_publication_document(self, work, row):
+    def find_publications(self, rows):
+        """ Look up the publication documents for the works in these rows, in parallel, because each
+        lookup is a slow request to an external service. The results are stored in row.publications.
+        """
+        def find(row):
+            try:
+                row.publications = self.find_work_publications(row.work)
+            finally:
+                # don't leak database connections opened by the finder in this thread
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(find, rows))
+
+    def find_work_publications(self, work):
+        """ Find the publication documents for a work, or return None if they can't be found.
+        """
+        params = self.publication_params(work)
         locality_code = self.locality.code if self.locality else None
         finder = plugins.for_locale('publications', self.country.code, None, locality_code)
 
-        if not finder or not row.params.get('date'):
-            return self.create_task(work, row, task_type='link-gazette')
+        if not finder or not params.get('date'):
+            return None
 
         try:
-            publications = finder.find_publications(row.params)
+            return finder.find_publications(params)
         except requests.HTTPError:
-            return self.create_task(work, row, task_type='link-gazette')
+            return None
 
-        if len(publications) != 1:
+    def link_publication_document(self, work, row):
+        if hasattr(row, 'publications'):
+            publications = row.publications
+        else:
+            publications = self.find_work_publications(work)
+
+        if not publications or len(publications) != 1:
             return self.create_task(work, row, task_type='link-gazette')
 
         if not self.dry_run:
@@ -442,9 +638,9 @@ class BaseBulkCreator(LocaleBasedMatcher):
 
     def check_preview_duplicates(self):
         if self.dry_run:
-            frbr_uris = [row.work.frbr_uri for row in self.works if hasattr(row, 'work')]
+            frbr_uris = Counter(row.work.frbr_uri for row in self.works if hasattr(row, 'work'))
             for row in self.works:
-                if hasattr(row, 'work') and frbr_uris.count(row.work.frbr_uri) > 1:
+                if hasattr(row, 'work') and frbr_uris[row.work.frbr_uri] > 1:
                     row.notes.append('Duplicate in batch')
 
     def link_commencement_passive(self, row):
@@ -902,15 +1098,18 @@ Possible reasons:
             If not, assume a title has been given and try to match on the whole string.
             In the case of a dry run, return a string if the work hasn't been found.
         """
+        if not getattr(self, 'work_index', None):
+            self.work_index = WorkIndex(self.country, self.locality)
+
         work = None
         substring = given_string.split()[0]
         try:
             FrbrUri.parse(substring)
-            work = Work.objects.filter(frbr_uri=substring).first()
+            work = self.work_index.get_by_frbr_uri(substring)
         except ValueError:
-            potential_matches = Work.objects.filter(title=given_string, country=self.country, locality=self.locality)
+            potential_matches = self.work_index.get_by_title(given_string)
             if len(potential_matches) == 1:
-                work = potential_matches.first()
+                work = potential_matches[0]
         if self.dry_run and not work:
             # neither the FRBR URI nor the title matched,
             # but it could be in the current batch
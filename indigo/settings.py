@@ -130,6 +130,42 @@ INDIGO = {
     # see http://docs.oasis-open.org/legaldocml/akn-core/v1.0/os/part1-vocabulary/akn-core-v1.0-os-part1-vocabulary.html#_Toc523925025
     'DOCTYPES': [('Act', 'act')],
     'EXTRA_DOCTYPES': {},
+
+    # Name of the cache in CACHES used to store HTML rendered from documents' XML
+    'RENDERED_HTML_CACHE': 'rendered_html',
+
+    # HTML longer than this many characters isn't cached. With the maximum number of entries in the cache,
+    # this bounds the memory used by the cache.
+    'RENDERED_HTML_CACHE_MAX_ENTRY_SIZE': int(os.environ.get('INDIGO_RENDERED_HTML_CACHE_MAX_ENTRY_SIZE', 2 * 1024 * 1024)),
+
+    # Should PDF and ePUB versions of documents be rendered in the background?
+    # Requires a separate task runner for django-background-tasks.
+    'DOCUMENT_ARTEFACTS_BACKGROUND': False,
+
+    # Should changes to a work be copied into its documents in the background?
+    # Requires a separate task runner for django-background-tasks.
+    'WORK_DOCUMENT_UPDATES_BACKGROUND': False,
+
+    # Name of the cache in CACHES used to store the differences between document revisions
+    'REVISION_DIFF_CACHE': 'default',
+
+    # Should the differences between a document's new revision and the one before it be calculated
+    # in the background when the revision is created? Requires a separate task runner for django-background-tasks.
+    'REVISION_DIFFS_BACKGROUND': False,
+
+    # Name of the cache in CACHES used to share the resolver's index between processes
+    'RESOLVER_INDEX_CACHE': 'default',
+
+    # Name of the cache in CACHES used to track which users are active in which documents. If None,
+    # activity is stored in the database.
+    'DOCUMENT_ACTIVITY_CACHE': None,
+
+    # Number of long-lived slaw processes used to parse documents, per process. If 0, a new slaw
+    # process is started for each parse.
+    'SLAW_WORKERS': int(os.environ.get('INDIGO_SLAW_WORKERS', 2)),
+
+    # Number of parses after which a slaw process is replaced
+    'SLAW_WORKER_MAX_JOBS': int(os.environ.get('INDIGO_SLAW_WORKER_MAX_JOBS', 100)),
 }
 
 # Database
@@ -200,6 +236,9 @@ if DEBUG:
         'default': {
             'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
         },
+        'rendered_html': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        },
     }
 else:
     CACHES = {
@@ -207,6 +246,16 @@ else:
             'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
             'LOCATION': '/var/tmp/django_cache',
         },
+        # rendered HTML is keyed by content, so entries never go stale; least recently used
+        # entries are evicted once there are more than MAX_ENTRIES
+        'rendered_html': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'rendered_html',
+            'TIMEOUT': None,
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('INDIGO_RENDERED_HTML_CACHE_ENTRIES', 25)),
+            },
+        },
     }
 
 
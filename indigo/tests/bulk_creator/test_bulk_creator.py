@@ -101,6 +101,21 @@ class BaseBulkCreatorTest(testcases.TestCase):
         task_titles = [t.title for t in tasks]
         self.assertIn('Link gazette', task_titles)
 
+    def test_basic_live_bulk(self):
+        self.creator.batch_size = 1
+        works = self.get_works(False, 'basic.csv')
+
+        for row in works:
+            work = Work.objects.get(pk=row.work.pk)
+            # attributes that are usually set when a work is saved
+            self.assertEqual(2020, work.frbr_year)
+            self.assertEqual(1, work.versions().count())
+            self.assertTrue(work.created_at)
+
+        self.assertEqual(
+            ['validate', 'index', 'create', 'publications', 'tasks', 'commencements', 'relationships'],
+            [name for name, secs in self.creator.timings])
+
     def test_errors(self):
         jhb = Locality.objects.get(pk=1)
         self.creator.locality = jhb
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+from django.test import TestCase
+from mock import patch
+
+from indigo.analysis.pipeline import AnalysisPipeline, refs_pipeline
+from indigo.analysis.refs.base import SectionRefsFinderENG, RefsFinderENG
+from indigo_api.models import Document, Language, Work
+from indigo_api.tests.fixtures import document_fixture
+
+
+class AnalysisPipelineTestCase(TestCase):
+    fixtures = ['languages_data', 'countries']
+
+    def setUp(self):
+        self.work = Work(frbr_uri='/akn/za/act/1991/1')
+        self.eng = Language.for_code('eng')
+        self.maxDiff = None
+
+    def make_document(self):
+        return Document(
+            work=self.work,
+            document_xml=document_fixture(
+                xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <heading>Tester</heading>
+          <content>
+            <p>Something to do with Act no 22 of 2012 and section 2.</p>
+          </content>
+        </section>
+        <section eId="sec_2">
+          <num>2.</num>
+          <heading>Second</heading>
+          <content>
+            <p>Another thing.</p>
+          </content>
+        </section>"""
+            ),
+            language=self.eng)
+
+    def test_same_as_separate_finders(self):
+        expected = self.make_document()
+        RefsFinderENG().find_references_in_document(expected)
+        SectionRefsFinderENG().find_references_in_document(expected)
+
+        document = self.make_document()
+        pipeline = AnalysisPipeline()
+        pipeline.add_stage('refs', lambda root, doc: RefsFinderENG().find_references_in_tree(root, doc))
+        pipeline.add_stage('internal-refs', lambda root, doc: SectionRefsFinderENG().find_references_in_tree(root, doc))
+        pipeline.run(document)
+
+        self.assertEqual(expected.content, document.content)
+        self.assertIn('<ref href="/akn/za/act/2012/22">no 22 of 2012</ref>', document.content)
+        self.assertIn('<ref href="#sec_2">section 2</ref>', document.content)
+
+    def test_document_only_finder(self):
+        class DocumentOnlyFinder:
+            # older plugins only implement find_references_in_document
+            def find_references_in_document(self, document):
+                RefsFinderENG().find_references_in_document(document)
+
+        def for_document(topic, document):
+            if topic == 'refs-act-names':
+                return DocumentOnlyFinder()
+            if topic == 'internal-refs':
+                return SectionRefsFinderENG()
+
+        document = self.make_document()
+        with patch('indigo.analysis.pipeline.plugins.for_document', side_effect=for_document):
+            refs_pipeline().run(document)
+
+        self.assertIn('<ref href="/akn/za/act/2012/22">no 22 of 2012</ref>', document.content)
+        # later stages use the re-parsed tree
+        self.assertIn('<ref href="#sec_2">section 2</ref>', document.content)
+
+    def test_timings(self):
+        document = self.make_document()
+        pipeline = AnalysisPipeline()
+        pipeline.add_stage('noop', lambda root, doc: None)
+        pipeline.run(document)
+
+        self.assertEqual(['parse', 'noop', 'serialise', 'update'], [name for name, secs in pipeline.timings])
+        self.assertGreaterEqual(pipeline.total_time(), 0)
+
+    def test_no_stages(self):
+        document = self.make_document()
+        xml = document.content
+        AnalysisPipeline().run(document)
+
+        self.assertEqual(xml, document.content)
+        self.assertEqual([], AnalysisPipeline().timings)
@@ -2,8 +2,12 @@
 from unittest import TestCase
 
 import lxml.html
+from django.test import TestCase as DjangoTestCase
+from mock import patch
 
-from indigo.analysis.differ import AttributeDiffer
+from indigo.analysis.differ import AttributeDiffer, AKNHTMLDiffer, HTMLFormatter
+from indigo_api.models import Document
+from indigo_api.tests.fixtures import document_fixture
 
 
 def as_tree(html):
@@ -78,6 +82,49 @@ class AttributeDifferTestCase(TestCase):
             '<p>Some text <span class="diff-pair"><del>bold text and a tail.</del><ins>&#xA0;</ins></span><b class="ins ">bold text</b><ins> and a tail.</ins></p>',
         )
 
+    def test_provisions_changed(self):
+        old = as_tree(
+            '<div>'
+            '<section class="akn-section" id="sec_1"><p>unchanged</p></section>'
+            '<section class="akn-section" id="sec_2"><p>some old text</p></section>'
+            '<section class="akn-section" id="sec_3"><p>removed</p></section>'
+            '</div>')
+        new = as_tree(
+            '<div>'
+            '<section class="akn-section" id="sec_1"><p>unchanged</p></section>'
+            '<section class="akn-section" id="sec_2"><p>some new text</p></section>'
+            '<section class="akn-section" id="sec_4"><p>added</p></section>'
+            '</div>')
+
+        differ = AKNHTMLDiffer()
+        with patch.object(differ, 'diff_trees', wraps=differ.diff_trees) as diff_trees:
+            diff = differ.diff_html(old, new)
+        # only the changed provision is diffed with xmldiff
+        self.assertEqual(1, diff_trees.call_count)
+        self.assertEqual('sec_2', diff_trees.call_args[0][1].get('id'))
+
+        self.assertEqual(
+            as_html(diff),
+            '<div>'
+            '<section class="akn-section" id="sec_1"><p>unchanged</p></section>'
+            '<section class="akn-section" id="sec_2"><p>some <span class="diff-pair"><del>old</del><ins>new</ins></span> text</p></section>'
+            '<section class="del akn-section" id="sec_3"><p>removed</p></section>'
+            '<section class="ins akn-section" id="sec_4"><p>added</p></section>'
+            '</div>',
+        )
+
+    def test_provisions_hierarchical_same_as_full(self):
+        old = '<div><h1>Title</h1><section class="akn-section" id="sec_1"><p>some old text</p></section></div>'
+        new = '<div><h1>New title</h1><section class="akn-section" id="sec_1"><p>some new text</p></section></div>'
+
+        full = AKNHTMLDiffer()
+        full.hierarchical = False
+
+        self.assertEqual(
+            as_html(full.diff_html(as_tree(old), as_tree(new))),
+            as_html(AKNHTMLDiffer().diff_html(as_tree(old), as_tree(new))),
+        )
+
     def test_diff_lists_deleted(self):
         diffs = self.differ.diff_lists('test', 'Test', ['1', '2', '3'], ['1', '3'])
         self.assertEqual({
@@ -141,3 +188,30 @@ class AttributeDifferTestCase(TestCase):
                 'html_old': '3'
             }]},
             diffs)
+
+
+class HTMLFormatterTestCase(TestCase):
+    def test_xslt_compiled_once(self):
+        self.assertIs(HTMLFormatter().get_transform(), AKNHTMLDiffer().get_formatter().get_transform())
+
+
+class DocumentHTMLDifferTestCase(DjangoTestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work', 'drafts']
+
+    def section(self, n, text):
+        return f'<section eId="sec_{n}"><num>{n}.</num><content><p>{text}</p></content></section>'
+
+    def test_only_changed_provision_diffed(self):
+        document = Document.objects.get(pk=1)
+        document.content = document_fixture(xml=self.section(1, 'unchanged') + self.section(2, 'some old text'))
+        old = as_tree(document.to_html())
+        document.content = document_fixture(xml=self.section(1, 'unchanged') + self.section(2, 'some new text'))
+        new = as_tree(document.to_html())
+
+        # the sections are inside article.akn-act and span.akn-body, which are diffed as containers
+        differ = AKNHTMLDiffer()
+        with patch.object(differ, 'diff_trees', wraps=differ.diff_trees) as diff_trees:
+            diff = differ.diff_html(old, new)
+        self.assertEqual(1, diff_trees.call_count)
+        self.assertEqual('sec_2', diff_trees.call_args[0][1].get('id'))
+        self.assertIn('<del>old</del><ins>new</ins>', as_html(diff))
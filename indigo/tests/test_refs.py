@@ -1,12 +1,14 @@
 # -*- coding: utf-8 -*-
 from lxml import etree
+from mock import patch
 
 from django.conf import settings
 from django.test import TestCase
 
 from cobalt import FrbrUri
 
-from indigo.analysis.refs.base import SectionRefsFinderENG, RefsFinderENG, RefsFinderSubtypesENG, RefsFinderCapENG
+from indigo.analysis.refs.base import SectionRefsFinderENG, RefsFinderENG, RefsFinderSubtypesENG, RefsFinderCapENG, \
+    WorkIndex
 
 from indigo_api.models import Document, Language, Work, Country, User, Subtype
 from indigo_api.tests.fixtures import document_fixture
@@ -720,6 +722,35 @@ class SectionRefsFinderTestCase(TestCase):
         expected.content = etree.tostring(root, encoding='utf-8').decode('utf-8')
         self.assertEqual(expected.content, document.content)
 
+    def test_section_targets_not_shared_between_documents(self):
+        def make_document(eid):
+            return Document(
+                work=self.work,
+                document_xml=document_fixture(
+                    xml=f"""
+      <section eId="sec_1">
+        <num>1.</num>
+        <content>
+          <p>As given in section 2, blah.</p>
+        </content>
+      </section>
+      <section eId="{eid}">
+        <num>2.</num>
+        <content>
+          <p>Hi!</p>
+        </content>
+      </section>"""
+                ),
+                language=self.eng)
+
+        first = make_document('sec_2')
+        self.section_refs_finder.find_references_in_document(first)
+        self.assertIn('<ref href="#sec_2">section 2</ref>', first.content)
+
+        second = make_document('sec_2_other')
+        self.section_refs_finder.find_references_in_document(second)
+        self.assertIn('<ref href="#sec_2_other">section 2</ref>', second.content)
+
 
 class RefsFinderENGTestCase(TestCase):
     fixtures = ['languages_data', 'countries']
@@ -930,3 +961,29 @@ class RefsFinderCapENGTestCase(TestCase):
         self.assertEqual(expected.content, document.content)
         # set back to what it is in settings.py
         settings.INDIGO['WORK_PROPERTIES'] = {}
+
+    @patch.dict(settings.INDIGO, {'WORK_PROPERTIES': {'za': {'cap': 'Chapter (cap)'}}})
+    def test_cap_numbers_and_local_acts_share_index(self):
+        za = Country.objects.get(pk=1)
+        user1 = User.objects.get(pk=1)
+
+        work = Work(
+            frbr_uri='/akn/za/act/2002/5',
+            title='Act 5 of 2002',
+            country=za,
+            created_by_user=user1,
+            updated_by_user=user1,
+        )
+        work.properties['cap'] = '12'
+        work.save()
+
+        document = Document(document_xml=document_fixture(text="Cap. 12 and Act 5 of 2002"), language=self.eng, work=work)
+
+        self.finder.setup_cap_numbers(document)
+        # the index is re-used
+        with self.assertNumQueries(0):
+            index = WorkIndex.for_document(document, 'za')
+
+        self.assertEqual({'12': '/akn/za/act/2002/5'}, self.finder.cap_numbers)
+        self.assertTrue(index.exists('/akn/za/act/2002/5'))
+        self.assertFalse(index.exists('/akn/za/act/2002/6'))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+import re
+
+from unittest import TestCase
+
+from indigo.analysis.terms.matcher import TermMatcher
+
+
+class TermMatcherTestCase(TestCase):
+    def assert_same_as_regex(self, terms, text):
+        terms_re = re.compile(r'\b(%s)\b' % '|'.join(re.escape(t) for t in sorted(terms, key=lambda t: -len(t))))
+        expected = [(m.group(1), m.start(), m.end()) for m in terms_re.finditer(text)]
+        actual = [(m.group(1), m.start(), m.end()) for m in TermMatcher(terms).finditer(text)]
+        self.assertEqual(expected, actual)
+
+    def test_longest_term_wins(self):
+        matches = list(TermMatcher(['act', 'act of parliament']).finditer('An act of parliament and an act.'))
+        self.assertEqual(['act of parliament', 'act'], [m.group() for m in matches])
+        self.assertEqual((3, 20), (matches[0].start(), matches[0].end()))
+        self.assertEqual('An act of parliament and an act.', matches[0].string)
+
+    def test_word_boundaries(self):
+        self.assert_same_as_regex(['dog', 'dogs', 'hot dog'], 'dogged hot dogs and a dog, hotdog dog_ dog.')
+        self.assert_same_as_regex(['€', 'a.b', 'b.c'], 'a.b.c € x€ €.')
+
+    def test_overlapping(self):
+        self.assert_same_as_regex(['he', 'she', 'his', 'hers', 'she said'], 'ushers she said he hers his she')
+
+    def test_no_terms(self):
+        self.assertEqual([], list(TermMatcher([]).finditer('some text')))
+
+    def test_lazy(self):
+        class CountingText(str):
+            scanned = 0
+
+            def __iter__(self):
+                for c in super().__iter__():
+                    self.scanned += 1
+                    yield c
+
+        text = CountingText('a dog and a cat' + ' and more' * 1000)
+        match = next(TermMatcher(['dog', 'dogs', 'cat']).finditer(text))
+        self.assertEqual(('dog', 2), (match.group(), match.start()))
+        # the first match is found without scanning the rest of the text
+        self.assertLess(text.scanned, 20)
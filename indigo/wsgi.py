@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 from whitenoise.django import DjangoWhiteNoise
 application = get_wsgi_application()
 application = DjangoWhiteNoise(application)
+
+# compile XSLT stylesheets before the first request
+from indigo_api.exporters import xslt_pool
+xslt_pool.warm_up()
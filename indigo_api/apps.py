@@ -18,3 +18,6 @@ class IndigoApiConfig(AppConfig):
         registry.register(PlaceSettings)
         registry.register(ArbitraryExpressionDate)
         registry.register(Commencement)
+
+        # connect signals for background tasks
+        import indigo_api.tasks  # noqa
@@ -0,0 +1,108 @@
+import hashlib
+import os
+
+import lxml.html
+from django.conf import settings
+from django.core.cache import caches
+from reversion.models import Version
+
+from indigo.analysis.differ import AttributeDiffer
+from indigo_api.exporters import HTMLExporter
+
+
+class RevisionDiffCache(object):
+    """ Cache of the differences between a document's revision and the revision before it, as shown
+    in the document's history.
+
+    Versions never change, so entries are keyed on the ids of the two versions, the differ used and
+    the XSLT file (including its modification time) used to render the documents to HTML. The versions
+    are rendered with details from the current work, so the key also includes when the work was last
+    updated. Changing how diffs are calculated produces a new key, so entries never need to be invalidated.
+
+    The cache used is configured by ``INDIGO['REVISION_DIFF_CACHE']``.
+    """
+    key_prefix = 'revision-diff'
+    # increment this when the format of cached diffs changes
+    version = 1
+    # seconds to keep a diff for
+    timeout = 30 * 24 * 60 * 60
+
+    def __init__(self, cache=None, differ=None):
+        self.cache = cache or caches[settings.INDIGO['REVISION_DIFF_CACHE']]
+        self.differ = differ or AttributeDiffer()
+
+    def diff(self, document, old_version, new_version):
+        """ Get the diff between two versions of a document, calculating it if it's not in the cache.
+
+        Returns a dict with `content` (the diff as HTML) and `n_changes` keys.
+
+        :param document: the current document, used to determine how to render the versions
+        :param old_version: older version, or None
+        :param new_version: newer version
+        """
+        key = self.cache_key(document, old_version, new_version)
+        diff = self.cache.get(key)
+        if diff is None:
+            diff = self.calculate(old_version, new_version)
+            self.cache.set(key, diff, self.timeout)
+        return diff
+
+    def precalculate(self, document, new_version):
+        """ Calculate and store the diff between a new version of a document and the version before it.
+        """
+        old_version = self.previous_version(new_version)
+        return self.diff(document, old_version, new_version)
+
+    def previous_version(self, version):
+        """ The most recent version just before this one.
+        """
+        return Version.objects\
+            .get_for_object_reference(version.content_type.model_class(), version.object_id)\
+            .filter(id__lt=version.id)\
+            .defer('serialized_data')\
+            .first()
+
+    def calculate(self, old_version, new_version):
+        differ = self.differ
+
+        if old_version:
+            old_document = old_version._object_version.object
+            old_document.document_xml = differ.preprocess_document_diff(old_document.document_xml)
+            old_html = old_document.to_html()
+        else:
+            old_html = ""
+
+        new_document = new_version._object_version.object
+        new_document.document_xml = differ.preprocess_document_diff(new_document.document_xml)
+        new_html = new_document.to_html()
+
+        old_tree = lxml.html.fromstring(old_html) if old_html else None
+        new_tree = lxml.html.fromstring(new_html)
+        n_changes, diff = differ.diff_document_html(old_tree, new_tree)
+
+        if not isinstance(diff, str):
+            diff = lxml.html.tostring(diff, encoding='unicode')
+
+        # TODO: include other diff'd attributes
+
+        return {
+            'content': diff,
+            'n_changes': n_changes,
+        }
+
+    def cache_key(self, document, old_version, new_version):
+        xslt_filename = HTMLExporter().find_xslt(document)
+
+        digest = hashlib.sha256()
+        for part in [
+            self.version,
+            self.differ.__class__.__module__, self.differ.__class__.__qualname__,
+            self.differ.html_differ_class.__module__, self.differ.html_differ_class.__qualname__,
+            xslt_filename, os.path.getmtime(xslt_filename),
+            document.work.updated_at.isoformat(),
+        ]:
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+
+        old_id = old_version.id if old_version else 'none'
+        return f'{self.key_prefix}:{old_id}:{new_version.id}:{digest.hexdigest()}'
@@ -1,15 +1,19 @@
+import hashlib
 import os
 import re
 import shutil
 import tempfile
+import threading
 import urllib.parse
 import logging
 import subprocess
+from fnmatch import fnmatch
 
 import lxml.html
 from django.conf import settings
+from django.core.cache import caches, InvalidCacheBackendError
 from django.template.loader import render_to_string, get_template
-from django.contrib.staticfiles.finders import find as find_static
+from django.contrib.staticfiles.finders import find as find_static, get_finders
 from ebooklib import epub
 from languages_plus.models import Language
 from lxml import etree as ET
@@ -25,6 +29,10 @@ log = logging.getLogger(__name__)
 class HTMLExporter(object):
     """ Export (render) AKN documents as as HTML.
     """
+    cache_html = True
+    """ Should HTML rendered for entire documents be cached? See :class:`RenderedHTMLCache`.
+    """
+
     def __init__(self, coverpage=True, standalone=False, template_name=None, resolver=None, media_resolver_use_akn_prefix=False):
         self.template_name = template_name
         self.standalone = standalone
@@ -53,7 +61,7 @@ class HTMLExporter(object):
         else:
             # the entire document
             if document.document_xml:
-                content_html = renderer.render_xml(document.document_xml)
+                content_html = self.render_document_xml(renderer, document)
             else:
                 content_html = ''
 
@@ -77,6 +85,13 @@ class HTMLExporter(object):
         else:
             return render_to_string(template_name, context)
 
+    def render_document_xml(self, renderer, document):
+        """ Render the entire XML of this document into HTML, using the rendered HTML cache if enabled.
+        """
+        if self.cache_html:
+            return RenderedHTMLCache().render_xml(renderer, document.document_xml)
+        return renderer.render_xml(document.document_xml)
+
     def coverpage_template(self, document):
         return self.find_template(document, prefix='coverpage_')
 
@@ -577,12 +592,61 @@ class EPUBExporter(HTMLExporter):
             return lang.iso
 
 
+class XSLTPool(object):
+    """ Process-wide registry of compiled XSLT stylesheets, keyed by filename.
+
+    Parsing and compiling a stylesheet is expensive, so each stylesheet is compiled once and shared
+    by all renderers (and threads) in the process. A stylesheet is re-compiled if its file is modified.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # filename -> (mtime, compiled XSLT)
+        self.compiled = {}
+
+    def get(self, filename):
+        """ Get the compiled XSLT for this filename, compiling it if necessary.
+        """
+        mtime = os.path.getmtime(filename)
+        entry = self.compiled.get(filename)
+        if entry is None or entry[0] != mtime:
+            with self.lock:
+                # another thread may have compiled it while we waited for the lock
+                entry = self.compiled.get(filename)
+                if entry is None or entry[0] != mtime:
+                    log.debug(f"Compiling XSLT {filename}")
+                    entry = (mtime, ET.XSLT(ET.parse(filename)))
+                    self.compiled[filename] = entry
+        return entry[1]
+
+    def warm_up(self, pattern='xsl/html_*.xsl'):
+        """ Compile all static XSLT files matching this pattern, so that the first renders in a newly
+        started worker don't pay the cost of compiling them.
+        """
+        paths = set()
+        for finder in get_finders():
+            for path, storage in finder.list([]):
+                if fnmatch(path, pattern):
+                    paths.add(path)
+
+        for path in sorted(paths):
+            # use the same file that find_best_static would use
+            filename = find_static(path)
+            if filename:
+                self.get(filename)
+
+        log.info(f"Compiled {len(self.compiled)} XSLT files")
+
+
+xslt_pool = XSLTPool()
+
+
 class XSLTRenderer(object):
     """ Renders an Akoma Ntoso Act XML document using XSL transforms.
     """
 
     def __init__(self, xslt_filename, xslt_params=None):
-        self.xslt = ET.XSLT(ET.parse(xslt_filename))
+        self.xslt_filename = xslt_filename
+        self.xslt = xslt_pool.get(xslt_filename)
         self.xslt_params = xslt_params or {}
 
     def render(self, node):
@@ -607,4 +671,58 @@ class XSLTRenderer(object):
         ns = node.nsmap[None]
         scope = node.xpath('./ancestor::a:attachment[@eId]/@eId', namespaces={'a': ns})
         if scope:
-            return scope[0]
\ No newline at end of file
+            return scope[0]
+
+
+class RenderedHTMLCache(object):
+    """ Content-addressed cache of HTML rendered from XML by an :class:`XSLTRenderer`.
+
+    Entries are keyed on a hash of the XML, the XSLT file (including its modification time) and the XSLT
+    parameters, such as the resolver URL, media URL and language. Entries therefore never need to be
+    invalidated: changing any of these produces a new key. The cache backend is responsible for bounding
+    the number of entries and evicting old ones, and HTML longer than ``INDIGO['RENDERED_HTML_CACHE_MAX_ENTRY_SIZE']``
+    characters isn't cached, which bounds the total size of the cache.
+
+    The cache used is configured by ``INDIGO['RENDERED_HTML_CACHE']``. If there is no such cache,
+    HTML isn't cached.
+    """
+    key_prefix = 'rendered-html'
+
+    def __init__(self, cache=None, max_entry_size=None):
+        if cache is None:
+            try:
+                cache = caches[settings.INDIGO['RENDERED_HTML_CACHE']]
+            except InvalidCacheBackendError:
+                # eg. a deployment with its own CACHES that doesn't include this cache
+                cache = None
+        self.cache = cache
+        self.max_entry_size = settings.INDIGO['RENDERED_HTML_CACHE_MAX_ENTRY_SIZE'] if max_entry_size is None else max_entry_size
+
+    def render_xml(self, renderer, xml):
+        """ Render an XML string into an HTML string using +renderer+, or return the cached result.
+        """
+        if self.cache is None:
+            return renderer.render_xml(xml)
+
+        if not isinstance(xml, str):
+            xml = xml.decode('utf-8')
+
+        key = self.cache_key(renderer, xml)
+        html = self.cache.get(key)
+        if html is None:
+            html = renderer.render_xml(xml)
+            if len(html) <= self.max_entry_size:
+                self.cache.set(key, html)
+        return html
+
+    def cache_key(self, renderer, xml):
+        digest = hashlib.sha256()
+        digest.update(xml.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(renderer.xslt_filename.encode('utf-8'))
+        digest.update(str(os.path.getmtime(renderer.xslt_filename)).encode('utf-8'))
+        for k, v in sorted(renderer.xslt_params.items()):
+            digest.update(b'\0')
+            digest.update(f'{k}={v}'.encode('utf-8'))
+
+        return f'{self.key_prefix}:{digest.hexdigest()}'
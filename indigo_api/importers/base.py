@@ -14,10 +14,13 @@ from django.core.files.uploadedfile import UploadedFile
 
 from cobalt import AkomaNtosoDocument
 from indigo_api.models import Attachment
+from indigo.analysis.pipeline import import_pipeline
 from indigo.plugins import plugins, LocaleBasedMatcher
 from indigo_api.serializers import AttachmentSerializer
 from indigo_api.utils import filename_candidates, find_best_static
 from indigo_api.importers.pdfs import pdf_extract_pages
+from indigo_api.importers.slaw import slaw_pool, SlawWorkerError
+from indigo_api.exporters import xslt_pool
 
 
 pages_re = re.compile(r'(\d+)(\s*-\s*(\d+))?')
@@ -88,6 +91,10 @@ class Importer(LocaleBasedMatcher):
     for large files. See https://github.com/cjheath/treetop/issues/31
     """
 
+    analysis_timings = None
+    """ A list of (stage, seconds) tuples describing how long each stage of analysis after import took.
+    """
+
     page_nums = None
     """ Pages to import for document types that support it, or None to import them all.
     
@@ -105,6 +112,24 @@ class Importer(LocaleBasedMatcher):
 
         return p.returncode, stdout, stderr
 
+    def slaw(self, args):
+        """ Run slaw with these arguments, in a long-lived worker if ``INDIGO['SLAW_WORKERS']`` is set.
+        """
+        pool = slaw_pool()
+        if pool.enabled:
+            self.log.info("Running slaw %s" % args)
+            try:
+                code, stdout, stderr = pool.run(args)
+            except SlawWorkerError as e:
+                self.log.error(f"Slaw worker failed, running slaw directly: {e}", exc_info=e)
+            else:
+                self.log.info("Slaw exit code: %s, stdout=%d bytes, stderr=%d bytes" % (code, len(stdout), len(stderr)))
+                if stderr:
+                    self.log.info("Stderr: %s" % stderr.decode('utf-8'))
+                return code, stdout, stderr
+
+        return self.shell(['bundle', 'exec', 'slaw'] + args)
+
     def create_from_upload(self, upload, doc, request):
         """ Create a new Document by importing it from a
         :class:`django.core.files.uploadedfile.UploadedFile` instance.
@@ -167,7 +192,7 @@ class Importer(LocaleBasedMatcher):
             raise ValueError("Couldn't find XSLT file to use for %s, tried: %s" % (doc, candidates))
 
         html = ET.HTML(html)
-        xslt = ET.XSLT(ET.parse(xslt_filename))
+        xslt = xslt_pool.get(xslt_filename)
         result = xslt(html)
         return str(result)
 
@@ -240,7 +265,7 @@ class Importer(LocaleBasedMatcher):
         return self.reformat_text(text)
 
     def import_from_file(self, fname, frbr_uri, inputtype):
-        cmd = ['bundle', 'exec', 'slaw', 'parse']
+        cmd = ['parse']
 
         if self.fragment:
             cmd.extend(['--fragment', self.fragment])
@@ -256,7 +281,7 @@ class Importer(LocaleBasedMatcher):
             cmd.extend(['--ascii'])
         cmd.append(fname)
 
-        code, stdout, stderr = self.shell(cmd)
+        code, stdout, stderr = self.slaw(cmd)
 
         if code > 0:
             raise ValueError(stderr.decode('utf-8'))
@@ -285,31 +310,13 @@ class Importer(LocaleBasedMatcher):
     def analyse_after_import(self, doc):
         """ Run analysis after import.
         Usually only used on PDF documents.
+
+        The document's XML is parsed once and all finders are run against it. The time taken
+        by each stage is stored in `analysis_timings`.
         """
-        finder = plugins.for_document('refs', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-subtypes', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-cap', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('refs-act-names', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        finder = plugins.for_document('internal-refs', doc)
-        if finder:
-            finder.find_references_in_document(doc)
-
-        italics_terms_finder = plugins.for_document('italics-terms', doc)
-        italics_terms = doc.work.country.italics_terms
-        if italics_terms_finder and italics_terms:
-            italics_terms_finder.mark_up_italics_in_document(doc, italics_terms)
+        pipeline = import_pipeline()
+        pipeline.run(doc)
+        self.analysis_timings = pipeline.timings
 
     def create_from_docx(self, docx_file, doc):
         """ We can create a mammoth image handler that stashes the binary data of the image
@@ -0,0 +1,211 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import select
+import subprocess
+import threading
+import time
+
+from django.conf import settings
+
+
+log = logging.getLogger(__name__)
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(__file__), 'slaw_worker.rb')
+
+
+class SlawWorkerError(Exception):
+    pass
+
+
+class SlawWorker:
+    """ A long-lived slaw process (see slaw_worker.rb), which parses one request at a time.
+    """
+    def __init__(self):
+        self.jobs = 0
+        self.last_used = time.monotonic()
+        self.process = subprocess.Popen(
+            ['bundle', 'exec', 'ruby', WORKER_SCRIPT],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        log.info(f"Started slaw worker {self.process.pid}")
+
+    def request(self, message, timeout):
+        """ Send a request to the worker and return its response.
+
+        Raises SlawWorkerError if the worker doesn't respond in time, has died, or sends an invalid response.
+        """
+        try:
+            self.process.stdin.write((json.dumps(message) + "\n").encode('utf-8'))
+            self.process.stdin.flush()
+
+            readable, _, _ = select.select([self.process.stdout], [], [], timeout)
+            if not readable:
+                raise SlawWorkerError(f"Slaw worker {self.process.pid} didn't respond within {timeout} seconds")
+
+            line = self.process.stdout.readline()
+        except OSError as e:
+            raise SlawWorkerError(f"Slaw worker {self.process.pid} failed: {e}")
+
+        if not line:
+            raise SlawWorkerError(f"Slaw worker {self.process.pid} exited with code {self.process.poll()}")
+
+        self.last_used = time.monotonic()
+        try:
+            return json.loads(line.decode('utf-8'))
+        except ValueError as e:
+            raise SlawWorkerError(f"Slaw worker {self.process.pid} sent an invalid response: {e}")
+
+    def run(self, args, timeout):
+        """ Run slaw with these arguments, returning (exit status, stdout, stderr) as bytes, like `Importer.shell`.
+        """
+        self.jobs += 1
+        response = self.request({'args': args}, timeout)
+        try:
+            return response['status'], response['stdout'].encode('utf-8'), response['stderr'].encode('utf-8')
+        except (KeyError, TypeError, AttributeError) as e:
+            raise SlawWorkerError(f"Slaw worker {self.process.pid} sent an invalid response: {e!r}")
+
+    def is_healthy(self, timeout):
+        if self.process.poll() is not None:
+            return False
+        try:
+            return bool(self.request({'ping': True}, timeout).get('pong'))
+        except SlawWorkerError:
+            return False
+
+    def stop(self):
+        if self.process.poll() is None:
+            log.info(f"Stopping slaw worker {self.process.pid}")
+            self.process.stdin.close()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait()
+
+
+class SlawWorkerPool:
+    """ Pool of long-lived slaw worker processes, so that parsing a document (or a fragment of one, which the
+    editor does often) doesn't pay the cost of starting Ruby and loading the slaw grammars each time.
+
+    Workers are started when they are first needed, up to ``INDIGO['SLAW_WORKERS']`` of them, and replaced
+    after ``INDIGO['SLAW_WORKER_MAX_JOBS']`` parses. A worker that has been idle for a while is checked before
+    it is used, and one that fails is replaced.
+    """
+    health_check_after = 60
+    """ Seconds that a worker can be idle before it's checked before use.
+    """
+
+    health_check_timeout = 10
+    timeout = 5 * 60
+    """ Seconds to wait for a parse to finish.
+    """
+
+    acquire_timeout = 60
+    """ Seconds to wait for a worker to become free.
+    """
+
+    def __init__(self, size=None, max_jobs=None):
+        self.size = settings.INDIGO['SLAW_WORKERS'] if size is None else size
+        self.max_jobs = settings.INDIGO['SLAW_WORKER_MAX_JOBS'] if max_jobs is None else max_jobs
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.idle = queue.LifoQueue()
+        self.started = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    def run(self, args):
+        """ Run slaw with these arguments in a worker, returning (exit status, stdout, stderr) as bytes.
+        """
+        worker = self.acquire()
+        try:
+            result = worker.run(args, self.timeout)
+        except Exception:
+            # the worker may be in an unknown state
+            self.discard(worker)
+            raise
+        self.release(worker)
+        return result
+
+    def acquire(self):
+        """ Get an idle worker, or start one. Raises SlawWorkerError if none becomes free within `acquire_timeout`.
+        """
+        if self.pid != os.getpid():
+            # we've been forked, the workers belong to our parent
+            with self.lock:
+                if self.pid != os.getpid():
+                    self.reset()
+
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            try:
+                worker = self.idle.get_nowait()
+            except queue.Empty:
+                with self.lock:
+                    start = self.started < self.size
+                    if start:
+                        self.started += 1
+                if start:
+                    try:
+                        return SlawWorker()
+                    except OSError:
+                        with self.lock:
+                            self.started -= 1
+                        raise
+                # wait for a worker to become free, or to be discarded so that we can start another
+                if time.monotonic() >= deadline:
+                    raise SlawWorkerError(f"No slaw worker became free within {self.acquire_timeout} seconds")
+                try:
+                    worker = self.idle.get(timeout=1)
+                except queue.Empty:
+                    continue
+
+            if time.monotonic() - worker.last_used < self.health_check_after or worker.is_healthy(self.health_check_timeout):
+                return worker
+
+            log.warning(f"Slaw worker {worker.process.pid} is unhealthy, replacing it")
+            self.discard(worker)
+
+    def release(self, worker):
+        if worker.jobs >= self.max_jobs:
+            self.discard(worker)
+        else:
+            self.idle.put(worker)
+
+    def discard(self, worker):
+        with self.lock:
+            self.started -= 1
+        worker.stop()
+
+    def stop(self):
+        """ Stop all idle workers.
+        """
+        while True:
+            try:
+                self.discard(self.idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def slaw_pool():
+    """ The process-wide pool of slaw workers.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = SlawWorkerPool()
+                atexit.register(_pool.stop)
+    return _pool
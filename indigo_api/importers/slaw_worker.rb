@@ -0,0 +1,50 @@
+# Long-lived slaw worker, used by indigo_api.importers.slaw.SlawWorkerPool so that each parse
+# doesn't pay the cost of starting Ruby, Bundler and loading the grammars.
+#
+# Reads one JSON request per line on stdin and writes one JSON response per line on stdout.
+#
+#   {"ping": true}  ->  {"pong": true}
+#   {"args": ["parse", "--grammar", "za", "file.txt"]}  ->  {"status": 0, "stdout": "...", "stderr": "..."}
+#
+# The args are exactly those that would be given to the slaw command.
+
+require 'json'
+require 'stringio'
+require 'slaw/command'
+
+# keep the real stdout for responses, and send anything else written to it to stderr
+protocol = $stdout.dup
+protocol.sync = true
+$stdout.reopen($stderr)
+
+def run_slaw(args)
+  stdout = StringIO.new
+  stderr = StringIO.new
+  $stdout = stdout
+  $stderr = stderr
+  status = 0
+
+  begin
+    Slaw::Command.start(args)
+  rescue SystemExit => e
+    status = e.status
+  rescue Exception => e
+    status = 1
+    stderr.puts("#{e.class}: #{e.message}")
+  ensure
+    $stdout = STDOUT
+    $stderr = STDERR
+  end
+
+  {
+    status: status,
+    stdout: stdout.string.force_encoding('UTF-8').scrub,
+    stderr: stderr.string.force_encoding('UTF-8').scrub,
+  }
+end
+
+while (line = STDIN.gets)
+  request = JSON.parse(line)
+  response = request['ping'] ? {pong: true} : run_slaw(request['args'])
+  protocol.write(JSON.generate(response) + "\n")
+end
@@ -31,7 +31,7 @@ class Command(BaseCommand):
 
     def explode_provisions(self):
         # only get commencements that have provisions
-        commencements = Commencement.objects.select_for_update().exclude(provisions=[])
+        commencements = Commencement.objects.select_for_update().exclude(provisions=[]).select_related('commenced_work')
         for commencement in commencements:
 
             def check_existing_add_descendants(provs, commenced_list):
@@ -0,0 +1,35 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from indigo_api.models import Document
+
+
+log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Build and store the table of contents and subcomponent index of documents that don\'t have them. ' \
+           'These are normally refreshed when a document is saved.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh all documents, not only those missing a stored table of contents')
+
+    def handle(self, *args, **options):
+        documents = Document.objects.undeleted()
+        if not options['all']:
+            documents = documents.filter(toc_json__isnull=True)
+
+        ids = list(documents.values_list('pk', flat=True))
+        log.info(f"Updating stored table of contents for {len(ids)} documents")
+
+        for i, pk in enumerate(ids):
+            document = Document.objects.get(pk=pk)
+            document.refresh_stored_toc()
+            # update only these columns, so that we don't change the document's modification details
+            Document.objects.filter(pk=pk).update(toc_json=document.toc_json, toc_index=document.toc_index)
+
+            if (i + 1) % 100 == 0:
+                log.info(f"Updated {i + 1} of {len(ids)}")
+
+        log.info("Done")
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.12 on 2026-10-17 09:12
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0007_work_as_at_date_override'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='toc_index',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.12 on 2026-10-17 11:40
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0008_document_toc_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='toc_json',
+            field=django.contrib.postgres.fields.jsonb.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.2.12 on 2026-10-17 13:40
+
+from cobalt import FrbrUri
+from django.db import migrations, models
+
+
+def copy_frbr_uri_attributes(apps, schema_editor):
+    Work = apps.get_model('indigo_api', 'Work')
+
+    works = list(Work.objects.only('id', 'frbr_uri'))
+    for work in works:
+        frbr_uri = FrbrUri.parse(work.frbr_uri)
+        year = frbr_uri.date.split('-', 1)[0]
+        work.frbr_year = int(year) if year.isdigit() else None
+        work.frbr_subtype = frbr_uri.subtype
+
+    Work.objects.bulk_update(works, ['frbr_year', 'frbr_subtype'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0009_document_toc_json'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='work',
+            name='frbr_subtype',
+            field=models.CharField(db_index=True, help_text='Subtype from the FRBR URI', max_length=512, null=True),
+        ),
+        migrations.AddField(
+            model_name='work',
+            name='frbr_year',
+            field=models.IntegerField(db_index=True, help_text='Year from the FRBR URI', null=True),
+        ),
+        migrations.RunPython(copy_frbr_uri_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.12 on 2026-10-17 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0010_work_frbr_year_subtype'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='document',
+            name='frbr_uri',
+            field=models.CharField(db_index=True, default='/', help_text='Used globally to identify this work', max_length=512),
+        ),
+    ]
@@ -20,7 +20,7 @@ import reversion.revisions
 from reversion.models import Version
 from cobalt import FrbrUri, AmendmentEvent, datestring, StructuredDocument
 
-from indigo.analysis.toc.base import descend_toc_pre_order
+from indigo.analysis.toc.base import descend_toc_pre_order, TOCElement
 from indigo.plugins import plugins
 from indigo.documents import ResolvedAnchor
 
@@ -149,7 +149,18 @@ class DocumentMixin(object):
     def get_subcomponent(self, component, subcomponent):
         """ Get the named subcomponent in this document, such as `chapter/2` or 'section/13A'.
         :class:`lxml.objectify.ObjectifiedElement` or `None`.
+
+        This uses the index built along with the table of contents, if the table of contents has already
+        been built, or the persisted `toc_index`, if available. Otherwise, it searches the table of contents.
         """
+        index = getattr(self, '_subcomponent_index', None)
+        if index is not None:
+            return index.get((component, subcomponent))
+
+        element = self.get_indexed_subcomponent(component, subcomponent)
+        if element is not None:
+            return element
+
         def search_toc(items):
             for item in items:
                 if item.component == component and item.subcomponent == subcomponent:
@@ -162,12 +173,60 @@ class DocumentMixin(object):
 
         return search_toc(self.table_of_contents())
 
+    def get_indexed_subcomponent(self, component, subcomponent):
+        """ Get the named subcomponent using the persisted `toc_index`, or None if it's not in the index.
+        """
+        entry = (getattr(self, 'toc_index', None) or {}).get(f'{component}/{subcomponent}')
+        if entry:
+            xpath, eid = entry
+            found = self.doc.root.xpath(xpath)
+            # guard against a stale index
+            if found and found[0].get('eId') == eid:
+                return found[0]
+
     def table_of_contents(self):
         if not hasattr(self, '_toc'):
             builder = plugins.for_document('toc', self)
             self._toc = builder.table_of_contents_for_document(self)
+            self._subcomponent_index = getattr(builder, 'subcomponent_index', None)
         return self._toc
 
+    def stored_table_of_contents(self):
+        """ The table of contents, rehydrated from the persisted `toc_json` if available, otherwise built from the XML.
+
+        Entries rehydrated from `toc_json` don't have an XML element, so use `table_of_contents()` if you need the
+        XML elements.
+        """
+        if hasattr(self, '_toc'):
+            return self._toc
+
+        if getattr(self, 'toc_json', None) is None:
+            return self.table_of_contents()
+
+        if not hasattr(self, '_stored_toc'):
+            self._stored_toc = [TOCElement.from_stored_dict(t) for t in self.toc_json]
+        return self._stored_toc
+
+    def clear_table_of_contents(self):
+        """ Clear the cached table of contents, because the XML has changed.
+        """
+        for attr in ['_toc', '_subcomponent_index', '_stored_toc']:
+            self.__dict__.pop(attr, None)
+
+    def build_toc_index(self):
+        """ Build a JSON-serialisable index from `component/subcomponent` strings to `[xpath, eId]` pairs that
+        identify the element for that subcomponent in the XML.
+        """
+        self.table_of_contents()
+        if self._subcomponent_index is None:
+            return None
+
+        index = {}
+        for (component, subcomponent), element in self._subcomponent_index.items():
+            if subcomponent:
+                index[f'{component}/{subcomponent}'] = [element.getroottree().getpath(element), element.get('eId')]
+        return index
+
     def all_provisions(self):
         ids = []
 
@@ -178,7 +237,7 @@ class DocumentMixin(object):
                 if e.children and e.component == 'main':
                     add_ids(e.children)
 
-        toc = self.table_of_contents()
+        toc = self.stored_table_of_contents()
         add_ids(toc)
 
         return ids
@@ -241,7 +300,7 @@ class Document(DocumentMixin, models.Model):
     You cannot create a document that has an FRBR URI that doesn't match a work.
     """
 
-    frbr_uri = models.CharField(max_length=512, null=False, blank=False, default='/', help_text="Used globally to identify this work")
+    frbr_uri = models.CharField(max_length=512, db_index=True, null=False, blank=False, default='/', help_text="Used globally to identify this work")
     """ The FRBR Work URI of this document that uniquely identifies it globally """
 
     title = models.CharField(max_length=1024, null=False)
@@ -254,6 +313,14 @@ class Document(DocumentMixin, models.Model):
     document_xml = models.TextField(null=True, blank=True)
     """ Raw XML content of the entire document """
 
+    toc_index = JSONField(null=True, blank=True)
+    """ Index of the subcomponents in document_xml, used to find subcomponents without building the table of contents.
+    See `build_toc_index`. Refreshed on save. """
+
+    toc_json = JSONField(null=True, blank=True)
+    """ Serialised table of contents of document_xml, so that it can be used without parsing the XML.
+    See `stored_table_of_contents`. Refreshed on save. """
+
     # Date from the FRBRExpression element. This is either the publication date or the date of the last
     # amendment. This is used to identify this particular version of this work, so is stored in the DB.
     expression_date = models.DateField(null=False, blank=False, help_text="Date of publication or latest amendment")
@@ -348,6 +415,7 @@ class Document(DocumentMixin, models.Model):
 
     def save(self, *args, **kwargs):
         self.copy_attributes()
+        self.refresh_stored_toc()
         return super(Document, self).save(*args, **kwargs)
 
     def save_with_revision(self, user, comment=None):
@@ -405,6 +473,12 @@ class Document(DocumentMixin, models.Model):
     def refresh_xml(self):
         self.document_xml = self.doc.to_xml().decode('utf-8')
 
+    def refresh_stored_toc(self):
+        """ Rebuild the persisted table of contents and subcomponent index from the XML.
+        """
+        self.toc_json = [t.as_stored_dict() for t in self.table_of_contents()]
+        self.toc_index = self.build_toc_index()
+
     def reset_xml(self, xml, from_model=False):
         """ Completely reset the document XML to a new value. If from_model is False,
         also refresh database attributes from the new XML document. """
@@ -413,6 +487,8 @@ class Document(DocumentMixin, models.Model):
 
         # now update ourselves
         self._doc = doc
+        self.clear_table_of_contents()
+        self.toc_json = self.toc_index = None
         self.copy_attributes(from_model)
 
     def versions(self):
@@ -462,7 +538,7 @@ class Document(DocumentMixin, models.Model):
 
 
 # version tracking
-reversion.revisions.register(Document)
+reversion.revisions.register(Document, exclude=['toc_index', 'toc_json'])
 
 
 @receiver(signals.post_save, sender=Document)
@@ -1,12 +1,15 @@
 # coding=utf-8
+from collections import defaultdict
 
 from actstream import action
+from django.conf import settings
 from django.contrib.postgres.fields import JSONField
 from django.db import models
-from django.db.models import signals, Q
+from django.db.models import signals, Q, prefetch_related_objects
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.functional import cached_property
 import reversion.revisions
 from reversion.models import Version
@@ -22,6 +25,55 @@ class WorkQuerySet(models.QuerySet):
             raise ValueError("Work for FRBR URI '%s' doesn't exist" % frbr_uri)
         return work
 
+    def uncommenced_provision_ids(self, date=None):
+        """ Returns a dict from work id to a (potentially empty) list of the ids of the work's uncommenced provisions,
+        for all works in this queryset.
+
+        This is equivalent to calling `all_uncommenced_provision_ids` on each work, but loads the works, commencements,
+        expressions and countries in a handful of queries, and uses the stored table of contents of each expression.
+        """
+        from indigo.analysis.toc.base import descend_toc_pre_order
+        from .documents import Document
+        from .places import Country
+
+        uncommenced = {}
+        works = {}
+        for work in self.prefetch_related('commencements'):
+            # common case: one commencement that covers all provisions
+            if any(c.all_provisions for c in work.commencements.all()):
+                uncommenced[work.id] = []
+            else:
+                works[work.id] = work
+
+        primary_languages = dict(Country.objects
+                                 .filter(pk__in=set(w.country_id for w in works.values()))
+                                 .values_list('pk', 'primary_language_id'))
+
+        expressions = defaultdict(list)
+        documents = Document.objects\
+            .undeleted()\
+            .no_xml()\
+            .filter(work_id__in=list(works.keys()))\
+            .select_related('language', 'language__language')\
+            .prefetch_related(None)\
+            .order_by('expression_date')
+        for doc in documents:
+            doc.work = works[doc.work_id]
+            expressions[doc.work_id].append(doc)
+
+        for work in works.values():
+            documents = expressions[work.id]
+            if date:
+                # get the earliest available expression when historical points in time don't exist
+                documents = [d for d in documents if d.expression_date <= date] or documents[:1]
+
+            provisions = work.commenceable_provisions_for_documents(documents, primary_languages[work.country_id])
+            # commencement.provisions are lists of provision ids
+            commenced = set(p for c in work.commencements.all() for p in c.provisions)
+            uncommenced[work.id] = [p.id for p in descend_toc_pre_order(provisions) if p.id not in commenced]
+
+        return uncommenced
+
 
 class WorkManager(models.Manager):
     use_for_related_fields = True
@@ -96,6 +148,7 @@ class WorkMixin(object):
     """
     _work_uri = None
     _repeal = None
+    _published_expressions = None
 
     @property
     def work_uri(self):
@@ -198,6 +251,16 @@ class WorkMixin(object):
         from .documents import Document
         return Document.objects.undeleted().filter(work=self).order_by('expression_date')
 
+    def published_expressions(self):
+        """ A list of the published expressions of this work, in ascending expression date order.
+
+        The list is cached on the work, and can be set for many works at once by
+        `indigo_content_api.v2.serializers.PublishedDocumentListSerializer`.
+        """
+        if self._published_expressions is None:
+            self._published_expressions = list(self.expressions().published())
+        return self._published_expressions
+
     def initial_expressions(self):
         """ Queryset of expressions at initial publication date.
         """
@@ -253,11 +316,7 @@ class WorkMixin(object):
             Each TOCElement object has a (potentially empty) list of `children`.
             If `date` is provided, only provisions in expressions up to and including that date are included.
         """
-        if getattr(self, '_toc_cache', None) is None:
-            # cache the TOCs for the various documents because they are expensive to compute
-            self._toc_cache = {}
-
-        # gather documents and sort so that we consider primary language documents first
+        # gather documents
         if date:
             documents = self.expressions().filter(expression_date__lte=date)
             if not documents:
@@ -266,7 +325,18 @@ class WorkMixin(object):
                 documents = self.expressions()[:1]
         else:
             documents = self.expressions().all()
-        documents = sorted(documents, key=lambda d: 0 if d.language == self.country.primary_language else 1)
+
+        return self.commenceable_provisions_for_documents(documents, self.country.primary_language_id)
+
+    def commenceable_provisions_for_documents(self, documents, primary_language_id):
+        """ Combines the commenceable provisions of the given expressions of this work into a list of TOCElement objects.
+        """
+        if getattr(self, '_toc_cache', None) is None:
+            # cache the TOCs for the various documents because they are expensive to compute
+            self._toc_cache = {}
+
+        # sort so that we consider primary language documents first
+        documents = sorted(documents, key=lambda d: 0 if d.language_id == primary_language_id else 1)
 
         # get all the docs and combine the TOCs, based on element IDs
         provisions = []
@@ -275,7 +345,7 @@ class WorkMixin(object):
             plugin = plugins.for_document('toc', doc)
             if plugin:
                 if doc.id not in self._toc_cache:
-                    self._toc_cache[doc.id] = doc.table_of_contents()
+                    self._toc_cache[doc.id] = doc.stored_table_of_contents()
                 toc = self._toc_cache[doc.id]
                 plugin.insert_commenceable_provisions(toc, provisions, id_set)
 
@@ -321,6 +391,10 @@ class Work(WorkMixin, models.Model):
     frbr_uri = models.CharField(max_length=512, null=False, blank=False, unique=True, help_text="Used globally to identify this work")
     """ The FRBR Work URI of this work that uniquely identifies it globally """
 
+    # derived from the FRBR URI when saved, so that works can be filtered and grouped by them in the database
+    frbr_year = models.IntegerField(null=True, db_index=True, help_text="Year from the FRBR URI")
+    frbr_subtype = models.CharField(max_length=512, null=True, db_index=True, help_text="Subtype from the FRBR URI")
+
     title = models.CharField(max_length=1024, null=True, default='(untitled)')
     country = models.ForeignKey('indigo_api.Country', null=False, on_delete=models.PROTECT, related_name='works')
     locality = models.ForeignKey('indigo_api.Locality', null=True, blank=True, on_delete=models.PROTECT, related_name='works')
@@ -403,6 +477,15 @@ class Work(WorkMixin, models.Model):
 
         return super(Work, self).save(*args, **kwargs)
 
+    def copy_frbr_uri_attributes(self):
+        """ Copy attributes derived from the FRBR URI into their own fields.
+        """
+        # the FRBR URI may have changed since it was last parsed
+        self._work_uri = None
+        year = self.year
+        self.frbr_year = int(year) if year.isdigit() else None
+        self.frbr_subtype = self.subtype
+
     def save_with_revision(self, user, comment=None):
         """ Save this work and create a new revision at the same time.
         """
@@ -413,6 +496,45 @@ class Work(WorkMixin, models.Model):
             self.updated_by_user = user
             self.save()
 
+    def update_documents(self, user=None):
+        """ Update the documents of this work so that they pick up changes to the attributes they inherit
+        from it, such as the FRBR URI and amendments.
+
+        Only the metadata of each document changes, so the documents are written in a single query,
+        without the overhead of saving each one. One action is sent to the activity stream for all of them.
+
+        Because the documents aren't saved individually, the things that saving a document would do are done
+        explicitly: the documents are added to the current revision (if any), and their artefacts are queued
+        for rendering.
+        """
+        from .documents import Document
+        from indigo_api.tasks import queue_document_artefacts_for
+
+        # load the amendments once, for all the documents
+        prefetch_related_objects([self], 'amendments__amending_work')
+        documents = list(self.document_set.select_related('language', 'language__language').prefetch_related(None))
+
+        now = timezone.now()
+        for doc in documents:
+            doc.work = self
+            doc.updated_at = now
+            doc.updated_by_user = user
+            doc.copy_attributes()
+
+        Document.objects.bulk_update(documents, ['frbr_uri', 'title', 'document_xml', 'updated_at', 'updated_by_user'])
+        self._prefetched_objects_cache.pop('amendments', None)
+
+        # the documents would have been added to the revision (eg. from save_with_revision) if they had been saved
+        if reversion.revisions.is_active():
+            for doc in documents:
+                reversion.revisions.add_to_revision(doc)
+
+        queue_document_artefacts_for(documents)
+
+        if documents:
+            action.send(user, verb='updated the documents of', action_object=self,
+                        place_code=self.place.place_code)
+
     def can_delete(self):
         return (not self.document_set.undeleted().exists() and
                 not self.child_works.exists() and
@@ -470,10 +592,14 @@ class Work(WorkMixin, models.Model):
         if self.as_at_date_override:
             return self.as_at_date_override
 
-        q = self.expressions().published().order_by('-expression_date').values('expression_date').first()
+        if self._published_expressions is not None:
+            latest = self._published_expressions[-1].expression_date if self._published_expressions else None
+        else:
+            q = self.expressions().published().order_by('-expression_date').values('expression_date').first()
+            latest = (q or {}).get('expression_date')
 
         dates = [
-            (q or {}).get('expression_date'),
+            latest,
             self.place.settings.as_at_date,
         ]
 
@@ -485,6 +611,13 @@ class Work(WorkMixin, models.Model):
         return '%s (%s)' % (self.frbr_uri, self.title)
 
 
+@receiver(signals.pre_save, sender=Work)
+def pre_save_work(sender, instance, **kwargs):
+    """ Keep attributes derived from the FRBR URI up to date, including for works loaded from fixtures.
+    """
+    instance.copy_frbr_uri_attributes()
+
+
 @receiver(signals.post_save, sender=Work)
 def post_save_work(sender, instance, **kwargs):
     """ Cascade changes to linked documents
@@ -492,10 +625,11 @@ def post_save_work(sender, instance, **kwargs):
     if not kwargs['raw'] and not kwargs['created']:
         # cascade updates to ensure documents
         # pick up changes to inherited attributes
-        for doc in instance.document_set.all():
-            # forces call to doc.copy_attributes()
-            doc.updated_by_user = instance.updated_by_user
-            doc.save()
+        if settings.INDIGO.get('WORK_DOCUMENT_UPDATES_BACKGROUND', False):
+            from indigo_api.tasks import update_work_documents
+            update_work_documents(instance.pk, instance.updated_by_user_id)
+        else:
+            instance.update_documents(instance.updated_by_user)
 
     # Send action to activity stream, as 'created' if a new work
     if kwargs['created']:
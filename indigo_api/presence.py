@@ -0,0 +1,115 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.utils import timezone
+
+from indigo_api.models import DocumentActivity
+
+
+class ModelPresence(object):
+    """ Tracks which users are active in which documents (see `DocumentActivity`), using the database.
+
+    Each ping updates a row, and stale rows are deleted each time a document's activity is listed.
+    """
+    def ping(self, document, user, nonce):
+        """ Record that the user (identified by the nonce of their editor) is active in the document.
+        """
+        DocumentActivity.objects.update_or_create(
+            document=document, user=user, nonce=nonce,
+            defaults={'updated_at': timezone.now()},
+        )
+
+    def finish(self, document, user, nonces):
+        """ Record that the user is no longer active in the document with these nonces.
+        """
+        DocumentActivity.objects.filter(document=document, user=user, nonce__in=nonces).delete()
+
+    def activities(self, document):
+        """ A list of `DocumentActivity` objects for the users active in a document, oldest first.
+        """
+        # clean up old activity
+        DocumentActivity.vacuum(document)
+        return list(document.activities.prefetch_related('user').all())
+
+
+class CachePresence(object):
+    """ Tracks which users are active in which documents, using a cache rather than the database, so that
+    the regular pings from editors don't write to the database.
+
+    Each (document, user, nonce) has an entry which expires if it's not refreshed by a ping within
+    `DocumentActivity.DEAD_SECS`. Each document also has an index of its entries. Updates to the index
+    aren't atomic, but an entry that's lost from the index is added again by its next ping.
+
+    The activities returned are unsaved `DocumentActivity` objects.
+    """
+    key_prefix = 'document-activity'
+    timeout = DocumentActivity.DEAD_SECS
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def ping(self, document, user, nonce):
+        now = timezone.now()
+        key = self.entry_key(document, user.pk, nonce)
+        entry = self.cache.get(key)
+
+        self.cache.set(key, {
+            'user_id': user.pk,
+            'nonce': nonce,
+            'created_at': entry['created_at'] if entry else now,
+            'updated_at': now,
+        }, self.timeout)
+
+        members = self.cache.get(self.index_key(document)) or []
+        if (user.pk, nonce) not in members:
+            members.append((user.pk, nonce))
+        # refresh the index, even if it hasn't changed, so that it lives as long as its newest entry
+        self.cache.set(self.index_key(document), members, self.timeout)
+
+    def finish(self, document, user, nonces):
+        self.cache.delete_many([self.entry_key(document, user.pk, nonce) for nonce in nonces])
+
+        members = self.cache.get(self.index_key(document)) or []
+        remaining = [m for m in members if not (m[0] == user.pk and m[1] in nonces)]
+        if len(remaining) != len(members):
+            self.cache.set(self.index_key(document), remaining, self.timeout)
+
+    def activities(self, document):
+        members = self.cache.get(self.index_key(document)) or []
+        if not members:
+            return []
+
+        keys = {self.entry_key(document, user_id, nonce): (user_id, nonce) for user_id, nonce in members}
+        entries = self.cache.get_many(list(keys.keys()))
+
+        # forget entries that have expired
+        if len(entries) != len(keys):
+            remaining = [keys[k] for k in keys if k in entries]
+            self.cache.set(self.index_key(document), remaining, self.timeout)
+
+        users = User.objects.in_bulk({e['user_id'] for e in entries.values()})
+        activities = [
+            DocumentActivity(
+                document=document, user=users[e['user_id']], nonce=e['nonce'],
+                created_at=e['created_at'], updated_at=e['updated_at'])
+            for e in entries.values()
+            if e['user_id'] in users
+        ]
+        activities.sort(key=lambda a: a.created_at)
+        return activities
+
+    def entry_key(self, document, user_id, nonce):
+        return f'{self.key_prefix}:{document.pk}:{user_id}:{nonce}'
+
+    def index_key(self, document):
+        return f'{self.key_prefix}:{document.pk}'
+
+
+def document_presence():
+    """ The presence store for document activity, using the cache configured by
+    ``INDIGO['DOCUMENT_ACTIVITY_CACHE']``, or the database if no cache is configured.
+    """
+    cache_name = settings.INDIGO['DOCUMENT_ACTIVITY_CACHE']
+    if cache_name:
+        return CachePresence(caches[cache_name])
+    return ModelPresence()
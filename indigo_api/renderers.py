@@ -1,15 +1,17 @@
 import lxml.etree as ET
-import tempfile
 import re
 import zipfile
 import logging
+from types import SimpleNamespace
 
 from django.core.cache import caches
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from rest_framework.renderers import BaseRenderer, StaticHTMLRenderer
 from rest_framework_xml.renderers import XMLRenderer
 
 from indigo_api.exporters import HTMLExporter, PDFExporter, EPUBExporter
+from indigo_api.tasks import render_document_artefact
 from .serializers import NoopSerializer
 
 log = logging.getLogger(__name__)
@@ -125,6 +127,9 @@ class PDFRenderer(BaseRenderer, ExporterMixin):
     icon = 'far fa-file-pdf'
     title = 'PDF'
 
+    # seconds for which a document is considered to be queued for rendering in the background
+    queued_timeout = 10 * 60
+
     def __init__(self, *args, **kwargs):
         super(PDFRenderer, self).__init__(*args, **kwargs)
         self.cache = caches['default']
@@ -136,36 +141,79 @@ class PDFRenderer(BaseRenderer, ExporterMixin):
             return ''
 
         view = renderer_context['view']
+        request = renderer_context['request']
+        response = renderer_context['response']
+
+        filename = self.get_filename(data, view)
+        response['Content-Disposition'] = 'inline; filename=%s' % filename
+        resolver = resolver_url(request, request.GET.get('resolver'))
 
         # check the cache
         key = self.cache_key(data, view)
         if key:
-            pdf = self.cache.get(key)
-            if pdf:
-                return pdf
+            artefact = self.cache.get(key)
+            if artefact:
+                return artefact
 
-        filename = self.get_filename(data, view)
-        renderer_context['response']['Content-Disposition'] = 'inline; filename=%s' % filename
-        request = renderer_context['request']
+            if self.render_in_background(data, view):
+                self.queue_artefact(key, data, view, resolver)
+                # tell the client to come back once the artefact has been rendered
+                response.status_code = 202
+                response['Retry-After'] = '10'
+                return b''
+
+        artefact = self.render_artefact(data, view, resolver)
+
+        # cache it
+        if key:
+            self.cache.set(key, artefact)
+
+        return artefact
+
+    def render_artefact(self, data, view, resolver):
         exporter = self.get_exporter()
-        exporter.resolver = resolver_url(request, request.GET.get('resolver'))
+        exporter.resolver = resolver
 
         if isinstance(data, list):
             # render many
-            pdf = exporter.render_many(data)
-        elif not hasattr(view, 'component') or (view.component == 'main' and not view.subcomponent):
+            return exporter.render_many(data)
+        elif self.is_whole_document(view):
             # whole document
-            pdf = exporter.render(data)
+            return exporter.render(data)
         else:
             # just one element
             exporter.toc = False
-            pdf = exporter.render(data, view.element)
-
-        # cache it
+            return exporter.render(data, view.element)
+
+    def is_whole_document(self, view):
+        return not hasattr(view, 'component') or (view.component == 'main' and not view.subcomponent)
+
+    def render_in_background(self, data, view):
+        """ Should this artefact be rendered by a background task, rather than during the request?
+        Only whole documents are rendered in the background, since components are quick to render.
+        """
+        return settings.INDIGO.get('DOCUMENT_ARTEFACTS_BACKGROUND', False) and \
+            (isinstance(data, list) or self.is_whole_document(view))
+
+    def queue_artefact(self, key, data, view, resolver):
+        """ Queue a background task to render this artefact, unless one has already been queued.
+        """
+        if self.cache.add(key + ':queued', True, self.queued_timeout):
+            many = isinstance(data, list)
+            render_document_artefact(
+                self.format, [d.id for d in data] if many else [data.id],
+                many=many, component=getattr(view, 'component', None), resolver=resolver)
+
+    def store_artefact(self, data, component=None, resolver=None):
+        """ Render the artefact for data, which is a document or a list of documents, and store it in the cache.
+        This is used by background tasks, so the artefact is cached until it is evicted; the cache key changes
+        when a document changes.
+        """
+        view = SimpleNamespace(component=component, subcomponent=None) if component else SimpleNamespace()
+        key = self.cache_key(data, view)
         if key:
-            self.cache.set(key, pdf)
-
-        return pdf
+            self.cache.set(key, self.render_artefact(data, view, resolver or settings.RESOLVER_URL), None)
+            self.cache.delete(key + ':queued')
 
     def cache_key(self, data, view):
         if hasattr(data, 'frbr_uri'):
@@ -200,43 +248,30 @@ class EPUBRenderer(PDFRenderer, ExporterMixin):
     icon = 'fas fa-book'
     title = 'ePUB'
 
-    def render(self, data, media_type=None, renderer_context=None):
-        self.renderer_context = renderer_context
-
-        if not hasattr(data, 'frbr_uri') and not isinstance(data, list):
-            return ''
 
-        view = renderer_context['view']
-        request = renderer_context['request']
+ARTEFACT_RENDERERS = {r.format: r for r in [PDFRenderer, EPUBRenderer]}
+""" Renderers for artefacts that can be rendered in the background, by format.
+"""
 
-        filename = self.get_filename(data, view)
-        renderer_context['response']['Content-Disposition'] = 'inline; filename=%s' % filename
-        exporter = self.get_exporter()
-        exporter.resolver = resolver_url(request, request.GET.get('resolver'))
 
-        # check the cache
-        key = self.cache_key(data, view)
-        if key:
-            epub = self.cache.get(key)
-            if epub:
-                return epub
+class StreamingBuffer:
+    """ Write-only file-like object that holds what is written to it until it is taken,
+    so that a zipfile can be streamed as it is built.
+    """
+    def __init__(self):
+        self.chunks = []
 
-        if isinstance(data, list):
-            # render many
-            epub = exporter.render_many(data)
-        elif not hasattr(view, 'component') or (view.component == 'main' and not view.subcomponent):
-            # whole document
-            epub = exporter.render(data)
-        else:
-            # just one element
-            exporter.toc = False
-            epub = exporter.render(data, view.element)
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
 
-        # cache it
-        if key:
-            self.cache.set(key, epub)
+    def flush(self):
+        pass
 
-        return epub
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
 
 
 class ZIPRenderer(BaseRenderer):
@@ -244,6 +279,9 @@ class ZIPRenderer(BaseRenderer):
 
     Generates a zip file containing the primary document as main.xml, an all attachments
     inside a media folder.
+
+    Large archives should be streamed with `streaming_response`, which builds the archive
+    incrementally, one document and one chunk of attachment data at a time.
     """
     media_type = 'application/zip'
     format = 'zip'
@@ -262,23 +300,44 @@ class ZIPRenderer(BaseRenderer):
         filename = generate_filename(data, view, self.format)
         renderer_context['response']['Content-Disposition'] = 'attachment; filename=%s' % filename
 
-        with tempfile.NamedTemporaryFile(suffix='.zip') as f:
-            self.build_zipfile(data, f.name)
-            return f.read()
+        return b''.join(self.iter_zipfile(data))
 
-    def build_zipfile(self, data, fname):
+    def streaming_response(self, data, view):
+        """ Return a StreamingHttpResponse that streams the zip file for data, which is a document
+        or a list of documents. Documents in a list should not have their XML loaded (see `Document.objects.no_xml()`),
+        it is loaded for one document at a time.
+        """
+        response = StreamingHttpResponse(self.iter_zipfile(data), content_type=self.media_type)
+        response['Content-Disposition'] = 'attachment; filename=%s' % generate_filename(data, view, self.format)
+        return response
+
+    def iter_zipfile(self, data):
+        """ Generate the zip file for data in chunks.
+        """
         # one or many documents?
         many = isinstance(data, list)
         if not many:
             data = [data]
 
-        with zipfile.ZipFile(fname, 'w', zipfile.ZIP_DEFLATED) as zf:
+        buf = StreamingBuffer()
+        with zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED) as zf:
             for document in data:
                 # if storing many, prefix them
                 prefix = (generate_filename(document, None) + '/') if many else ''
-                zf.writestr(prefix + "main.xml", document.document_xml.encode('utf-8'))
-                self.add_attachments(document, zf, prefix)
-
-    def add_attachments(self, document, zf, prefix):
-        for attachment in document.attachments.all():
-            zf.writestr(prefix + "media/" + attachment.filename, attachment.file.read())
+                zf.writestr(prefix + "main.xml", self.get_document_xml(document).encode('utf-8'))
+                yield buf.take()
+
+                for attachment in document.attachments.all():
+                    with zf.open(prefix + "media/" + attachment.filename, 'w') as f:
+                        for chunk in attachment.file.chunks():
+                            f.write(chunk)
+                            yield buf.take()
+                    attachment.file.close()
+
+        yield buf.take()
+
+    def get_document_xml(self, document):
+        if 'document_xml' in document.get_deferred_fields():
+            # load it without keeping it on the document
+            return type(document).objects.filter(pk=document.pk).values_list('document_xml', flat=True).get()
+        return document.document_xml
@@ -0,0 +1,114 @@
+import logging
+
+from background_task import background
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import signals
+from django.dispatch import receiver
+import reversion.revisions
+from reversion.models import Version
+from reversion.signals import post_revision_commit
+
+from indigo_api.models import Document, Work
+
+
+# get specific task logger
+log = logging.getLogger('indigo.tasks')
+
+# seconds to wait after a document is saved before rendering its artefacts, so that a burst of
+# saves only renders them once
+ARTEFACT_RENDER_DELAY = 5 * 60
+
+
+@background(queue='indigo', remove_existing_tasks=True)
+def render_document_artefact(format, document_ids, many=False, component=None, resolver=None):
+    """ Render the PDF or ePUB artefact for the documents with the given ids, and store it in the cache
+    under the renderer's cache key, where the renderer will find it.
+
+    If many is False, the artefact is for the first document only, as served by a view for the
+    given component (if any).
+    """
+    from indigo_api.renderers import ARTEFACT_RENDERERS
+
+    documents = Document.objects.in_bulk(document_ids)
+    documents = [documents[i] for i in document_ids if i in documents]
+    if not documents:
+        log.warning(f"Documents with ids {document_ids} don't exist, ignoring")
+        return
+
+    try:
+        renderer = ARTEFACT_RENDERERS[format]()
+        renderer.store_artefact(documents if many else documents[0], component, resolver)
+    except Exception as e:
+        log.error(f"Error rendering {format} for documents {document_ids}: {e}", exc_info=e)
+        raise e
+
+
+@receiver(signals.post_save, sender=Document)
+def queue_document_artefacts(sender, instance, **kwargs):
+    """ Re-render a document's PDF and ePUB artefacts in the background when it is saved.
+    """
+    if not kwargs.get('raw'):
+        queue_document_artefacts_for([instance])
+
+
+def queue_document_artefacts_for(documents):
+    """ Re-render the PDF and ePUB artefacts of these documents in the background, if artefacts are
+    rendered in the background.
+    """
+    if settings.INDIGO.get('DOCUMENT_ARTEFACTS_BACKGROUND'):
+        from indigo_api.renderers import ARTEFACT_RENDERERS
+
+        for document in documents:
+            if not document.deleted:
+                for format in ARTEFACT_RENDERERS:
+                    # the content API serves the main component, and the app's downloads serve the whole document,
+                    # which are cached under different keys
+                    for component in ['main', None]:
+                        render_document_artefact(format, [document.pk], component=component,
+                                                 schedule=ARTEFACT_RENDER_DELAY)
+
+
+@background(queue='indigo', remove_existing_tasks=True)
+def update_work_documents(work_id, user_id=None):
+    """ Update the documents of a work so that they pick up changes to the work.
+    """
+    try:
+        work = Work.objects.get(pk=work_id)
+    except Work.DoesNotExist:
+        log.warning(f"Work with id {work_id} doesn't exist, ignoring")
+        return
+
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    # record the new versions of the documents, as if they had been updated when the work was saved
+    with reversion.revisions.create_revision():
+        reversion.revisions.set_user(user)
+        work.update_documents(user)
+
+
+@background(queue='indigo', remove_existing_tasks=True)
+def calculate_revision_diff(version_id):
+    """ Calculate the diff between a version of a document and the version before it, and store it
+    in the revision diff cache, where the document's history will find it.
+    """
+    from indigo_api.diffs import RevisionDiffCache
+
+    version = Version.objects.filter(pk=version_id).first()
+    document = Document.objects.filter(pk=version.object_id).first() if version else None
+    if not document:
+        log.warning(f"Document version with id {version_id} doesn't exist, ignoring")
+        return
+
+    RevisionDiffCache().precalculate(document, version)
+
+
+@receiver(post_revision_commit)
+def queue_revision_diffs(sender, revision, versions, **kwargs):
+    """ Calculate the diffs for new document revisions in the background.
+    """
+    if settings.INDIGO.get('REVISION_DIFFS_BACKGROUND'):
+        content_type = ContentType.objects.get_for_model(Document)
+        for version in versions:
+            if version.content_type_id == content_type.pk:
+                calculate_revision_diff(version.pk)
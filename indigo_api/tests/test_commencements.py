@@ -49,6 +49,17 @@ class CommencementsTestCase(TestCase):
         self.assertEqual(uncommenced_provisions_at_future_date, ['sec_4'])
         self.assertEqual(uncommenced_provisions_at_later_expression_date, ['sec_4', 'sec_6'])
 
+    def test_bulk_uncommenced_provisions(self):
+        works = Work.objects.filter(country=self.work.country)
+
+        for date in [None, datetime.date(2019, 1, 1), datetime.date(2022, 1, 1)]:
+            uncommenced = works.uncommenced_provision_ids(date)
+            self.assertEqual(set(uncommenced.keys()), set(w.id for w in works))
+            for work in works:
+                self.assertEqual(uncommenced[work.id], work.all_uncommenced_provision_ids(date))
+
+        self.assertEqual(Work.objects.filter(pk=self.work.pk).uncommenced_provision_ids()[self.work.pk], ['sec_4', 'sec_6'])
+
     def test_commencements_relevant_at_date(self):
         """ Future commencements should be included even if only one of their `provisions` exists at the given date,
          but not if there's no overlap.
@@ -132,3 +132,82 @@ class DocumentTestCase(TestCase):
 
         assert_is_none(d.get_subcomponent('main', 'chapter/99'))
         assert_is_none(d.get_subcomponent('main', 'section/99'))
+
+    def test_get_subcomponent_from_index(self):
+        user = User.objects.get(pk=1)
+        d = Document(language=self.eng, work=self.work, expression_date=date(2001, 1, 1), created_by_user=user)
+        d.content = document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <heading>Foo</heading>
+          <content>
+            <p>hello</p>
+          </content>
+        </section>
+        <chapter eId="chp_2">
+          <num>2.</num>
+          <heading>The Chapter</heading>
+          <section eId="chp_2__sec_2">
+            <num>2.</num>
+            <heading>Bar</heading>
+            <content>
+              <p>hi</p>
+            </content>
+          </section>
+        </chapter>
+        """)
+        d.save()
+        assert_equal(d.toc_index['main/chapter/2'][1], 'chp_2')
+        assert_equal(d.toc_index['main/section/2'][1], 'chp_2__sec_2')
+
+        d = Document.objects.get(pk=d.pk)
+        assert_equal(d.get_subcomponent('main', 'chapter/2').get('eId'), 'chp_2')
+        assert_equal(d.get_subcomponent('main', 'section/2').get('eId'), 'chp_2__sec_2')
+        assert_is_none(d.get_subcomponent('main', 'section/99'))
+        assert_equal(d.get_subcomponent('main', 'section/1').get('eId'), 'sec_1')
+
+        # a stale index is ignored
+        d = Document.objects.get(pk=d.pk)
+        d.toc_index['main/section/1'][1] = 'sec_99'
+        assert_equal(d.get_subcomponent('main', 'section/1').get('eId'), 'sec_1')
+
+    def test_stored_table_of_contents(self):
+        user = User.objects.get(pk=1)
+        d = Document(language=self.eng, work=self.work, expression_date=date(2001, 1, 1), created_by_user=user)
+        d.content = document_fixture(xml="""
+        <chapter eId="chp_2">
+          <num>2.</num>
+          <heading>The Chapter</heading>
+          <section eId="chp_2__sec_2">
+            <num>2.</num>
+            <heading>Bar</heading>
+            <content>
+              <p>hi</p>
+            </content>
+          </section>
+        </chapter>
+        """)
+        d.save()
+        expected = [t.as_dict() for t in d.table_of_contents()]
+
+        d = Document.objects.get(pk=d.pk)
+        toc = d.stored_table_of_contents()
+        assert_equal(expected, [t.as_dict() for t in toc])
+        assert_equal('chp_2__sec_2', toc[0].children[0].qualified_id)
+        assert_is_none(toc[0].element)
+        # the XML wasn't parsed
+        assert_false(hasattr(d, '_doc'))
+        assert_equal(['chp_2', 'chp_2__sec_2'], d.all_provisions())
+
+        # changing the content invalidates the stored table of contents
+        d.content = document_fixture(xml="""
+        <section eId="sec_1">
+          <num>1.</num>
+          <heading>Foo</heading>
+          <content>
+            <p>hello</p>
+          </content>
+        </section>
+        """)
+        assert_is_none(d.toc_json)
+        assert_equal(['sec_1'], [t.id for t in d.stored_table_of_contents()])
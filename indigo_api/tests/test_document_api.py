@@ -6,13 +6,19 @@ import datetime
 
 from nose.tools import *  # noqa
 from rest_framework.test import APITestCase
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
 from django.test.utils import override_settings
 from django.core.files.base import ContentFile
 from sass_processor.processor import SassProcessor
+from background_task.models import Task as BackgroundTask
 
 from indigo_api.tests.fixtures import *  # noqa
+from indigo_api.diffs import RevisionDiffCache
+from indigo_api.presence import CachePresence
 from indigo_api.exporters import PDFExporter
-from indigo_api.models import Work, Attachment
+from indigo_api.models import Document, Work, Attachment, DocumentActivity
 
 
 # Ensure the processor runs during tests. It doesn't run when DEBUG=False (ie. during testing),
@@ -133,6 +139,101 @@ class DocumentAPITest(APITestCase):
         response = self.client.get('/api/documents/%s/revisions/%s/diff' % (id, revision_id))
         assert_equal(response.status_code, 200)
 
+    def check_activity(self):
+        response = self.client.post('/api/documents/1/activity', {'nonce': 'first'})
+        assert_equal(response.status_code, 200)
+        assert_equal([a['nonce'] for a in response.data['results']], ['first'])
+        assert_equal(response.data['results'][0]['user']['username'], 'email@example.com')
+        assert_false(response.data['results'][0]['is_asleep'])
+
+        response = self.client.post('/api/documents/1/activity', {'nonce': 'second'})
+        assert_equal([a['nonce'] for a in response.data['results']], ['first', 'second'])
+
+        # pinging again doesn't create a new activity
+        response = self.client.post('/api/documents/1/activity', {'nonce': 'first'})
+        assert_equal([a['nonce'] for a in response.data['results']], ['first', 'second'])
+
+        response = self.client.post('/api/documents/1/activity', {'nonce': 'third', 'finished_nonces': 'first'})
+        assert_equal([a['nonce'] for a in response.data['results']], ['second', 'third'])
+
+        response = self.client.delete('/api/documents/1/activity', {'nonce': 'second'})
+        assert_equal(response.status_code, 204)
+
+        response = self.client.get('/api/documents/1/activity')
+        assert_equal([a['nonce'] for a in response.data['results']], ['third'])
+
+        # other documents are unaffected
+        response = self.client.get('/api/documents/2/activity')
+        assert_equal(response.data['results'], [])
+
+    def test_activity(self):
+        self.check_activity()
+        assert_equal(['third'], [a.nonce for a in DocumentActivity.objects.filter(document_id=1)])
+
+    def test_activity_cached(self):
+        presence = CachePresence(LocMemCache('test', {}))
+
+        with patch('indigo_api.views.documents.document_presence', return_value=presence):
+            self.check_activity()
+
+        # the database isn't used
+        assert_equal(0, DocumentActivity.objects.count())
+
+        # expired entries are forgotten
+        presence.cache.clear()
+        assert_equal([], presence.activities(Document.objects.get(pk=1)))
+
+    def test_revision_diff_cached(self):
+        id = 1
+        response = self.client.patch('/api/documents/%s' % id, {'content': document_fixture('hello')})
+        assert_equal(response.status_code, 200)
+        response = self.client.patch('/api/documents/%s' % id, {'content': document_fixture('goodbye')})
+        assert_equal(response.status_code, 200)
+
+        document = Document.objects.get(pk=id)
+        version, old_version = document.versions()[:2]
+        diffs = RevisionDiffCache(cache=LocMemCache('test', {}))
+
+        with patch('indigo_api.views.documents.RevisionDiffCache', return_value=diffs):
+            response = self.client.get('/api/documents/%s/revisions/%s/diff' % (id, version.id))
+            assert_equal(response.status_code, 200)
+            assert_in('goodbye', response.data['content'])
+
+        key = diffs.cache_key(document, old_version, version)
+        assert_equal(response.data, diffs.cache.get(key))
+        assert_equal(response.data, diffs.precalculate(document, version))
+
+        # cached entries are used in preference to diffing
+        diffs.cache.set(key, {'content': 'cached', 'n_changes': 0})
+        with patch('indigo_api.views.documents.RevisionDiffCache', return_value=diffs):
+            response = self.client.get('/api/documents/%s/revisions/%s/diff' % (id, version.id))
+            assert_equal(response.data['content'], 'cached')
+
+    def test_revision_diff_cache_key_changes_with_work(self):
+        id = 1
+        response = self.client.patch('/api/documents/%s' % id, {'content': document_fixture('hello')})
+        assert_equal(response.status_code, 200)
+
+        document = Document.objects.get(pk=id)
+        version = document.versions().first()
+        diffs = RevisionDiffCache(cache=LocMemCache('test', {}))
+        key = diffs.cache_key(document, None, version)
+
+        # the versions are rendered using details from the work, so changing it changes the key
+        document.work.title = 'A new title'
+        document.work.save()
+        document = Document.objects.get(pk=id)
+        assert_not_equal(key, diffs.cache_key(document, None, version))
+
+    @override_settings(INDIGO=dict(settings.INDIGO, REVISION_DIFFS_BACKGROUND=True))
+    def test_revision_diff_background(self):
+        BackgroundTask.objects.all().delete()
+        response = self.client.patch('/api/documents/1', {'content': document_fixture('hello')})
+        assert_equal(response.status_code, 200)
+
+        version = Document.objects.get(pk=1).versions().first()
+        assert_true(BackgroundTask.objects.filter(task_name='indigo_api.tasks.calculate_revision_diff', task_params__contains=str(version.pk)).exists())
+
     def test_update_content_and_properties(self):
         response = self.client.patch('/api/documents/1', {
             'content': document_fixture('in γνωρίζω body'),
@@ -332,6 +433,28 @@ class DocumentAPITest(APITestCase):
         assert_equal(response.accepted_media_type, 'application/epub+zip')
         assert_true(response.content.startswith(b'PK'))
 
+    @patch.object(PDFExporter, '_wkhtmltopdf', return_value='pdf-content')
+    def test_document_pdf_background(self, mock):
+        caches['default'].clear()
+        with patch.dict(settings.INDIGO, {'DOCUMENT_ARTEFACTS_BACKGROUND': True}):
+            response = self.client.get('/api/documents/1.pdf')
+        assert_equal(response.status_code, 202)
+        assert_equal(response.content, b'')
+        assert_false(mock.called)
+
+        task = BackgroundTask.objects.get(task_name='indigo_api.tasks.render_document_artefact')
+        assert_equal(task.params(), (['pdf', [1]], {'many': False, 'component': None, 'resolver': settings.RESOLVER_URL}))
+
+    def test_document_artefacts_queued_on_save(self):
+        BackgroundTask.objects.all().delete()
+        with patch.dict(settings.INDIGO, {'DOCUMENT_ARTEFACTS_BACKGROUND': True}):
+            Document.objects.get(pk=1).save()
+
+        tasks = BackgroundTask.objects.filter(task_name='indigo_api.tasks.render_document_artefact')
+        # for both the content API and the app's downloads
+        assert_in((['pdf', [1]], {'component': 'main'}), [task.params() for task in tasks])
+        assert_in((['pdf', [1]], {'component': None}), [task.params() for task in tasks])
+
     def test_document_pdf_404(self):
         response = self.client.get('/api/documents/999.pdf')
         assert_equal(response.status_code, 404)
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase
+from mock import patch
+
+from indigo_api.exporters import XSLTRenderer, RenderedHTMLCache, XSLTPool
+
+
+class RenderedHTMLCacheTestCase(TestCase):
+    xml = '<akomaNtoso xmlns="http://docs.oasis-open.org/legaldocml/ns/akn/3.0"><act><body><p>Hello</p></body></act></akomaNtoso>'
+
+    def setUp(self):
+        self.xslt_filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../static/xsl/html_act.xsl')
+        self.cache = RenderedHTMLCache(cache=LocMemCache('test', {}))
+
+    def renderer(self, **params):
+        params.setdefault('resolverUrl', '/resolver')
+        params.setdefault('lang', 'eng')
+        return XSLTRenderer(self.xslt_filename, xslt_params=params)
+
+    def test_cached(self):
+        renderer = self.renderer()
+        html = self.cache.render_xml(renderer, self.xml)
+        self.assertEqual(renderer.render_xml(self.xml), html)
+
+        key = self.cache.cache_key(renderer, self.xml)
+        self.assertEqual(html, self.cache.cache.get(key))
+
+        # a cached entry is used in preference to rendering
+        self.cache.cache.set(key, 'cached')
+        self.assertEqual('cached', self.cache.render_xml(renderer, self.xml))
+
+    def test_large_html_not_cached(self):
+        cache = RenderedHTMLCache(cache=LocMemCache('test-large', {}), max_entry_size=10)
+        renderer = self.renderer()
+        self.assertEqual(renderer.render_xml(self.xml), cache.render_xml(renderer, self.xml))
+        self.assertIsNone(cache.cache.get(cache.cache_key(renderer, self.xml)))
+
+    def test_missing_cache(self):
+        with patch.dict(settings.INDIGO, {'RENDERED_HTML_CACHE': 'missing'}):
+            cache = RenderedHTMLCache()
+        self.assertIsNone(cache.cache)
+
+        renderer = self.renderer()
+        self.assertEqual(renderer.render_xml(self.xml), cache.render_xml(renderer, self.xml))
+
+    def test_key_changes(self):
+        renderer = self.renderer()
+        key = self.cache.cache_key(renderer, self.xml)
+
+        self.assertEqual(key, self.cache.cache_key(self.renderer(), self.xml))
+        self.assertNotEqual(key, self.cache.cache_key(renderer, self.xml.replace('Hello', 'Goodbye')))
+        self.assertNotEqual(key, self.cache.cache_key(self.renderer(resolverUrl='/other'), self.xml))
+        self.assertNotEqual(key, self.cache.cache_key(self.renderer(lang='afr'), self.xml))
+
+
+class XSLTPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = XSLTPool()
+        self.xslt_filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), '../static/xsl/text_act.xsl')
+
+    def test_shared(self):
+        xslt = self.pool.get(self.xslt_filename)
+        self.assertIs(xslt, self.pool.get(self.xslt_filename))
+
+    def test_recompiled_when_modified(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fname = os.path.join(tmpdir, 'test.xsl')
+            shutil.copy(self.xslt_filename, fname)
+            xslt = self.pool.get(fname)
+
+            stat = os.stat(fname)
+            os.utime(fname, (stat.st_atime, stat.st_mtime + 10))
+            self.assertIsNot(xslt, self.pool.get(fname))
+
+    def test_warm_up(self):
+        self.pool.warm_up()
+        self.assertTrue(any(f.endswith('html_act.xsl') for f in self.pool.compiled))
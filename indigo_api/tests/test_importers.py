@@ -1,9 +1,10 @@
 from io import StringIO
 
 from django.test import TestCase
-
+from mock import Mock, patch
 
 from indigo_api.importers.base import parse_page_nums, Importer
+from indigo_api.importers.slaw import SlawWorkerPool, SlawWorkerError
 from indigo_api.models import Document
 
 
@@ -33,3 +34,94 @@ class ImporterTestCase(TestCase):
         with self.assertRaises(ValueError):
             importer.create_from_docx(f, doc)
 
+    def test_slaw_falls_back_to_shell(self):
+        importer = Importer()
+        pool = Mock(enabled=True)
+        pool.run.side_effect = SlawWorkerError("worker died")
+
+        with patch('indigo_api.importers.base.slaw_pool', return_value=pool), \
+                patch.object(importer, 'shell', return_value=(0, b'xml', b'')) as shell:
+            self.assertEqual((0, b'xml', b''), importer.slaw(['parse', 'x.txt']))
+
+        pool.run.assert_called_once_with(['parse', 'x.txt'])
+        shell.assert_called_once_with(['bundle', 'exec', 'slaw', 'parse', 'x.txt'])
+
+
+class FakeSlawWorker:
+    def __init__(self):
+        self.jobs = 0
+        self.last_used = 0
+        self.healthy = True
+        self.stopped = False
+        self.process = Mock(pid=1)
+
+    def run(self, args, timeout):
+        self.jobs += 1
+        return 0, ' '.join(args).encode('utf-8'), b''
+
+    def is_healthy(self, timeout):
+        return self.healthy
+
+    def stop(self):
+        self.stopped = True
+
+
+@patch('indigo_api.importers.slaw.SlawWorker', FakeSlawWorker)
+class SlawWorkerPoolTestCase(TestCase):
+    def test_reuses_workers(self):
+        pool = SlawWorkerPool(size=2, max_jobs=10)
+        self.assertEqual((0, b'parse --grammar za x.txt', b''), pool.run(['parse', '--grammar', 'za', 'x.txt']))
+        worker = pool.idle.get_nowait()
+        pool.idle.put(worker)
+
+        pool.run(['parse'])
+        self.assertEqual(1, pool.started)
+        self.assertEqual(2, worker.jobs)
+
+    def test_recycles_workers(self):
+        pool = SlawWorkerPool(size=1, max_jobs=2)
+        pool.run(['parse'])
+        worker = pool.idle.get_nowait()
+        pool.idle.put(worker)
+
+        pool.run(['parse'])
+        self.assertTrue(worker.stopped)
+        self.assertEqual(0, pool.started)
+
+        pool.run(['parse'])
+        self.assertIsNot(worker, pool.idle.get_nowait())
+
+    def test_replaces_unhealthy_workers(self):
+        pool = SlawWorkerPool(size=1, max_jobs=10)
+        pool.run(['parse'])
+        worker = pool.idle.get_nowait()
+        worker.healthy = False
+        pool.idle.put(worker)
+
+        pool.run(['parse'])
+        self.assertTrue(worker.stopped)
+        self.assertEqual(1, pool.started)
+
+    def test_discards_failed_workers(self):
+        pool = SlawWorkerPool(size=1, max_jobs=10)
+        pool.run(['parse'])
+        worker = pool.idle.get_nowait()
+        worker.run = Mock(side_effect=ValueError("bad response"))
+        pool.idle.put(worker)
+
+        with self.assertRaises(ValueError):
+            pool.run(['parse'])
+        self.assertTrue(worker.stopped)
+        self.assertEqual(0, pool.started)
+
+        # a new worker is started
+        self.assertEqual((0, b'parse', b''), pool.run(['parse']))
+
+    def test_acquire_times_out(self):
+        pool = SlawWorkerPool(size=1, max_jobs=10)
+        pool.acquire_timeout = 0
+        worker = pool.acquire()
+
+        with self.assertRaises(SlawWorkerError):
+            pool.acquire()
+        pool.release(worker)
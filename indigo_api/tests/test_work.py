@@ -1,8 +1,12 @@
 # -*- coding: utf-8 -*-
 import datetime
 
+from background_task.models import Task as BackgroundTask
+from django.conf import settings
+from django.contrib.auth.models import User
 from django.test import TestCase
 from django.core.exceptions import ValidationError
+from mock import patch
 
 from indigo_api.models import Document, Work, Country, Amendment, ArbitraryExpressionDate
 
@@ -23,6 +27,52 @@ class WorkTestCase(TestCase):
         document = Document.objects.get(pk=20)
         self.assertEqual(document.frbr_uri, '/akn/za/act/2999/1')
 
+    def test_cascade_changes_in_bulk(self):
+        documents = list(self.work.document_set.all())
+        self.assertGreater(len(documents), 1)
+
+        self.work.frbr_uri = '/akn/za/act/2999/1'
+        self.work.save()
+
+        for document in Document.objects.filter(pk__in=[d.pk for d in documents]):
+            self.assertEqual(document.frbr_uri, '/akn/za/act/2999/1')
+            self.assertIn('/akn/za/act/2999/1', document.document_xml)
+            self.assertGreater(document.updated_at, max(d.updated_at for d in documents))
+
+        # one action for all the documents
+        self.assertEqual(1, self.work.action_object_actions.filter(verb='updated the documents of').count())
+
+    def test_cascade_changes_in_bulk_revisions_and_artefacts(self):
+        user = User.objects.get(pk=1)
+        documents = list(self.work.document_set.undeleted())
+        versions = {d.pk: d.versions().count() for d in documents}
+
+        self.work.frbr_uri = '/akn/za/act/2999/1'
+        with patch.dict(settings.INDIGO, {'DOCUMENT_ARTEFACTS_BACKGROUND': True}):
+            self.work.save_with_revision(user)
+
+        # the documents are part of the work's new revision
+        for document in documents:
+            self.assertEqual(versions[document.pk] + 1, document.versions().count())
+            self.assertIn('/akn/za/act/2999/1', document.versions().first().field_dict['document_xml'])
+
+        # and their artefacts are re-rendered
+        tasks = BackgroundTask.objects.filter(task_name='indigo_api.tasks.render_document_artefact')
+        self.assertEqual(
+            {d.pk for d in documents},
+            {task.params()[0][1][0] for task in tasks})
+
+    def test_frbr_uri_attributes(self):
+        self.assertEqual(2014, self.work.frbr_year)
+        self.assertIsNone(self.work.frbr_subtype)
+
+        self.work.frbr_uri = '/akn/za/act/by-law/2019/5'
+        self.work.save()
+        self.work.refresh_from_db()
+        self.assertEqual(2019, self.work.frbr_year)
+        self.assertEqual('by-law', self.work.frbr_subtype)
+        self.assertEqual(1, Work.objects.filter(frbr_subtype='by-law', frbr_year=2019).count())
+
     def test_commencement_as_pit_date(self):
         """ When the publication date is unknown, fall back
         to the commencement date as a possible point in time.
@@ -1,4 +1,5 @@
 import logging
+from collections import OrderedDict
 
 from django.template.loader import get_template, TemplateDoesNotExist
 from django.utils import lru_cache
@@ -7,7 +8,9 @@ from django.contrib.staticfiles.finders import find as find_static
 from django.db.models import TextField
 
 from languages_plus.models import Language
-from rest_framework.pagination import PageNumberPagination as BasePageNumberPagination
+from rest_framework.pagination import PageNumberPagination as BasePageNumberPagination, BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 log = logging.getLogger(__name__)
@@ -45,6 +48,13 @@ class SearchRankCD(SearchRank):
     function = 'ts_rank_cd'
 
 
+class MD5(Func):
+    """ Helper class for using the `md5` postgres function, to hash large values (such as document XML)
+    without loading them from the database.
+    """
+    function = 'MD5'
+
+
 class PageNumberPagination(BasePageNumberPagination):
     page_size = 500
     page_size_query_param = 'page_size'
@@ -55,6 +65,56 @@ class SearchPagination(PageNumberPagination):
     page_size = 20
 
 
+class KeysetPagination(BasePagination):
+    """ Paginates a queryset using the value of a unique field that the queryset is ordered by, rather than
+    a page number. The next page is the items with values greater than the last item of this page.
+
+    This doesn't count the items, and fetching a page costs the same however deep it is, because there's
+    no OFFSET for the database to scan.
+    """
+    field = None
+    after_query_param = 'after'
+    page_size = 500
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def __init__(self, field=None):
+        if field:
+            self.field = field
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        after = request.query_params.get(self.after_query_param)
+        if after:
+            queryset = queryset.filter(**{f'{self.field}__gt': after})
+
+        # fetch one more item than we need, to know if there is a next page
+        items = list(queryset[:page_size + 1])
+        self.has_next = len(items) > page_size
+        self.page = items[:page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param], strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.after_query_param, getattr(self.page[-1], self.field))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
 def filename_candidates(document, prefix='', suffix=''):
     """ Candidate files to use for this document.
 
@@ -9,7 +9,6 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.staticfiles.templatetags.staticfiles import static
 from django.http import Http404
 from django.urls import reverse
-from django.utils import timezone
 from django_comments.models import Comment
 
 from rest_framework.exceptions import ValidationError, MethodNotAllowed
@@ -26,11 +25,14 @@ import lxml.html.diff
 from lxml.etree import LxmlError
 
 from indigo.analysis.differ import AttributeDiffer
+from indigo.analysis.pipeline import refs_pipeline
 from indigo.plugins import plugins
-from ..models import Document, Annotation, DocumentActivity, Task
+from ..models import Document, Annotation, Task
 from ..serializers import DocumentSerializer, RenderSerializer, ParseSerializer, DocumentAPISerializer, VersionSerializer, AnnotationSerializer, DocumentActivitySerializer, TaskSerializer, DocumentDiffSerializer
 from ..renderers import AkomaNtosoRenderer, PDFRenderer, EPUBRenderer, HTMLRenderer, ZIPRenderer
 from indigo_api.exporters import HTMLExporter
+from ..diffs import RevisionDiffCache
+from ..presence import document_presence
 from ..authz import DocumentPermissions, AnnotationPermissions, ModelPermissions, RelatedDocumentPermissions, \
     RevisionPermissions
 from ..utils import filename_candidates, find_best_static
@@ -68,7 +70,7 @@ class DocumentViewMixin:
             self.serializer_class = self.request.accepted_renderer.serializer_class
 
     def table_of_contents(self, document, uri=None):
-        return [t.as_dict() for t in document.table_of_contents()]
+        return [t.as_dict() for t in document.stored_table_of_contents()]
 
 
 # Read/write REST API
@@ -248,38 +250,13 @@ class RevisionViewSet(DocumentResourceView, viewsets.ReadOnlyModelViewSet):
     @cache_control(public=True, max_age=24 * 3600)
     def diff(self, request, *args, **kwargs):
         # this can be cached because the underlying data won't change (although
-        # the formatting might)
+        # the formatting might, which changes the server-side cache key)
         version = self.get_object()
 
         # most recent version just before this one
         old_version = self.get_queryset().filter(id__lt=version.id).first()
 
-        differ = AttributeDiffer()
-
-        if old_version:
-            old_document = old_version._object_version.object
-            old_document.document_xml = differ.preprocess_document_diff(old_document.document_xml)
-            old_html = old_document.to_html()
-        else:
-            old_html = ""
-
-        new_document = version._object_version.object
-        new_document.document_xml = differ.preprocess_document_diff(new_document.document_xml)
-        new_html = new_document.to_html()
-
-        old_tree = lxml.html.fromstring(old_html) if old_html else None
-        new_tree = lxml.html.fromstring(new_html)
-        n_changes, diff = differ.diff_document_html(old_tree, new_tree)
-
-        if not isinstance(diff, str):
-            diff = lxml.html.tostring(diff, encoding='unicode')
-
-        # TODO: include other diff'd attributes
-
-        return Response({
-            'content': diff,
-            'n_changes': n_changes,
-        })
+        return Response(RevisionDiffCache().diff(self.document, old_version, version))
 
     def get_queryset(self):
         return self.document.versions().defer('serialized_data')
@@ -297,31 +274,37 @@ class DocumentActivityViewSet(DocumentResourceView,
     serializer_class = DocumentActivitySerializer
     permission_classes = DEFAULT_PERMS + (ModelPermissions, RelatedDocumentPermissions)
 
+    def initial(self, request, **kwargs):
+        super().initial(request, **kwargs)
+        self.presence = document_presence()
+
     def get_queryset(self):
+        # used for permissions; the activities themselves come from the presence store
         return self.document.activities.prefetch_related('user').all()
 
     def list(self, request, *args, **kwargs):
-        # clean up old activity
-        DocumentActivity.vacuum(self.document)
-        return super(DocumentActivityViewSet, self).list(request, *args, **kwargs)
+        activities = self.presence.activities(self.document)
+
+        page = self.paginate_queryset(activities)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+
+        serializer = self.get_serializer(activities, many=True)
+        return Response(serializer.data)
 
     def create(self, request, *args, **kwargs):
         # if they've provided additional finished nonces, clear those out
         if request.data.get('finished_nonces'):
             nonces = request.data['finished_nonces'].split(',')
-            self.get_queryset().filter(user=request.user, nonce__in=nonces).delete()
+            self.presence.finish(self.document, request.user, nonces)
 
-        # either create a new activity object, or update it
-        self.get_queryset().update_or_create(
-            document=self.document, user=request.user, nonce=request.data['nonce'],
-            defaults={'updated_at': timezone.now()},
-        )
+        # either create a new activity, or refresh it
+        self.presence.ping(self.document, request.user, request.data['nonce'])
         return self.list(request, *args, **kwargs)
 
     def destroy(self, request, *args, **kwargs):
-        activity = self.get_queryset().filter(user=request.user, nonce=request.data['nonce']).first()
-        if activity:
-            activity.delete()
+        self.presence.finish(self.document, request.user, [request.data['nonce']])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -411,25 +394,7 @@ class LinkReferencesView(DocumentResourceView, APIView):
         return Response({'document': {'content': document.document_xml}})
 
     def find_references(self, document):
-        finder = plugins.for_document('refs', document)
-        if finder:
-            finder.find_references_in_document(document)
-
-        finder = plugins.for_document('refs-subtypes', document)
-        if finder:
-            finder.find_references_in_document(document)
-
-        finder = plugins.for_document('refs-cap', document)
-        if finder:
-            finder.find_references_in_document(document)
-
-        finder = plugins.for_document('refs-act-names', document)
-        if finder:
-            finder.find_references_in_document(document)
-
-        finder = plugins.for_document('internal-refs', document)
-        if finder:
-            finder.find_references_in_document(document)
+        refs_pipeline().run(document)
 
 
 class MarkUpItalicsTermsView(DocumentResourceView, APIView):
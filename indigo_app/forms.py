@@ -367,9 +367,9 @@ class WorkFilterForm(forms.Form):
         # filter by subtype indicated on frbr_uri
         if self.cleaned_data.get('subtype'):
             if self.cleaned_data['subtype'] == 'acts_only':
-                queryset = queryset.filter(frbr_uri__regex=r'.\/act\/\d{4}\/\w+')
+                queryset = queryset.filter(frbr_subtype__isnull=True, frbr_uri__contains='/act/')
             else:
-                queryset = queryset.filter(frbr_uri__contains='/act/%s/' % self.cleaned_data['subtype'])
+                queryset = queryset.filter(frbr_subtype=self.cleaned_data['subtype'], frbr_uri__contains='/act/')
 
         if self.cleaned_data.get('taxonomies'):
             queryset = queryset.filter(taxonomies__in=self.cleaned_data.get('taxonomies'))
@@ -39,6 +39,10 @@ class PlacesTest(testcases.TestCase):
         response = self.client.get('/places/za/works/')
         self.assertEqual(response.status_code, 200)
 
+        # uncommenced provisions are calculated for all the works at once
+        for work in response.context['works']:
+            self.assertEqual(len(work.all_uncommenced_provision_ids()), work.n_uncommenced_provisions)
+
     def test_place_works_xlsx(self):
         response = self.client.get('/places/za/works/?format=xlsx')
         self.assertEqual(response.status_code, 200)
@@ -18,9 +18,9 @@ from django.utils.timezone import now
 from django.views.generic import ListView, TemplateView, UpdateView
 from django.views.generic.list import MultipleObjectMixin
 
-from indigo_api.models import Annotation, Country, Task, Work, Amendment, Subtype, Locality, TaskLabel
+from indigo_api.models import Annotation, Country, Task, Work, Amendment, Subtype, Locality
 from indigo_api.views.documents import DocumentViewSet
-from indigo_metrics.models import DailyWorkMetrics, WorkMetrics, DailyPlaceMetrics
+from indigo_metrics.models import DailyWorkMetrics, WorkMetrics, DailyPlaceMetrics, PlaceDashboardSnapshot
 
 from .base import AbstractAuthedIndigoView, PlaceViewBase
 
@@ -120,16 +120,16 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        works = Work.objects.filter(country=self.country, locality=self.locality) \
-            .order_by('-updated_at')
+        # pre-calculated statistics for the place's works and tasks
+        stats = PlaceDashboardSnapshot.for_place(self.country, self.locality).stats
 
         context['recently_updated_works'] = self.get_recently_updated_works()
         context['recently_created_works'] = self.get_recently_created_works()
-        context['subtypes'] = self.get_works_by_subtype(works)
-        context['total_works'] = sum(p[1] for p in context['subtypes'])
+        context['subtypes'] = self.get_works_by_subtype(stats)
+        context['total_works'] = stats['n_works']
 
         # open tasks
-        open_tasks_data = self.calculate_open_tasks()
+        open_tasks_data = self.calculate_open_tasks(stats)
         context['open_tasks'] = open_tasks_data['open_tasks_chart']
         context['open_tasks_by_label'] = open_tasks_data['labels_chart']
         context['total_open_tasks'] = open_tasks_data['total_open_tasks']
@@ -147,15 +147,15 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
         ])
 
         # stubs overview
-        context['stubs_count'] = works.filter(stub=True).count()
-        context['non_stubs_count'] = works.filter(stub=False).count()
-        context['stubs_percentage'] = int((context['stubs_count'] / (works.count() or 1)) * 100)
+        context['stubs_count'] = stats['n_stubs']
+        context['non_stubs_count'] = stats['n_works'] - stats['n_stubs']
+        context['stubs_percentage'] = int((context['stubs_count'] / (stats['n_works'] or 1)) * 100)
         context['non_stubs_percentage'] = 100 - context['stubs_percentage']
 
         # primary works overview
-        context['primary_works_count'] = works.filter(parent_work__isnull=True).count()
-        context['subsidiary_works_count'] = works.filter(parent_work__isnull=False).count()
-        context['primary_works_percentage'] = int((context['primary_works_count'] / (works.count() or 1)) * 100)
+        context['primary_works_count'] = stats['n_primary_works']
+        context['subsidiary_works_count'] = stats['n_works'] - stats['n_primary_works']
+        context['primary_works_percentage'] = int((context['primary_works_count'] / (stats['n_works'] or 1)) * 100)
         context['subsidiary_works_percentage'] = 100 - context['primary_works_percentage']
 
         # Completeness
@@ -174,15 +174,13 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
             context['latest_completeness_stat'] = metrics[-1]
             context['completeness_history'] = [m.p_breadth_complete for m in metrics]
 
-        # Latest stats
-        since = now() - timedelta(days=30)
-        task_stats = self.get_tasks_stats(since)
-        context['new_tasks_added'] = task_stats['new_tasks_added']
-        context['tasks_completed'] = task_stats['tasks_completed']
-        context['new_works_added'] = works.filter(created_at__gte=since).count()
+        # Latest stats, over the last PlaceDashboardSnapshot.RECENT_DAYS days
+        context['new_tasks_added'] = stats['n_new_tasks']
+        context['tasks_completed'] = stats['n_completed_tasks']
+        context['new_works_added'] = stats['n_new_works']
 
         # top most active users
-        context['top_contributors'] = self.get_top_contributors()
+        context['top_contributors'] = self.get_top_contributors(stats)
 
         return context
 
@@ -192,37 +190,21 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
             .filter(country=self.country, locality=self.locality) \
             .order_by('-updated_at')[:5]
 
-    def get_tasks_stats(self, since):
-        tasks = Task.objects.filter(country=self.country, locality=self.locality)
-        tasks_completed = tasks.filter(state=Task.DONE, closed_at__gte=since).count()
-        new_tasks_added = tasks.filter(state=Task.OPEN, created_at__gte=since).count()
-
-        return {"new_tasks_added": new_tasks_added, "tasks_completed": tasks_completed}
-
-    def get_top_contributors(self):
-        top_contributors = Task.objects\
-            .filter(country=self.country, locality=self.locality, state='done')\
-            .values('submitted_by_user')\
-            .annotate(task_count=Count('submitted_by_user'))\
-            .exclude(task_count=0)\
-            .order_by('-task_count')[:10]
-
-        users = {u.id: u for u in User.objects.filter(id__in=[c['submitted_by_user'] for c in top_contributors])}
-        for user in top_contributors:
-            user['user'] = users[user['submitted_by_user']]
-
-        return top_contributors
+    def get_top_contributors(self, stats):
+        users = {u.id: u for u in User.objects.filter(id__in=[user_id for user_id, count in stats['top_contributors']])}
+        return [
+            {'submitted_by_user': user_id, 'task_count': count, 'user': users[user_id]}
+            for user_id, count in stats['top_contributors']
+            if user_id in users
+        ]
 
     def get_recently_created_works(self):
         return Work.objects \
                    .filter(country=self.country, locality=self.locality) \
                    .order_by('-created_at')[:5]
 
-    def get_works_by_subtype(self, works):
-        pairs = list(Counter([Subtype.for_abbreviation(w.subtype) for w in works]).items())
-        pairs = [list(p) for p in pairs]
-        # sort by count, decreasing
-        pairs.sort(key=lambda p: p[1], reverse=True)
+    def get_works_by_subtype(self, stats):
+        pairs = [[Subtype.for_abbreviation(subtype), count] for subtype, count in stats['subtypes']]
 
         total = sum(x[1] for x in pairs)
         for p in pairs:
@@ -230,12 +212,11 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
 
         return pairs
 
-    def calculate_open_tasks(self):
-        tasks = Task.objects.unclosed().filter(country=self.country, locality=self.locality)
-        total_open_tasks = tasks.count()
-        pending_review_tasks = tasks.filter(state='pending_review').count()
-        open_tasks = tasks.filter(state='open').exclude(assigned_to__isnull=False).count()
-        assigned_tasks = tasks.filter(state='open').exclude(assigned_to=None).count()
+    def calculate_open_tasks(self, stats):
+        total_open_tasks = stats['n_open_tasks']
+        pending_review_tasks = stats['n_pending_review_tasks']
+        open_tasks = stats['n_unassigned_tasks']
+        assigned_tasks = stats['n_assigned_tasks']
 
         open_tasks_chart = [{
                 'state': 'open',
@@ -257,16 +238,13 @@ class PlaceDetailView(PlaceViewBase, TemplateView):
             }]
 
         # open tasks by label
-        labels = TaskLabel.objects.filter(tasks__in=tasks) \
-            .annotate(n_tasks=Count('tasks__id'))
-
         labels_chart = []
-        for l in labels:
+        for label in stats['open_tasks_by_label']:
             labels_chart.append({
-                'count': l.n_tasks,
-                'title': l.title,
-                'slug': l.slug,
-                'percentage': int((l.n_tasks / (total_open_tasks or 1)) * 100)
+                'count': label['count'],
+                'title': label['title'],
+                'slug': label['slug'],
+                'percentage': int((label['count'] / (total_open_tasks or 1)) * 100)
             })
 
         return {"open_tasks_chart": open_tasks_chart, "labels_chart": labels_chart, "total_open_tasks": total_open_tasks}
@@ -384,8 +362,13 @@ class PlaceWorksView(PlaceViewBase, ListView):
         for doc_id, states in task_states.items():
             self.count_tasks(docs_by_id[doc_id], states)
 
+        # uncommenced provisions, for all works at once
+        uncommenced = Work.objects.filter(pk__in=list(works_by_id.keys())).uncommenced_provision_ids()
+
         # decorate works
         for work in works:
+            work.n_uncommenced_provisions = len(uncommenced.get(work.id, []))
+
             # most recent update, their the work or its documents
             update = max((c for c in chain(work.filtered_docs, [work]) if c.updated_at), key=lambda x: x.updated_at)
             work.most_recent_updated_at = update.updated_at
@@ -567,8 +550,11 @@ class PlaceMetricsView(PlaceViewBase, TemplateView, PlaceMetricsHelper):
         # works by year
         works = Work.objects\
             .filter(country=self.country, locality=self.locality)\
-            .select_related(None).prefetch_related(None).all()
-        years = Counter([int(w.year) for w in works])
+            .select_related(None).prefetch_related(None).order_by()
+        years = {
+            x['frbr_year']: x['n']
+            for x in works.filter(frbr_year__isnull=False).values('frbr_year').annotate(n=Count('id'))
+        }
         self.add_zero_years(years)
         years = list(years.items())
         years.sort()
@@ -589,12 +575,16 @@ class PlaceMetricsView(PlaceViewBase, TemplateView, PlaceMetricsHelper):
         context['amendments_by_year'] = json.dumps(years)
 
         # works by subtype
+        subtype_names = {s.abbreviation: s.name for s in Subtype.objects.all()}
+
         def subtype_name(abbr):
             if not abbr:
                 return 'Act'
-            st = Subtype.for_abbreviation(abbr)
-            return st.name if st else abbr
-        pairs = list(Counter([subtype_name(w.subtype) for w in works]).items())
+            return subtype_names.get(abbr, abbr)
+        pairs = Counter()
+        for x in works.values('frbr_subtype').annotate(n=Count('id')):
+            pairs[subtype_name(x['frbr_subtype'])] += x['n']
+        pairs = list(pairs.items())
         pairs.sort(key=lambda p: p[1], reverse=True)
         context['subtypes'] = json.dumps(pairs)
 
@@ -1,12 +1,39 @@
 # coding=utf-8
 import datetime
-import io
+import tempfile
 import xlsxwriter
 
-from django.http import HttpResponse
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import FileResponse
 
 from indigo.plugins import plugins
-from indigo_api.models import Amendment
+from indigo_api.models import Amendment, Commencement, Work
+
+
+# number of works to load, with their related objects, at a time
+BATCH_SIZE = 1000
+
+
+def in_batches(queryset, prefetches, batch_size=BATCH_SIZE):
+    """ Iterate over the works in a queryset, in order, loading a batch of works and prefetching
+    their related objects at a time so that neither the number of queries nor memory use grows with
+    the number of works.
+    """
+    ids = list(queryset.prefetch_related(None).values_list('pk', flat=True))
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        works = Work.objects\
+            .filter(pk__in=batch)\
+            .select_related('country', 'country__country', 'locality', 'parent_work', 'repealed_by')\
+            .prefetch_related(None)\
+            .in_bulk()
+        works = [works[pk] for pk in batch]
+        prefetch_related_objects(works, *prefetches)
+        yield from works
+
+
+def related_works():
+    return Work.objects.select_related(None).prefetch_related(None)
 
 
 class XlsxExporter:
@@ -152,8 +179,19 @@ class XlsxExporter:
         for position, title in enumerate(columns):
             sheet.write(0, position, title)
 
-        # gather the works and their related information
-        rows = []
+        # gather the works and their related information, in bulk
+        works = in_batches(works, [
+            Prefetch('commencements', queryset=Commencement.objects.select_related('commencing_work').order_by('date')),
+            Prefetch('amendments', queryset=Amendment.objects.select_related('amending_work').order_by('date')),
+            Prefetch('commencements_made', queryset=Commencement.objects.select_related('commenced_work').order_by('date')),
+            Prefetch('amendments_made', queryset=Amendment.objects.select_related('amended_work').order_by('date')),
+            Prefetch('repealed_works', queryset=related_works().order_by('repealed_date')),
+            Prefetch('child_works', queryset=related_works()),
+            'taxonomies',
+        ])
+
+        # write the works
+        row = 0
         for work in works:
             """ how many rows will we need for this work?
                 a minimum of one, plus more if there are multiple commencements / amendments / repeals
@@ -161,11 +199,11 @@ class XlsxExporter:
                 grab the commencements / amendments / repeals while we're at it
             """
             n_rows = 1
-            commencements_passive = work.commencements.all().order_by('date')
-            amendments_passive = work.amendments.all().order_by('date')
-            commencements_active = work.commencements_made.all().order_by('date')
-            amendments_active = work.amendments_made.all().order_by('date')
-            repeals_active = work.repealed_works.all().order_by('repealed_date')
+            commencements_passive = list(work.commencements.all())
+            amendments_passive = list(work.amendments.all())
+            commencements_active = list(work.commencements_made.all())
+            amendments_active = list(work.amendments_made.all())
+            repeals_active = list(work.repealed_works.all())
 
             for relation in [commencements_passive, amendments_passive,
                              commencements_active, amendments_active, repeals_active]:
@@ -181,12 +219,6 @@ class XlsxExporter:
                 'repeals_active': repeals_active,
             }
 
-            rows.append(info)
-
-        # write the works
-        row = 0
-        for info in rows:
-            work = info.get('work')
             for n in range(info.get('n_rows')):
                 row += 1
                 for field in columns:
@@ -198,8 +230,10 @@ class XlsxExporter:
                 write_repeal_active(n)
 
     def generate_xlsx(self, queryset, filename, full_index):
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output)
+        # rows are flushed to disk as they are written, and the finished workbook is streamed
+        # from a temporary file, so that large exports don't need to be held in memory
+        output = tempfile.TemporaryFile(suffix='.xlsx')
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
 
         if full_index:
             self.write_full_index(workbook, queryset)
@@ -210,7 +244,7 @@ class XlsxExporter:
         workbook.close()
         output.seek(0)
 
-        response = HttpResponse(
+        response = FileResponse(
             output, content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
         response['Content-Disposition'] = 'attachment; filename="%s"' % filename
@@ -228,7 +262,11 @@ def write_works(workbook, queryset):
     for position, title in enumerate(works_sheet_columns, 1):
         works_sheet.write(0, position, title)
 
-    for row, work in enumerate(queryset, 1):
+    works = in_batches(queryset, [
+        Prefetch('commencements', queryset=Commencement.objects.order_by('date')),
+    ])
+
+    for row, work in enumerate(works, 1):
         works_sheet.write(row, 0, row)
         works_sheet.write(row, 1, work.frbr_uri)
         works_sheet.write(row, 2, work.place.place_code)
@@ -255,8 +293,14 @@ def write_relationships(workbook, queryset):
     for position, title in enumerate(relationships_sheet_columns, 1):
         relationships_sheet.write(0, position, title)
 
+    works = in_batches(queryset, [
+        Prefetch('amendments_made', queryset=Amendment.objects.select_related('amended_work')),
+        Prefetch('repealed_works', queryset=related_works()),
+        Prefetch('commencements_made', queryset=Commencement.objects.select_related('commenced_work')),
+    ])
+
     row = 1
-    for work in queryset:
+    for work in works:
         family = []
 
         # parent work
@@ -268,7 +312,7 @@ def write_relationships(workbook, queryset):
             })
 
         # amended works
-        amended = Amendment.objects.filter(amending_work=work).prefetch_related('amended_work').all()
+        amended = work.amendments_made.all()
         family = family + [{
             'rel': 'amends',
             'work': a.amended_work.frbr_uri,
@@ -1,15 +1,18 @@
+import io
 import json
 import tempfile
+import zipfile
 from datetime import date
 
 from mock import patch
-from django.test.utils import override_settings
+from django.db import connection
+from django.test.utils import override_settings, CaptureQueriesContext
 from django.conf import settings
 from sass_processor.processor import SassProcessor
 from rest_framework.test import APITestCase
 
 from indigo_api.exporters import PDFExporter
-from indigo_api.models import Country
+from indigo_api.models import Country, Document
 
 
 # Ensure the processor runs during tests. It doesn't run when DEBUG=False (ie. during testing),
@@ -145,6 +148,29 @@ class ContentAPIV2TestMixin:
         self.assertEqual(response.accepted_media_type, 'application/json')
         self.assertEqual(len(response.data['results']), 1)
 
+    def test_published_listing_queries(self):
+        # the number of queries doesn't depend on the number of documents listed
+        with CaptureQueriesContext(connection) as one:
+            response = self.client.get(self.api_path + '/akn/za/?page_size=1')
+        self.assertEqual(len(response.data['results']), 1)
+
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(self.api_path + '/akn/za/')
+        self.assertEqual(len(response.data['results']), 4)
+
+        self.assertEqual(len(one), len(many))
+
+    def test_published_listing_same_as_detail(self):
+        response = self.client.get(self.api_path + '/akn/za/')
+        self.assertEqual(response.status_code, 200)
+
+        for listed in response.data['results']:
+            detail = self.client.get(self.api_path + '/akn' + listed['expression_frbr_uri'] + '.json')
+            self.assertEqual(detail.status_code, 200)
+            for field in ['points_in_time', 'as_at_date', 'publication_document', 'commencements',
+                          'custom_properties', 'taxonomies', 'parent_work']:
+                self.assertEqual(detail.data[field], listed[field], field)
+
     @patch.object(PDFExporter, '_wkhtmltopdf', return_value='pdf-content')
     def test_published_listing_pdf(self, mock):
         response = self.client.get(self.api_path + '/akn/za/act.pdf')
@@ -158,6 +184,26 @@ class ContentAPIV2TestMixin:
         self.assertEqual(response.accepted_media_type, 'application/json')
         self.assertEqual(set(response.data.keys()), set(['next', 'previous', 'count', 'results', 'links']))
 
+    def test_published_listing_keyset_pagination(self):
+        response = self.client.get(self.api_path + '/akn/za/?after=&page_size=3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data.keys()), {'next', 'results', 'links'})
+        first = [d['frbr_uri'] for d in response.data['results']]
+        self.assertEqual(3, len(first))
+        self.assertEqual(sorted(first), first)
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        second = [d['frbr_uri'] for d in response.data['results']]
+        self.assertEqual(1, len(second))
+        self.assertGreater(second[0], first[-1])
+        self.assertIsNone(response.data['next'])
+
+        # same documents as page-numbered pagination
+        response = self.client.get(self.api_path + '/akn/za/')
+        self.assertEqual(sorted(d['frbr_uri'] for d in response.data['results']), first + second)
+
     def test_published_listing_html_404(self):
         # explicitly asking for html is bad
         response = self.client.get(self.api_path + '/akn/za/act.html')
@@ -527,6 +573,82 @@ class ContentAPIV2TestMixin:
         response = self.client.get(self.api_path + '/akn/za/act/2001/8/eng/media/bad.png')
         self.assertEqual(response.status_code, 403)
 
+    def test_published_conditional_get(self):
+        url = self.api_path + '/akn/za/act/2014/10/eng.json'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # other formats have other etags
+        response = self.client.get(self.api_path + '/akn/za/act/2014/10/eng.xml', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # changing the document changes the etag
+        document = Document.objects.get_for_frbr_uri('/za/act/2014/10/eng')
+        document.title = 'A new title'
+        document.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_published_conditional_get_new_expression(self):
+        url = self.api_path + '/akn/za/act/2014/10/eng@2014-02-12.json'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+
+        # publishing another expression changes the document's points in time
+        document = Document.objects.get_for_frbr_uri('/za/act/2014/10/eng')
+        Document(work=document.work, language=document.language, expression_date=date(2020, 1, 1), draft=False,
+                 document_xml=document.document_xml, created_by_user=document.created_by_user).save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('2020-01-01', [p['date'] for p in response.data['points_in_time']])
+
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_published_zip_conditional_get_new_attachment(self):
+        url = self.api_path + '/akn/za/act/2001/8/eng.zip'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        # attachments are included in the zip file
+        self.client.login(username='email@example.com', password='password')
+        self.upload_attachment(4)
+        self.client.login(username='api-user@example.com', password='password')
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_published_media_conditional_get(self):
+        self.client.login(username='email@example.com', password='password')
+        self.upload_attachment(4)
+        self.client.login(username='api-user@example.com', password='password')
+
+        url = self.api_path + '/akn/za/act/2001/8/eng/media/test.png'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
     def upload_attachment(self, doc_id):
         tmp_file = tempfile.NamedTemporaryFile(suffix='.png')
         # this is the smallest possible transparent png
@@ -546,7 +668,15 @@ class ContentAPIV2TestMixin:
     def test_published_zipfile_many(self):
         response = self.client.get(self.api_path + '/akn/za/act/2001.zip')
         self.assertEqual(response.status_code, 200)
-        self.assertEqual(response.accepted_media_type, 'application/zip')
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+
+        zf = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        names = zf.namelist()
+        self.assertTrue(all(n.endswith('/main.xml') or '/media/' in n for n in names))
+        main = [n for n in names if n.endswith('/main.xml')]
+        self.assertTrue(main)
+        self.assertIn(b'<akomaNtoso', zf.read(main[0]))
 
     def test_published_frbr_urls(self):
         response = self.client.get(self.api_path + '/akn/za/act/2014/10/eng@2014-02-12.json')
@@ -1,10 +1,13 @@
 from itertools import groupby
 
+from django.db import models
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
 
 from cobalt import datestring
 
-from indigo_api.models import Document, Attachment, Country, Locality, PublicationDocument, TaxonomyVocabulary
+from indigo_api.models import Document, Attachment, Country, Locality, PublicationDocument, TaxonomyVocabulary, \
+    PlaceSettings
 from indigo_api.serializers import \
     DocumentSerializer, AttachmentSerializer, VocabularyTopicSerializer, CommencementSerializer, \
     PublicationDocumentSerializer as PublicationDocumentSerializerBase
@@ -59,6 +62,62 @@ class PublicationDocumentSerializer(PublicationDocumentSerializerBase):
         fields = ('url', 'filename', 'mime_type', 'size')
 
 
+class PublishedDocumentListSerializer(serializers.ListSerializer):
+    """ Serializes a list of published documents.
+
+    Before serializing, this loads the related details needed for each document's work (published expressions,
+    publication document, commencements and place settings) for the whole list in bulk and attaches them
+    to the works, so that serializing a page of documents uses a constant number of queries.
+    """
+    def to_representation(self, data):
+        documents = list(data.all() if isinstance(data, models.Manager) else data)
+        self.prefetch(documents)
+        return super().to_representation(documents)
+
+    def prefetch(self, documents):
+        works = {d.work_id: d.work for d in documents}
+        if not works:
+            return
+
+        prefetch_related_objects(
+            list(works.values()),
+            'country', 'locality', 'parent_work', 'repealed_by', 'publication_document',
+            'commencements', 'commencements__commencing_work',
+            'taxonomies', 'taxonomies__vocabulary')
+
+        self.prefetch_published_expressions(works)
+        self.prefetch_place_settings(works.values())
+
+    def prefetch_published_expressions(self, works):
+        for work in works.values():
+            work._published_expressions = []
+
+        expressions = Document.objects\
+            .undeleted()\
+            .published()\
+            .no_xml()\
+            .filter(work_id__in=list(works.keys()))\
+            .select_related('language', 'language__language')\
+            .order_by('expression_date')
+        for expression in expressions:
+            # share the work, rather than loading it for each expression
+            expression.work = works[expression.work_id]
+            expression.work._published_expressions.append(expression)
+
+    def prefetch_place_settings(self, works):
+        countries = {w.country_id: w.country for w in works}
+        localities = {w.locality_id: w.locality for w in works if w.locality_id}
+
+        for place_settings in PlaceSettings.objects.filter(country_id__in=list(countries.keys())):
+            place_settings.country = countries[place_settings.country_id]
+            if place_settings.locality_id is None:
+                place_settings.locality = None
+                place_settings.country._settings = place_settings
+            elif place_settings.locality_id in localities:
+                place_settings.locality = localities[place_settings.locality_id]
+                place_settings.locality._settings = place_settings
+
+
 class PublishedDocumentSerializer(DocumentSerializer, PublishedDocUrlMixin):
     """ Serializer for published documents.
 
@@ -93,11 +152,12 @@ class PublishedDocumentSerializer(DocumentSerializer, PublishedDocUrlMixin):
             'links',
         )
         read_only_fields = fields
+        list_serializer_class = PublishedDocumentListSerializer
 
     def get_points_in_time(self, doc):
         result = []
 
-        expressions = doc.work.expressions().published()
+        expressions = doc.work.published_expressions()
         for date, group in groupby(expressions, lambda e: e.expression_date):
             result.append({
                 'date': datestring(date),
@@ -1,7 +1,15 @@
+import hashlib
 import re
+from calendar import timegm
 
+from django.contrib.postgres.aggregates import StringAgg
+from django.db.models import F, Count, Max, Subquery, OuterRef, CharField, DateTimeField, IntegerField, Value
+from django.db.models.functions import Cast, Concat
 from django.http import Http404
 from django.shortcuts import redirect
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.functional import cached_property
+from django.utils.http import http_date
 from rest_framework import mixins, viewsets, renderers
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.permissions import IsAuthenticated, BasePermission
@@ -10,8 +18,10 @@ from rest_framework.versioning import NamespaceVersioning
 
 from cobalt import FrbrUri
 
-from indigo_api.models import Attachment, Country, Document, TaxonomyVocabulary, Locality
+from indigo_api.models import Amendment, Attachment, Commencement, Country, Document, PlaceSettings, \
+    TaxonomyVocabulary, Locality, Work
 from indigo_api.renderers import AkomaNtosoRenderer, PDFRenderer, EPUBRenderer, HTMLRenderer, ZIPRenderer
+from indigo_api.utils import KeysetPagination, MD5
 from indigo_api.views.attachments import view_attachment
 from indigo_api.views.documents import DocumentViewMixin
 from indigo_app.views.works import publication_document_response
@@ -23,6 +33,15 @@ from .serializers import CountrySerializer, MediaAttachmentSerializer, Published
 FORMAT_RE = re.compile(r'\.([a-z0-9]+)$')
 
 
+class ConditionalResponse(Exception):
+    """ Raised with the response to a conditional request whose content hasn't changed (usually 304 Not Modified),
+    so that the view can stop before loading or rendering anything.
+    """
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
 class PublishedDocumentPermission(BasePermission):
     """ Published document permissions.
     """
@@ -58,7 +77,17 @@ class FrbrUriViewMixin(PlaceAPIBase):
     """ An API view that uses a frbr_uri kwarg parameter to identify a work or document.
 
     This parses the FRBR URI, ensures it is valid, and stores it in .frbr_uri.
+
+    Responses include ETag and Last-Modified validators based on the document (or whatever is set with
+    `check_not_modified`), and conditional requests for unchanged content get a 304 Not Modified response.
+    """
+    conditional_document = True
+    """ Check conditional requests against the document as soon as it is found? Views whose content isn't
+    determined by the document and its work must call `check_not_modified` themselves.
     """
+    etag = None
+    last_modified = None
+
     def initial(self, request, **kwargs):
         # ensure the URI starts with a slash
         self.kwargs['frbr_uri'] = '/' + self.kwargs['frbr_uri']
@@ -95,8 +124,15 @@ class FrbrUriViewMixin(PlaceAPIBase):
         if not self.frbr_uri:
             raise Http404
 
+        # first find the document with a single, light query, so that if the request is conditional
+        # and the document hasn't changed, we can respond before loading it
+        queryset = self.get_document_queryset()\
+            .prefetch_related(None)\
+            .select_related('language', 'language__language')\
+            .annotate(work_updated_at=F('work__updated_at'), content_hash=MD5('document_xml'))\
+            .annotate(**self.related_changes_annotations())
         try:
-            obj = self.get_document_queryset().get_for_frbr_uri(self.frbr_uri)
+            obj = queryset.get_for_frbr_uri(self.frbr_uri)
             if not obj:
                 raise ValueError()
         except ValueError as e:
@@ -104,7 +140,97 @@ class FrbrUriViewMixin(PlaceAPIBase):
 
         # May raise a permission denied
         self.check_object_permissions(self.request, obj)
-        return obj
+
+        if self.conditional_document:
+            self.check_not_modified(
+                max(filter(None, [
+                    obj.updated_at, obj.work_updated_at, obj.expressions_updated_at,
+                    obj.commencements_updated_at, obj.amendments_updated_at, obj.attachments_updated_at])),
+                obj.pk, obj.updated_at, obj.content_hash, obj.work_updated_at,
+                obj.expressions_updated_at, obj.n_expressions,
+                obj.commencements_updated_at, obj.n_commencements,
+                obj.amendments_updated_at, obj.n_amendments,
+                obj.attachments_updated_at, obj.n_attachments,
+                obj.taxonomies, obj.place_as_at_date)
+
+        return self.get_document_queryset().get(pk=obj.pk)
+
+    def related_changes_annotations(self):
+        """ Annotations for a document queryset that describe changes to the details that are included with the
+        document: its attachments (bundled into ZIP files), and its work's other expressions (as points in time),
+        commencements, amendments and taxonomies, and its place's as-at date. These are calculated in the database,
+        without loading the details.
+
+        Taxonomy topics and place settings don't record when they were changed, so those changes are only reflected
+        in the ETag.
+        """
+        def latest(model, field, outer='work_id'):
+            return Subquery(
+                model.objects.filter(**{field: OuterRef(outer)}).order_by().values(field)
+                .annotate(latest=Max('updated_at'))
+                .values('latest'),
+                output_field=DateTimeField())
+
+        def count(model, field, outer='work_id'):
+            return Subquery(
+                model.objects.filter(**{field: OuterRef(outer)}).order_by().values(field)
+                .annotate(n=Count('pk'))
+                .values('n'),
+                output_field=IntegerField())
+
+        return {
+            'expressions_updated_at': latest(Document, 'work'),
+            'n_expressions': count(Document, 'work'),
+            'commencements_updated_at': latest(Commencement, 'commenced_work'),
+            'n_commencements': count(Commencement, 'commenced_work'),
+            'amendments_updated_at': latest(Amendment, 'amended_work'),
+            'n_amendments': count(Amendment, 'amended_work'),
+            'attachments_updated_at': latest(Attachment, 'document', 'pk'),
+            'n_attachments': count(Attachment, 'document', 'pk'),
+            'taxonomies': Subquery(
+                Work.taxonomies.through.objects.filter(work=OuterRef('work_id')).order_by().values('work')
+                .annotate(topics=StringAgg(Concat(
+                    Cast('vocabularytopic_id', CharField()), Value(':'),
+                    'vocabularytopic__vocabulary__slug', Value(':'),
+                    'vocabularytopic__vocabulary__title', Value(':'),
+                    'vocabularytopic__level_1', Value(':'),
+                    'vocabularytopic__level_2',
+                    output_field=CharField()), '|', ordering='vocabularytopic_id'))
+                .values('topics'),
+                output_field=CharField()),
+            # the work is always in the place identified by the FRBR URI
+            'place_as_at_date': Subquery(
+                PlaceSettings.objects.filter(country=self.country, locality=self.locality).values('as_at_date')[:1]),
+        }
+
+    def check_not_modified(self, last_modified, *parts):
+        """ Set the response validators: the Last-Modified date, and a strong ETag calculated from the parts that
+        determine the content, and the requested URL and format. If the request is conditional and the validators
+        match, raises ConditionalResponse.
+        """
+        digest = hashlib.sha1()
+        for part in [self.request.build_absolute_uri(), self.request.accepted_media_type] + list(parts):
+            digest.update(str(part).encode('utf-8'))
+            digest.update(b'\0')
+
+        self.etag = quote_etag(digest.hexdigest())
+        self.last_modified = timegm(last_modified.utctimetuple())
+
+        response = get_conditional_response(self.request, etag=self.etag, last_modified=self.last_modified)
+        if response is not None:
+            raise ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag and response.status_code in [200, 304]:
+            response['ETag'] = self.etag
+            response['Last-Modified'] = http_date(self.last_modified)
+        return response
 
     def get_document_queryset(self):
         return self.document_queryset
@@ -156,6 +282,18 @@ class PublishedDocumentDetailView(DocumentViewMixin,
         # doesn't match a renderer
         return super(PublishedDocumentDetailView, self).perform_content_negotiation(request, force=True)
 
+    @property
+    def paginator(self):
+        """ Listings are paginated by FRBR URI, rather than page number, if the request includes an ``after``
+        parameter (which may be empty, for the first page).
+        """
+        if not hasattr(self, '_paginator'):
+            if KeysetPagination.after_query_param in self.request.query_params:
+                self._paginator = KeysetPagination(field='frbr_uri')
+            else:
+                self._paginator = super().paginator
+        return self._paginator
+
     def get(self, request, **kwargs):
         if self.frbr_uri:
             return self.retrieve(request)
@@ -199,7 +337,12 @@ class PublishedDocumentDetailView(DocumentViewMixin,
     def list(self, request):
         """ Return details on many documents.
         """
-        if self.request.accepted_renderer.format in ['pdf', 'epub', 'zip']:
+        if self.request.accepted_renderer.format == 'zip':
+            # stream the archive, loading the XML for one document at a time
+            documents = sorted(self.filter_queryset(self.get_queryset()).no_xml(), key=lambda d: d.title)
+            return self.request.accepted_renderer.streaming_response(documents, self)
+
+        elif self.request.accepted_renderer.format in ['pdf', 'epub']:
             # NB: don't try to sort in the db, that's already sorting to
             # return the latest expression of each doc. Sort here instead.
             documents = sorted(self.filter_queryset(self.get_queryset()).all(), key=lambda d: d.title)
@@ -251,12 +394,12 @@ class PublishedDocumentDetailView(DocumentViewMixin,
         """
         queryset = super(PublishedDocumentDetailView, self).filter_queryset(queryset)
         queryset = queryset\
-            .latest_expression()\
             .filter(frbr_uri__istartswith=self.kwargs['frbr_uri'])\
             .filter(language__language__iso_639_2B=self.country.primary_language.code)
-        if queryset.count() == 0:
+        # probe for a matching document, rather than counting the distinct documents
+        if not queryset.exists():
             raise Http404
-        return queryset
+        return queryset.latest_expression()
 
     def get_format_suffix(self, **kwargs):
         """ Used during content negotiation.
@@ -281,13 +424,16 @@ class PublishedDocumentTOCView(DocumentViewMixin, FrbrUriViewMixin, mixins.Retri
     """ View that returns the TOC for a document.
     """
     renderer_classes = (renderers.JSONRenderer,)
+    # the XML is only loaded if the document doesn't have a stored table of contents
     document_queryset = Document.objects \
         .undeleted() \
-        .published()
+        .published() \
+        .no_xml()
 
     def get(self, request, **kwargs):
         document = self.get_document()
-        uri = document.doc.frbr_uri
+        # use the stored details rather than parsing the XML
+        uri = document.expression_uri.clone()
         uri.expression_date = self.frbr_uri.expression_date
         return Response({'toc': self.table_of_contents(document, uri)})
 
@@ -296,7 +442,7 @@ class PublishedDocumentTOCView(DocumentViewMixin, FrbrUriViewMixin, mixins.Retri
 
         # this updates the TOC entries by adding a 'url' component
         # based on the document's URI and the path of the TOC subcomponent
-        uri = uri or document.doc.frbr_uri
+        uri = uri or document.expression_uri.clone()
 
         def add_url(item):
             uri.expression_component = item['component']
@@ -330,9 +476,23 @@ class PublishedDocumentMediaView(FrbrUriViewMixin,
         .undeleted()\
         .no_xml()\
         .published()
+    # attachments change independently of their documents
+    conditional_document = False
+
+    @cached_property
+    def document(self):
+        return self.get_document()
 
     def filter_queryset(self, queryset):
-        return super().filter_queryset(queryset).filter(document=self.get_document())
+        return super().filter_queryset(queryset).filter(document=self.document)
+
+    def list(self, request, *args, **kwargs):
+        document = self.document
+        attachments = document.attachments.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        self.check_not_modified(
+            max(filter(None, [document.updated_at, attachments['updated_at']])),
+            document.pk, document.updated_at, attachments['count'], attachments['updated_at'])
+        return super().list(request, *args, **kwargs)
 
     def get_file(self, request, filename, *args, **kwargs):
         """ Download a media file.
@@ -342,14 +502,17 @@ class PublishedDocumentMediaView(FrbrUriViewMixin,
             .first()
         if not attachment:
             raise Http404()
+        self.check_not_modified(attachment.updated_at, attachment.pk, attachment.updated_at, attachment.size)
         return view_attachment(attachment)
 
     def get_publication_document(self, request, filename, *args, **kwargs):
         """ Download the media publication file for a work.
         """
-        work = self.get_document().work
+        work = self.document.work
 
         if work.publication_document and work.publication_document.filename == filename:
-            return publication_document_response(work.publication_document)
+            pub_doc = work.publication_document
+            self.check_not_modified(pub_doc.updated_at, pub_doc.pk, pub_doc.updated_at, pub_doc.size, pub_doc.trusted_url)
+            return publication_document_response(pub_doc)
 
         raise Http404()
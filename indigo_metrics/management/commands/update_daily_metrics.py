@@ -2,7 +2,7 @@ import datetime
 
 from django.core.management.base import BaseCommand
 
-from indigo_metrics.models import WorkMetrics, DailyWorkMetrics
+from indigo_metrics.models import WorkMetrics, DailyWorkMetrics, PlaceDashboardSnapshot
 
 
 class Command(BaseCommand):
@@ -18,3 +18,4 @@ class Command(BaseCommand):
 
         WorkMetrics.update_all_work_metrics()
         DailyWorkMetrics.update_daily_work_metrics(date)
+        PlaceDashboardSnapshot.update_all_snapshots()
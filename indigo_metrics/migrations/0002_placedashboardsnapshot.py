@@ -0,0 +1,31 @@
+# Generated by Django 2.2.12 on 2026-10-17 13:05
+
+import django.contrib.postgres.fields.jsonb
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indigo_api', '0009_document_toc_json'),
+        ('indigo_metrics', '0001_squashed_0008'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlaceDashboardSnapshot',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('place_code', models.CharField(max_length=20, unique=True)),
+                ('stale', models.BooleanField(default=False)),
+                ('stats', django.contrib.postgres.fields.jsonb.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='indigo_api.Country')),
+                ('locality', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='indigo_api.Locality')),
+            ],
+            options={
+                'db_table': 'indigo_metrics_place_dashboard_snapshot',
+            },
+        ),
+    ]
@@ -1,8 +1,11 @@
 import logging
 import datetime
 
+from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import connection, models, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
 
 from indigo_api.models import PublicationDocument, Country
 
@@ -139,9 +142,9 @@ INSERT INTO
   )
 SELECT
   %s AS date,
-  frbr_uri_parts[3] AS place_code,
-  SUBSTRING(frbr_uri_parts[3] FROM 1 FOR 2) AS country,
-  SUBSTRING(frbr_uri_parts[3] FROM 4) AS locality,
+  country || COALESCE('-' || locality, '') AS place_code,
+  country,
+  COALESCE(locality, '') AS locality,
   COUNT(1) AS n_works,
   SUM(n_expressions) AS n_expressions,
   SUM(n_expected_expressions) AS n_expected_expressions,
@@ -153,8 +156,8 @@ SELECT
   AVG(p_complete) AS p_complete
 FROM (
   SELECT
-    frbr_uri,
-    REGEXP_SPLIT_TO_ARRAY(FRBR_URI, '/') AS frbr_uri_parts,
+    LOWER(c.country_id) AS country,
+    LOWER(l.code) AS locality,
     n_expressions,
     n_expected_expressions,
     n_points_in_time,
@@ -163,6 +166,8 @@ FROM (
     p_complete
   FROM indigo_metrics_workmetrics wm
   INNER JOIN indigo_api_work w ON w.id = wm.work_id
+  INNER JOIN indigo_api_country c ON c.id = w.country_id
+  LEFT OUTER JOIN indigo_api_locality l ON l.id = w.locality_id
 ) AS x
 GROUP BY
   date, place_code, country, locality
@@ -200,3 +205,131 @@ class DailyPlaceMetrics(models.Model):
 
         metrics.n_activities += 1
         metrics.save()
+
+
+class PlaceDashboardSnapshot(models.Model):
+    """ Pre-calculated statistics about a place's works and tasks, for the place's dashboard.
+
+    A snapshot is marked as stale when the place's works or tasks change, and is re-calculated
+    in the background; until then, the stale snapshot is served. All snapshots are also
+    re-calculated daily, since some of the statistics cover the most recent days.
+    """
+    place_code = models.CharField(null=False, unique=True, max_length=20)
+    country = models.ForeignKey('indigo_api.Country', null=False, on_delete=models.CASCADE)
+    locality = models.ForeignKey('indigo_api.Locality', null=True, on_delete=models.CASCADE)
+
+    stale = models.BooleanField(null=False, default=False)
+    stats = JSONField(null=False, default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # snapshots older than this are re-calculated
+    MAX_AGE = datetime.timedelta(days=1)
+    # number of recent days covered by "new" statistics
+    RECENT_DAYS = 30
+    # seconds to wait after a place changes before re-calculating its snapshot, so that a burst of
+    # changes only re-calculates it once
+    UPDATE_DELAY = 60
+
+    class Meta:
+        db_table = 'indigo_metrics_place_dashboard_snapshot'
+
+    def is_current(self):
+        return not self.stale and self.updated_at >= timezone.now() - self.MAX_AGE
+
+    @classmethod
+    def for_place(cls, country, locality=None):
+        """ The snapshot for a place. It's only calculated immediately if the place doesn't have one yet,
+        otherwise an out of date snapshot is served while it's re-calculated in the background.
+        """
+        from indigo_metrics.tasks import update_place_dashboard_snapshot
+
+        snapshot = cls.objects.filter(place_code=(locality or country).place_code).first()
+        if not snapshot:
+            snapshot = cls.create_or_update(country, locality)
+        elif not snapshot.is_current():
+            update_place_dashboard_snapshot(country.pk, locality.pk if locality else None)
+        return snapshot
+
+    @classmethod
+    def create_or_update(cls, country, locality=None):
+        snapshot, created = cls.objects.update_or_create(
+            place_code=(locality or country).place_code,
+            defaults={
+                'country': country,
+                'locality': locality,
+                'stale': False,
+                'stats': cls.calculate(country, locality),
+            })
+        return snapshot
+
+    @classmethod
+    def mark_stale(cls, country, locality=None):
+        """ Mark the place's snapshot as stale and re-calculate it in the background. The re-calculation is only
+        queued when the snapshot becomes stale, so that frequent changes don't keep postponing it.
+        """
+        from indigo_metrics.tasks import update_place_dashboard_snapshot
+
+        if cls.objects.filter(country=country, locality=locality, stale=False).update(stale=True):
+            update_place_dashboard_snapshot(getattr(country, 'pk', country), getattr(locality, 'pk', locality),
+                                            schedule=cls.UPDATE_DELAY)
+
+    @classmethod
+    def update_all_snapshots(cls):
+        from indigo_api.models import Locality
+
+        log.info('Updating place dashboard snapshots.')
+        for country in Country.objects.select_related('country'):
+            cls.create_or_update(country)
+        for locality in Locality.objects.select_related('country', 'country__country'):
+            cls.create_or_update(locality.country, locality)
+        log.info('Place dashboard snapshots updated')
+
+    @classmethod
+    def calculate(cls, country, locality):
+        from indigo_api.models import Task, TaskLabel, Work
+
+        since = timezone.now() - datetime.timedelta(days=cls.RECENT_DAYS)
+
+        works = Work.objects.filter(country=country, locality=locality).order_by().prefetch_related(None)
+        stats = works.aggregate(
+            n_works=Count('id'),
+            n_stubs=Count('id', filter=Q(stub=True)),
+            n_primary_works=Count('id', filter=Q(parent_work__isnull=True)),
+            n_new_works=Count('id', filter=Q(created_at__gte=since)),
+        )
+        # [subtype abbreviation, count] pairs, most common first
+        stats['subtypes'] = [
+            list(p) for p in works
+            .values_list('frbr_subtype')
+            .annotate(n=Count('id'))
+            .order_by('-n')
+        ]
+
+        tasks = Task.objects.filter(country=country, locality=locality).order_by().prefetch_related(None)
+        stats.update(tasks.aggregate(
+            n_open_tasks=Count('id', filter=Q(state__in=Task.OPEN_STATES)),
+            n_unassigned_tasks=Count('id', filter=Q(state=Task.OPEN, assigned_to__isnull=True)),
+            n_assigned_tasks=Count('id', filter=Q(state=Task.OPEN, assigned_to__isnull=False)),
+            n_pending_review_tasks=Count('id', filter=Q(state=Task.PENDING_REVIEW)),
+            n_new_tasks=Count('id', filter=Q(state=Task.OPEN, created_at__gte=since)),
+            n_completed_tasks=Count('id', filter=Q(state=Task.DONE, closed_at__gte=since)),
+        ))
+
+        stats['open_tasks_by_label'] = [
+            {'slug': label.slug, 'title': label.title, 'count': label.n_tasks}
+            for label in TaskLabel.objects
+            .filter(tasks__in=tasks.unclosed())
+            .annotate(n_tasks=Count('tasks__id'))
+        ]
+
+        # [user id, count] pairs of the users who have completed the most tasks
+        stats['top_contributors'] = [
+            list(p) for p in tasks
+            .filter(state=Task.DONE)
+            .values_list('submitted_by_user')
+            .annotate(task_count=Count('submitted_by_user'))
+            .exclude(task_count=0)
+            .order_by('-task_count')[:10]
+        ]
+
+        return stats
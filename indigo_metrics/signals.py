@@ -2,7 +2,8 @@ from django.db.models import signals
 from django.dispatch import receiver
 from actstream.models import Action
 
-from indigo_metrics.models import DailyPlaceMetrics
+from indigo_api.models import Task, Work
+from indigo_metrics.models import DailyPlaceMetrics, PlaceDashboardSnapshot
 
 
 @receiver(signals.post_save, sender=Action)
@@ -12,3 +13,20 @@ def action_created(sender, instance, **kwargs):
     if kwargs['created']:
         if instance.data and instance.data.get('place_code'):
             DailyPlaceMetrics.record_activity(instance)
+
+
+@receiver(signals.post_save, sender=Work)
+@receiver(signals.post_delete, sender=Work)
+@receiver(signals.post_save, sender=Task)
+@receiver(signals.post_delete, sender=Task)
+def place_changed(sender, instance, **kwargs):
+    """ The place's dashboard snapshot must be re-calculated when its works or tasks change.
+    """
+    if not kwargs.get('raw'):
+        PlaceDashboardSnapshot.mark_stale(instance.country_id, instance.locality_id)
+
+
+@receiver(signals.m2m_changed, sender=Task.labels.through)
+def task_labels_changed(sender, instance, action, **kwargs):
+    if action.startswith('post_') and isinstance(instance, Task):
+        PlaceDashboardSnapshot.mark_stale(instance.country_id, instance.locality_id)
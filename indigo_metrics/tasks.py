@@ -5,7 +5,8 @@ from background_task import background
 from background_task.models import Task
 from django.utils import timezone
 
-from indigo_metrics.models import DailyWorkMetrics, WorkMetrics
+from indigo_api.models import Country, Locality
+from indigo_metrics.models import DailyWorkMetrics, WorkMetrics, PlaceDashboardSnapshot
 
 
 # get specific task logger
@@ -21,11 +22,26 @@ def update_yesterdays_metrics():
 
         yesterday = date.today() - timedelta(days=1)
         DailyWorkMetrics.update_daily_work_metrics(yesterday)
+
+        PlaceDashboardSnapshot.update_all_snapshots()
     except Exception as e:
         log.error(f"Error updating work metrics: {e}", exc_info=e)
         raise e
 
 
+@background(queue="indigo", remove_existing_tasks=True)
+def update_place_dashboard_snapshot(country_id, locality_id=None):
+    """ Task to re-calculate a place's dashboard snapshot. This will replace any existing task for the same place.
+    """
+    country = Country.objects.filter(pk=country_id).first()
+    locality = Locality.objects.filter(pk=locality_id).first() if locality_id else None
+    if not country or (locality_id and not locality):
+        log.warning(f"Place for country {country_id} and locality {locality_id} doesn't exist, ignoring")
+        return
+
+    PlaceDashboardSnapshot.create_or_update(country, locality)
+
+
 def setup_update_metrics_task(hour=1):
     now = timezone.now()
     at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from background_task.models import Task as BackgroundTask
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from indigo_api.models import Country, Work
+from indigo_metrics.models import PlaceDashboardSnapshot
+from indigo_metrics.tasks import update_place_dashboard_snapshot
+
+
+class PlaceDashboardSnapshotTestCase(TestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work', 'drafts', 'published']
+
+    def setUp(self):
+        self.za = Country.for_code('za')
+
+    def test_stats(self):
+        stats = PlaceDashboardSnapshot.for_place(self.za).stats
+        works = Work.objects.filter(country=self.za, locality=None)
+
+        self.assertEqual(works.count(), stats['n_works'])
+        self.assertEqual(works.filter(stub=True).count(), stats['n_stubs'])
+        self.assertEqual(works.filter(parent_work__isnull=True).count(), stats['n_primary_works'])
+        self.assertEqual(works.count(), sum(n for subtype, n in stats['subtypes']))
+
+    def test_served_from_snapshot(self):
+        PlaceDashboardSnapshot.for_place(self.za)
+
+        with self.assertNumQueries(1):
+            PlaceDashboardSnapshot.for_place(self.za)
+
+    def test_stale_when_works_change(self):
+        stats = PlaceDashboardSnapshot.for_place(self.za).stats
+
+        user = User.objects.get(pk=1)
+        Work.objects.create(frbr_uri='/akn/za/act/2020/99', title='New', country=self.za,
+                            created_by_user=user, updated_by_user=user)
+        self.assertTrue(PlaceDashboardSnapshot.objects.get(place_code='za').stale)
+        self.assertTrue(BackgroundTask.objects.filter(task_name='indigo_metrics.tasks.update_place_dashboard_snapshot').exists())
+
+        # the stale snapshot is served until it's re-calculated in the background
+        snapshot = PlaceDashboardSnapshot.for_place(self.za)
+        self.assertTrue(snapshot.stale)
+        self.assertEqual(stats['n_works'], snapshot.stats['n_works'])
+
+        update_place_dashboard_snapshot.now(self.za.pk, None)
+        snapshot = PlaceDashboardSnapshot.for_place(self.za)
+        self.assertFalse(snapshot.stale)
+        self.assertEqual(stats['n_works'] + 1, snapshot.stats['n_works'])
+
+    def test_queued_once_when_stale(self):
+        PlaceDashboardSnapshot.for_place(self.za)
+        BackgroundTask.objects.all().delete()
+
+        user = User.objects.get(pk=1)
+        for i in range(3):
+            Work.objects.create(frbr_uri=f'/akn/za/act/2020/{90 + i}', title='New', country=self.za,
+                                created_by_user=user, updated_by_user=user)
+
+        tasks = BackgroundTask.objects.filter(task_name='indigo_metrics.tasks.update_place_dashboard_snapshot')
+        self.assertEqual(1, tasks.count())
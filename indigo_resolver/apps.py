@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class IndigoResolverConfig(AppConfig):
     name = 'indigo_resolver'
     verbose_name = 'Indigo Resolver'
+
+    def ready(self):
+        import indigo_resolver.signals  # noqa
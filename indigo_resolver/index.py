@@ -0,0 +1,223 @@
+import datetime
+import logging
+import time
+from collections import defaultdict
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from iso8601 import parse_date, ParseError
+
+from indigo_api.models import Country, Document
+from indigo_resolver.models import Authority, AuthorityReference
+
+
+log = logging.getLogger(__name__)
+
+
+class ResolverIndex:
+    """ In-memory index of everything the resolver can resolve: the references of all authorities, and the
+    published documents used by the internal authority. Resolving an FRBR URI is then a dictionary lookup.
+
+    The index is built once and shared between processes through the cache configured by
+    ``INDIGO['RESOLVER_INDEX_CACHE']``, and kept in memory by each process. When the underlying data changes,
+    the index is invalidated (see indigo_resolver.signals) and the next resolution rebuilds it.
+    """
+    version_key = 'indigo_resolver.index.version'
+    index_key = 'indigo_resolver.index'
+    max_age = 60 * 60
+    """ Seconds after which a process rebuilds its copy of the index, in case an invalidation is missed
+    because the version has been evicted from the cache.
+    """
+
+    # (version, index) of this process
+    local = (None, None)
+
+    def __init__(self):
+        self.built_at = time.time()
+        # slug -> Authority
+        self.authorities = {}
+        # frbr_uri -> [(authority id, url, title, priority)]
+        self.references = defaultdict(list)
+        # document id -> (language, expression date, title)
+        self.documents = {}
+        # work id -> (frbr_uri, title)
+        self.works = {}
+        # work frbr_uri -> [(expression date, language, title)], earliest first
+        self.expressions = defaultdict(list)
+        # country code -> primary language code
+        self.languages = {}
+
+    def build(self):
+        for authority in Authority.objects.order_by('pk'):
+            self.authorities[authority.slug] = authority
+
+        refs = AuthorityReference.objects.values_list('frbr_uri', 'authority_id', 'url', 'title', 'priority')
+        for frbr_uri, *ref in refs.iterator():
+            self.references[frbr_uri].append(tuple(ref))
+
+        docs = Document.objects\
+            .undeleted()\
+            .published()\
+            .prefetch_related(None)\
+            .values_list('pk', 'language__language__iso_639_2B', 'expression_date',
+                         'title', 'work_id', 'work__frbr_uri', 'work__title')
+        # a document's frbr_uri is that of its work, but isn't updated until the work's documents are; expressions
+        # can have their own titles (such as translations)
+        for pk, language, expression_date, title, work_id, frbr_uri, work_title in docs.iterator():
+            self.documents[pk] = (language, expression_date, title)
+            self.works[work_id] = (frbr_uri, work_title)
+            self.expressions[frbr_uri].append((expression_date, language, title))
+        for expressions in self.expressions.values():
+            expressions.sort(key=lambda x: x[0])
+
+        for country, language in Country.objects.values_list('country_id', 'primary_language__language__iso_639_2B'):
+            self.languages[country.lower()] = language
+
+        # lookups mustn't add entries
+        self.references = dict(self.references)
+        self.expressions = dict(self.expressions)
+
+        log.info(f"Built resolver index with {len(self.references)} references and {len(self.documents)} documents")
+        return self
+
+    def get_authority(self, name):
+        from indigo_resolver.authorities import authorities
+        return authorities.registry.get(name) or self.authorities.get(name)
+
+    def all_authorities(self):
+        from indigo_resolver.authorities import authorities
+        return list(authorities.registry.values()) + list(self.authorities.values())
+
+    def primary_language(self, country_code):
+        return self.languages.get(country_code)
+
+    def get_references(self, authority, frbr_uri):
+        """ References from this authority for an FRBR URI. This is equivalent to `authority.get_references(frbr_uri)`.
+        """
+        from indigo_resolver.authorities import InternalAuthority
+
+        if isinstance(authority, Authority):
+            refs = []
+            for uri in {frbr_uri.work_uri(), frbr_uri.expression_uri()}:
+                for authority_id, url, title, priority in self.references.get(uri, []):
+                    if authority_id == authority.pk:
+                        refs.append(AuthorityReference(
+                            frbr_uri=uri, url=url, title=title, authority=authority,
+                            # default priorities
+                            priority=authority.priority if priority is None else priority))
+            return refs
+
+        if isinstance(authority, InternalAuthority):
+            document = self.get_document(frbr_uri)
+            if document:
+                return [authority.make_reference(document)]
+            return []
+
+        return authority.get_references(frbr_uri)
+
+    def get_document(self, frbr_uri):
+        """ Find the published document matching an FRBR URI, using the same rules as
+        `DocumentQuerySet.get_for_frbr_uri`, or None. Returns an unsaved Document with just frbr_uri and title.
+        """
+        work_uri = frbr_uri.work_uri()
+        expressions = [
+            (expr_date, title) for expr_date, language, title in self.expressions.get(work_uri, [])
+            if not frbr_uri.language or language == frbr_uri.language]
+
+        expr_date = frbr_uri.expression_date
+        if not expr_date:
+            # no expression date is equivalent to the "current" version, at time of retrieval
+            expr_date = ':' + datetime.date.today().strftime("%Y-%m-%d")
+
+        try:
+            if expr_date == '@':
+                # earliest document
+                matches = expressions
+
+            elif expr_date[0] == '@':
+                # document at this date
+                date = parse_date(expr_date[1:]).date()
+                matches = [x for x in expressions if x[0] == date]
+
+            elif expr_date[0] == ':':
+                # latest document at or before this date
+                date = parse_date(expr_date[1:]).date()
+                matches = [x for x in reversed(expressions) if x[0] <= date]
+
+            else:
+                return None
+
+        except ParseError:
+            return None
+
+        if matches:
+            return Document(frbr_uri=work_uri, title=matches[0][1])
+
+    def document_changed(self, document):
+        """ Would a change to this document change the index?
+        """
+        if document.deleted or document.draft:
+            return document.pk in self.documents
+
+        expression_date = document.expression_date
+        if isinstance(expression_date, str):
+            expression_date = parse_date(expression_date).date()
+        return self.documents.get(document.pk) != (document.language.code, expression_date, document.title)
+
+    def work_changed(self, work):
+        """ Would a change to this work change the index?
+        """
+        return work.pk in self.works and self.works[work.pk] != (work.frbr_uri, work.title)
+
+    @classmethod
+    def cache(cls):
+        return caches[settings.INDIGO['RESOLVER_INDEX_CACHE']]
+
+    @classmethod
+    def current(cls):
+        """ The current index, built if necessary.
+        """
+        cache = cls.cache()
+        local_version, index = cls.local
+        version = cache.get(cls.version_key)
+
+        if index and index.built_at + cls.max_age > time.time():
+            if version == local_version or version is None:
+                return index
+
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(cls.version_key, version, None):
+                version = cache.get(cls.version_key) or version
+
+        index = cache.get(f'{cls.index_key}:{version}')
+        if index is None or index.built_at + cls.max_age <= time.time():
+            index = cls().build()
+            cache.set(f'{cls.index_key}:{version}', index, cls.max_age)
+
+        cls.local = (version, index)
+        return index
+
+    @classmethod
+    def existing(cls):
+        """ The current index if it has already been built, otherwise None.
+        """
+        cache = cls.cache()
+        local_version, index = cls.local
+        version = cache.get(cls.version_key)
+        if version is None or version == local_version:
+            return index
+
+        # another process has built it, keep it so that later checks only need the version
+        index = cache.get(f'{cls.index_key}:{version}')
+        if index is not None:
+            cls.local = (version, index)
+        return index
+
+    @classmethod
+    def invalidate(cls):
+        """ Discard the index, in all processes. It's rebuilt when next needed.
+        """
+        cls.local = (None, None)
+        cls.cache().set(cls.version_key, uuid4().hex, None)
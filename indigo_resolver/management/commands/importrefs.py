@@ -1,13 +1,64 @@
 import json
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 
+from indigo_resolver.index import ResolverIndex
 from indigo_resolver.models import Authority, AuthorityReference
 
 
+def iter_json_array(f, chunk_size=64 * 1024):
+    """ Incrementally parse a JSON array from a file, yielding each item in turn, so that the
+    whole file never has to be loaded into memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+
+    while True:
+        # skip whitespace and separators
+        while pos < len(buf) and (buf[pos].isspace() or (started and buf[pos] == ',')):
+            pos += 1
+
+        if pos < len(buf):
+            if not started:
+                if buf[pos] != '[':
+                    raise ValueError("Expected a JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buf[pos] == ']':
+                return
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # an item that runs up to the end of the buffer may be incomplete (eg. a number)
+                if end < len(buf) or eof:
+                    yield item
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+        if eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + chunk
+        pos = 0
+
+
 class Command(BaseCommand):
     help = "Imports Indigo Resolver Authority References from a json file. The JSON file must be an array " + \
-           "of objects, each with a url, num, year and title."
+           "of objects, each with a url, num, year and title. Existing references are updated."
+
+    batch_size = 1000
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -28,6 +79,14 @@ class Command(BaseCommand):
             required=True,
             help='The two letter country code of the country.'
         )
+        parser.add_argument(
+            '--batch-size',
+            action='store',
+            type=int,
+            default=self.batch_size,
+            help='The number of references to import at a time (default %s).' % self.batch_size
+        )
+        parser.add_argument('--dry-run', action='store_true')
 
     def debug(self, msg):
         if self.verbosity >= 2:
@@ -38,31 +97,76 @@ class Command(BaseCommand):
         self.verbosity = options.get('verbosity', 1)
         self.authority = Authority.objects.get(name=options['authority'])
         self.country = options['country'].lower()
+        self.batch_size = options.get('batch_size') or self.batch_size
+        self.dry_run = options.get('dry_run', False)
 
-        with open(self.filepath) as f:
-            data = json.load(f)
+        if self.dry_run:
+            self.stdout.write(self.style.NOTICE('Dry-run, won\'t actually make changes'))
 
-        self.import_data(data)
+        with open(self.filepath) as f:
+            self.import_data(iter_json_array(f))
 
     def import_data(self, data):
-        # existing refs
-        refs = {r.frbr_uri: r for r in self.authority.references.all()}
+        self.counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
 
+        batch = {}
         for entry in data:
             if 'year' not in entry or 'num' not in entry:
+                self.counts['skipped'] += 1
                 continue
 
             frbr_uri = '/'.join(['', self.country, 'act', entry['year'], entry['num']])
-            ref = refs.get(frbr_uri)
+            # later entries for the same reference win
+            batch[frbr_uri] = entry
+
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = {}
+
+        if batch:
+            self.import_batch(batch)
+
+        if not self.dry_run:
+            # bulk changes don't send the signals that invalidate the index
+            ResolverIndex.invalidate()
+
+        self.stdout.write(self.style.SUCCESS(
+            '{}: {created} created, {updated} updated, {unchanged} unchanged, {skipped} skipped'.format(
+                'Would import' if self.dry_run else 'Imported', **self.counts)))
+
+    def import_batch(self, batch):
+        """ Create or update the references for a batch of entries, keyed by FRBR URI.
+        """
+        now = timezone.now()
+        existing = {r.frbr_uri: r for r in self.authority.references.filter(frbr_uri__in=list(batch.keys()))}
+        created = []
+        updated = []
+
+        for frbr_uri, entry in batch.items():
+            ref = existing.get(frbr_uri)
             if not ref:
-                ref = refs[frbr_uri] = AuthorityReference(frbr_uri=frbr_uri, authority=self.authority)
+                ref = AuthorityReference(frbr_uri=frbr_uri, authority=self.authority, title=entry['title'], url=entry['url'])
+                created.append(ref)
+                self.debug('Create reference: %s' % ref)
 
-            ref.title = entry['title']
-            ref.url = entry['url']
+            elif ref.title != entry['title'] or ref.url != entry['url']:
+                ref.title = entry['title']
+                ref.url = entry['url']
+                ref.updated_at = now
+                updated.append(ref)
+                self.debug('Update reference: %s' % ref)
 
-            if ref.id is None:
-                self.stdout.write(self.style.SUCCESS('Create reference: %s' % ref))
             else:
-                self.stdout.write(self.style.SUCCESS('Update reference: %s' % ref))
+                self.counts['unchanged'] += 1
+
+        if not self.dry_run:
+            with transaction.atomic():
+                AuthorityReference.objects.bulk_create(created, batch_size=self.batch_size)
+                AuthorityReference.objects.bulk_update(updated, ['title', 'url', 'updated_at'], batch_size=self.batch_size)
+
+        self.counts['created'] += len(created)
+        self.counts['updated'] += len(updated)
 
-            ref.save()
+        if self.verbosity >= 1:
+            self.stdout.write('{created} created, {updated} updated, {unchanged} unchanged, {skipped} skipped so far'.format(
+                **self.counts))
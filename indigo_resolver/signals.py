@@ -0,0 +1,50 @@
+from django.db import transaction
+from django.db.models import signals
+from django.dispatch import receiver
+
+from indigo_api.models import Country, Document, Work
+from indigo_resolver.index import ResolverIndex
+from indigo_resolver.models import Authority, AuthorityReference
+
+
+@receiver(signals.post_save, sender=Authority)
+@receiver(signals.post_delete, sender=Authority)
+@receiver(signals.post_save, sender=AuthorityReference)
+@receiver(signals.post_delete, sender=AuthorityReference)
+@receiver(signals.post_save, sender=Country)
+@receiver(signals.post_delete, sender=Country)
+def resolver_data_changed(sender, instance, **kwargs):
+    """ The resolver index must be rebuilt when authorities, their references or countries change.
+
+    The index is only invalidated once the change is committed, otherwise it could be rebuilt from the
+    old data before then.
+    """
+    if not kwargs.get('raw'):
+        transaction.on_commit(ResolverIndex.invalidate)
+
+
+@receiver(signals.post_save, sender=Document)
+@receiver(signals.post_delete, sender=Document)
+def document_changed(sender, instance, **kwargs):
+    """ The resolver index must be rebuilt when a published document is added, removed or re-dated, but
+    not when its content is edited.
+    """
+    if not kwargs.get('raw'):
+        index = ResolverIndex.existing()
+        if index:
+            if kwargs['signal'] == signals.post_delete:
+                changed = instance.pk in index.documents
+            else:
+                changed = index.document_changed(instance)
+            if changed:
+                transaction.on_commit(ResolverIndex.invalidate)
+
+
+@receiver(signals.post_save, sender=Work)
+def work_changed(sender, instance, **kwargs):
+    """ The resolver index must be rebuilt when the FRBR URI or title of a work with published documents changes.
+    """
+    if not kwargs.get('raw'):
+        index = ResolverIndex.existing()
+        if index and index.work_changed(instance):
+            transaction.on_commit(ResolverIndex.invalidate)
@@ -1,3 +1,142 @@
+import io
+import json
+import tempfile
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
 from django.test import TestCase
+from mock import patch
+
+from cobalt import FrbrUri
+
+from indigo_api.models import Document
+from indigo_resolver.index import ResolverIndex
+from indigo_resolver.management.commands.importrefs import iter_json_array
+from indigo_resolver.models import Authority, AuthorityReference
+
+
+@patch.object(ResolverIndex, 'cache', classmethod(lambda cls: cls.test_cache))
+class ResolverIndexTestCase(TestCase):
+    fixtures = ['languages_data', 'countries', 'user', 'taxonomies', 'work', 'published']
+
+    def setUp(self):
+        ResolverIndex.test_cache = LocMemCache('resolver', {})
+        ResolverIndex.local = (None, None)
+        self.authority = Authority.objects.create(name='Other', slug='other', priority=5)
+        AuthorityReference.objects.create(
+            authority=self.authority, frbr_uri='/akn/za/act/2014/10', title='Water Act', url='http://example.com/water')
+
+    def parse(self, frbr_uri):
+        FrbrUri.default_language = None
+        frbr_uri = FrbrUri.parse(frbr_uri)
+        frbr_uri.language = frbr_uri.language or 'eng'
+        return frbr_uri
+
+    def test_same_documents_as_database(self):
+        index = ResolverIndex.current()
+        queryset = Document.objects.undeleted().published()
+        for uri in ['/akn/za/act/2010/1', '/akn/za/act/2010/1/eng@', '/akn/za/act/2010/1/eng@2011-01-01',
+                    '/akn/za/act/2010/1/eng:2011-06-01', '/akn/za/act/2010/1/eng@2011-06-01', '/akn/za/act/2010/1/fre',
+                    '/akn/za/act/1999/99']:
+            frbr_uri = self.parse(uri)
+            try:
+                expected = queryset.get_for_frbr_uri(frbr_uri).work.title
+            except ValueError:
+                expected = None
+            document = index.get_document(frbr_uri)
+            self.assertEqual(expected, document.title if document else None, uri)
+
+    def test_resolve_without_queries(self):
+        ResolverIndex.current()
+        with self.assertNumQueries(0):
+            response = self.client.get('/resolver/other/resolve/akn/za/act/2014/10')
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.url, 'http://example.com/water')
+
+    @patch('indigo_resolver.signals.transaction.on_commit', lambda func: func())
+    def test_invalidated(self):
+        index = ResolverIndex.current()
+        self.assertIs(index, ResolverIndex.current())
+
+        # editing a document's content doesn't change the index
+        document = Document.objects.get(pk=1)
+        document.save()
+        self.assertIs(index, ResolverIndex.current())
+
+        # unpublishing it does
+        document.draft = True
+        document.save()
+        index2 = ResolverIndex.current()
+        self.assertIsNot(index, index2)
+        self.assertIsNone(index2.get_document(self.parse('/akn/za/act/2014/10')))
+
+        AuthorityReference.objects.filter(authority=self.authority).delete()
+        self.assertEqual([], ResolverIndex.current().get_references(self.authority, self.parse('/akn/za/act/2014/10')))
+
+
+    @patch('indigo_resolver.signals.transaction.on_commit', lambda func: func())
+    def test_expression_title(self):
+        document = Document.objects.get(pk=1)
+        document.title = 'A translated title'
+        document.save()
+
+        # retitling a published document changes the index, and the expression's own title is used
+        index = ResolverIndex.current()
+        self.assertEqual('A translated title', index.get_document(self.parse('/akn/za/act/2014/10')).title)
+
+    def test_existing_kept_locally(self):
+        index = ResolverIndex.current()
+        # another process rebuilds the index
+        ResolverIndex.local = (None, None)
+        self.assertEqual(index.built_at, ResolverIndex.existing().built_at)
+        self.assertIsNotNone(ResolverIndex.local[1])
+
+    def test_invalidated_on_commit(self):
+        index = ResolverIndex.current()
+
+        # the test's transaction is never committed
+        document = Document.objects.get(pk=1)
+        document.draft = True
+        document.save()
+        self.assertIs(index, ResolverIndex.current())
+
+
+class ImportRefsTestCase(TestCase):
+    def setUp(self):
+        self.authority = Authority.objects.create(name='Other', slug='other')
+        AuthorityReference.objects.create(
+            authority=self.authority, frbr_uri='/za/act/2001/1', title='Old title', url='http://example.com/1')
+
+    def import_refs(self, data, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            json.dump(data, f)
+            f.flush()
+            out = io.StringIO()
+            call_command('importrefs', f.name, '--authority', 'Other', '--country', 'za', '--batch-size', '2', *args, stdout=out)
+            return out.getvalue()
+
+    def test_iter_json_array(self):
+        data = [{'year': '2001', 'num': str(i), 'title': 'Act %s' % i} for i in range(20)] + [1, 22, 333]
+        for chunk_size in [1, 7, 1024]:
+            self.assertEqual(data, list(iter_json_array(io.StringIO(json.dumps(data)), chunk_size)))
+
+    def test_import(self):
+        data = [
+            {'year': '2001', 'num': '1', 'title': 'New title', 'url': 'http://example.com/1'},
+            {'year': '2001', 'num': '2', 'title': 'Two', 'url': 'http://example.com/2'},
+            {'year': '2001', 'num': '3', 'title': 'Three', 'url': 'http://example.com/3'},
+            {'title': 'No year'},
+        ]
+
+        out = self.import_refs(data, '--dry-run')
+        self.assertIn('Would import: 2 created, 1 updated, 0 unchanged, 1 skipped', out)
+        self.assertEqual(1, self.authority.references.count())
+
+        out = self.import_refs(data)
+        self.assertIn('Imported: 2 created, 1 updated, 0 unchanged, 1 skipped', out)
+        self.assertEqual(
+            ['New title', 'Two', 'Three'],
+            list(self.authority.references.order_by('frbr_uri').values_list('title', flat=True)))
 
-# Create your tests here.
+        out = self.import_refs(data)
+        self.assertIn('Imported: 0 created, 0 updated, 3 unchanged, 1 skipped', out)
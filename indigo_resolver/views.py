@@ -7,8 +7,7 @@ from django.shortcuts import redirect
 
 from cobalt.uri import FrbrUri
 
-from indigo_api.models import Country
-from .authorities import authorities as registry
+from .index import ResolverIndex
 
 
 class ResolveView(TemplateView):
@@ -21,12 +20,10 @@ class ResolveView(TemplateView):
         except ValueError:
             return HttpResponseBadRequest("Invalid FRBR URI")
 
+        self.index = ResolverIndex.current()
+
         if not self.frbr_uri.language:
-            try:
-                country = Country.for_code(self.frbr_uri.country)
-                self.frbr_uri.language = country.primary_language.code
-            except Country.DoesNotExist:
-                self.frbr_uri.language = 'eng'
+            self.frbr_uri.language = self.index.primary_language(self.frbr_uri.country) or 'eng'
 
         self.authorities = self.get_authorities(authorities)
         self.references = self.get_references()
@@ -49,16 +46,16 @@ class ResolveView(TemplateView):
 
     def get_authorities(self, authorities):
         if authorities:
-            authorities = (registry.get(a) for a in authorities.split(','))
+            authorities = (self.index.get_authority(a) for a in authorities.split(','))
             authorities = [a for a in authorities if a]
             if not authorities:
                 raise Http404()
             return authorities
 
-        return registry.all()
+        return self.index.all_authorities()
 
     def get_references(self):
-        refs = list(chain(*(a.get_references(self.frbr_uri) for a in self.authorities)))
+        refs = list(chain(*(self.index.get_references(a, self.frbr_uri) for a in self.authorities)))
         # sort by priority, highest first
         refs.sort(key=lambda r: -r.priority)
 